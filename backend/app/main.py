@@ -9,6 +9,7 @@ FastAPI 应用主文件
 - 静态文件服务配置
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -16,6 +17,7 @@ from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.exceptions import RequestValidationError
 from pydantic import ValidationError
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
 import os
 
@@ -24,6 +26,12 @@ from app.models import *
 from app import routers
 from app.utils.exceptions import CustomAPIException
 from app.schemas.common import ResponseModel
+from app.services.cost_recalc_service import run_recalc_worker
+from app.services.inventory_service import init_goods_stats, init_inventory_flow_balances
+from app.services.home_service import init_daily_metrics
+from app.repositories.goods_catalog import goods_catalog
+from app.repositories.name_search import init_name_search
+from app.repositories.name_autocomplete import load_name_autocomplete
 
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -32,7 +40,7 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
-    应用生命周期管理：数据库初始化
+    应用生命周期管理：数据库初始化、后台成本重算任务启停
     
     Args:
         app (FastAPI): FastAPI 应用实例
@@ -41,14 +49,44 @@ async def lifespan(app: FastAPI):
     try:
         # SQLite 自动创建数据库文件，直接创建数据表
         Base.metadata.create_all(bind=engine)
+        # create_all 不会为已存在的表补建新增的索引，逐个检查补建
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+        # 已被覆盖索引取代的旧索引
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX IF EXISTS idx_goods_oper_time_id"))
+        # 名称全文索引（FTS5 trigram）及同步触发器
+        init_name_search(engine)
+        # 商品统计表为新增表时，从已有业务记录补建
+        db = SessionLocal()
+        try:
+            init_goods_stats(db)
+            # 库存流水结存按累计计算，已有数据缺少期初流水时补建
+            init_inventory_flow_balances(db)
+            # 每日经营指标汇总表为新增表时，从已有业务记录补建
+            init_daily_metrics(db)
+            # 加载商品目录缓存及名称联想索引（联想索引依赖目录缓存）
+            goods_catalog.load(db)
+            load_name_autocomplete(db)
+        finally:
+            db.close()
         print("所有数据表检查/创建完成")
         
     except Exception as e:
         print(f"数据库初始化失败: {e}")
         raise
     
+    # 启动后台成本重算任务（会先处理上次退出时遗留的任务）
+    recalc_task = asyncio.create_task(run_recalc_worker())
+    
     yield
     
+    recalc_task.cancel()
+    try:
+        await recalc_task
+    except asyncio.CancelledError:
+        pass
     print("应用关闭")
 
 
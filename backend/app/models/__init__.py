@@ -16,11 +16,16 @@ from app.models.sale_receipt import SaleReceipt
 from app.models.inventory_loss import InventoryLoss
 from app.models.inventory_flow import InventoryFlow
 from app.models.operating_expense import OperatingExpense
+from app.models.cost_checkpoint import CostCheckpoint
+from app.models.cost_recalc_job import CostRecalcJob
+from app.models.goods_stats import GoodsStats
+from app.models.daily_metrics import DailyMetrics
 
 
 __all__ = [
     "Supplier", "Purchaser", "Goods", 
     "PurchaseInfo", "PurchaseStatement", 
     "PurchasePayment", "SaleInfo", "SaleStatement", "SaleReceipt",
-    "InventoryLoss", "InventoryFlow", "OperatingExpense"
+    "InventoryLoss", "InventoryFlow", "OperatingExpense",
+    "CostCheckpoint", "CostRecalcJob", "GoodsStats", "DailyMetrics"
 ]
\ No newline at end of file
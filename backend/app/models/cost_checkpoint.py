@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, Float, Date, ForeignKey, Index, UniqueConstraint
+from app.database import Base
+from app.models.base import TimestampMixin
+
+class CostCheckpoint(Base, TimestampMixin):
+    __tablename__ = "t_cost_checkpoint"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
+    goods_id = Column(Integer, ForeignKey("t_goods.id", onupdate="CASCADE", ondelete="RESTRICT"), nullable=False)
+    as_of_date = Column(Date, nullable=False, comment="快照日期（该日期之前所有记录回放后的期初状态）")
+    stock = Column(Integer, nullable=False, comment="库存数量")
+    unit_cost = Column(Float, nullable=False, comment="单位成本（未舍入，保证续算结果与全量回放一致）")
+    total_value = Column(Float, nullable=False, comment="库存总价值（未舍入）")
+    
+    __table_args__ = (
+        UniqueConstraint('goods_id', 'as_of_date', name='uix_cost_checkpoint_goods_date'),
+        {'comment': '商品成本回放检查点表'}
+    )
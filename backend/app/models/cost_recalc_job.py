@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, Date, ForeignKey, UniqueConstraint
+from app.database import Base
+from app.models.base import TimestampMixin
+
+class CostRecalcJob(Base, TimestampMixin):
+    __tablename__ = "t_cost_recalc_job"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
+    goods_id = Column(Integer, ForeignKey("t_goods.id", onupdate="CASCADE", ondelete="RESTRICT"), nullable=False)
+    since_date = Column(Date, nullable=False, comment="待回放的最早日期（同一商品的多次登记取最小值）")
+    
+    __table_args__ = (
+        UniqueConstraint('goods_id', name='uix_cost_recalc_job_goods'),
+        {'comment': '成本重算待处理任务表'}
+    )
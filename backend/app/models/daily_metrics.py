@@ -0,0 +1,20 @@
+from sqlalchemy import Column, Integer, Numeric, Date, Index
+from app.database import Base
+from app.models.base import TimestampMixin
+
+class DailyMetrics(Base, TimestampMixin):
+    __tablename__ = "t_daily_metrics"
+    
+    metric_date = Column(Date, primary_key=True, nullable=False, comment="汇总日期（销售/采购为所属对账单的结束日期，未结束的记为9999-12-31；运营杂费为费用日期）")
+    purchaser_id = Column(Integer, primary_key=True, default=0, nullable=False, comment="采购商ID（0 表示采购支出、运营杂费等非销售数据）")
+    goods_id = Column(Integer, primary_key=True, default=0, nullable=False, comment="商品ID（0 表示运营杂费）")
+    sale_revenue = Column(Numeric(14,2), default=0, nullable=False, comment="销售收入")
+    sale_cost = Column(Numeric(14,2), default=0, nullable=False, comment="销售成本")
+    sale_profit = Column(Numeric(14,2), default=0, nullable=False, comment="销售利润")
+    purchase_amount = Column(Numeric(14,2), default=0, nullable=False, comment="采购支出")
+    expense_amount = Column(Numeric(14,2), default=0, nullable=False, comment="运营杂费")
+    
+    __table_args__ = (
+        Index('idx_daily_metrics_goods_date', 'goods_id', 'metric_date'),
+        {'comment': '每日经营指标汇总表（随采购/销售/运营杂费写入及成本重算同步维护）'},
+    )
@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, Date, ForeignKey
+from app.database import Base
+from app.models.base import TimestampMixin
+
+class GoodsStats(Base, TimestampMixin):
+    __tablename__ = "t_goods_stats"
+    
+    goods_id = Column(Integer, ForeignKey("t_goods.id", onupdate="CASCADE", ondelete="RESTRICT"), primary_key=True, nullable=False)
+    last_purchase_date = Column(Date, nullable=True, comment="最后采购日期")
+    last_sale_date = Column(Date, nullable=True, comment="最后销售日期")
+    total_purchase_num = Column(Integer, default=0, nullable=False, comment="累计采购数量")
+    total_sale_num = Column(Integer, default=0, nullable=False, comment="累计销售数量")
+    total_loss_num = Column(Integer, default=0, nullable=False, comment="累计报损数量")
+    last_supplier_id = Column(Integer, ForeignKey("t_supplier.id", onupdate="CASCADE", ondelete="RESTRICT"), nullable=True, comment="最后一次采购的供货商ID")
+    
+    __table_args__ = (
+        {'comment': '商品业务统计表（随采购/销售/报损写入同步维护）'},
+    )
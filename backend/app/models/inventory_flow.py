@@ -6,16 +6,20 @@ class InventoryFlow(Base):
     
     id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
     goods_id = Column(Integer, ForeignKey("t_goods.id", onupdate="CASCADE", ondelete="RESTRICT"), nullable=False)
-    oper_type = Column(Integer, nullable=False, comment="操作类型：1-采购，2-销售，3-报损")
+    oper_type = Column(Integer, nullable=False, comment="操作类型：0-期初库存，1-采购，2-销售，3-报损")
     biz_id = Column(Integer, nullable=False, comment="关联业务ID")
     change_num = Column(Integer, nullable=False, comment="变动数量")
-    stock_before = Column(Integer, nullable=False, comment="操作前库存")
-    stock_after = Column(Integer, nullable=False, comment="操作后库存")
+    # 实际结存在读取时按 (操作时间, ID) 累计 change_num 得出，这两列只是录入时的快照
+    stock_before = Column(Integer, nullable=False, comment="录入时的操作前库存（快照）")
+    stock_after = Column(Integer, nullable=False, comment="录入时的操作后库存（快照）")
     oper_time = Column(DateTime, nullable=False, comment="操作时间")
     oper_source = Column(String(100), nullable=False, comment="操作来源")
     
     __table_args__ = (
         Index('idx_goods_oper', 'goods_id', 'oper_type'),
+        # 按商品累计结存、分页时的排序索引（同一时间的记录按 ID 确定先后），
+        # 带上变动数量使结存求和只读索引、不回表
+        Index('idx_goods_oper_time_id_num', 'goods_id', 'oper_time', 'id', 'change_num'),
         Index('idx_oper_time', 'oper_time'),
         Index('idx_biz_id', 'biz_id'),
         {'comment': '库存流动记录表'}
@@ -0,0 +1,72 @@
+from typing import Optional, Dict, List
+from datetime import date
+from sqlalchemy import and_, desc, func, insert
+from sqlalchemy.orm import Session
+from app.models.cost_checkpoint import CostCheckpoint
+
+class CostCheckpointRepository:
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_latest_on_or_before(self, goods_id: int, as_of_date: date) -> Optional[Dict]:
+        # 取不晚于指定日期的最近一个检查点，作为回放起点
+        obj = self.db.query(CostCheckpoint).filter(
+            CostCheckpoint.goods_id == goods_id,
+            CostCheckpoint.as_of_date <= as_of_date
+        ).order_by(desc(CostCheckpoint.as_of_date)).first()
+        return self._to_dict(obj) if obj else None
+    
+    def latest_on_or_before_subquery(self, as_of_date: date, goods_ids: Optional[List[int]] = None):
+        # 每个商品不晚于指定日期的最近检查点日期（按 (goods_id, as_of_date) 唯一索引分组取最大值）
+        query = self.db.query(
+            CostCheckpoint.goods_id.label("goods_id"),
+            func.max(CostCheckpoint.as_of_date).label("as_of_date")
+        ).filter(CostCheckpoint.as_of_date <= as_of_date)
+        if goods_ids is not None:
+            query = query.filter(CostCheckpoint.goods_id.in_(goods_ids))
+        return query.group_by(CostCheckpoint.goods_id).subquery()
+    
+    def list_latest_on_or_before(self, as_of_date: date, goods_ids: Optional[List[int]] = None) -> Dict[int, Dict]:
+        # 一次查询取回多个商品各自的最近检查点
+        latest = self.latest_on_or_before_subquery(as_of_date, goods_ids)
+        objs = self.db.query(CostCheckpoint).join(
+            latest,
+            and_(CostCheckpoint.goods_id == latest.c.goods_id, CostCheckpoint.as_of_date == latest.c.as_of_date)
+        ).all()
+        return {obj.goods_id: self._to_dict(obj) for obj in objs}
+    
+    def delete_after(self, goods_id: int, as_of_date: date) -> None:
+        # 指定日期之后的检查点包含了被修改的记录，全部作废
+        self.db.query(CostCheckpoint).filter(
+            CostCheckpoint.goods_id == goods_id,
+            CostCheckpoint.as_of_date > as_of_date
+        ).delete(synchronize_session=False)
+        self.db.flush()
+    
+    def delete_by_goods(self, goods_id: int) -> None:
+        self.db.query(CostCheckpoint).filter(
+            CostCheckpoint.goods_id == goods_id
+        ).delete(synchronize_session=False)
+        self.db.flush()
+    
+    def delete_all(self) -> None:
+        self.db.query(CostCheckpoint).delete(synchronize_session=False)
+        self.db.flush()
+    
+    def bulk_create(self, rows: List[Dict]) -> None:
+        if not rows:
+            return
+        self.db.execute(insert(CostCheckpoint), rows)
+        self.db.flush()
+    
+    def _to_dict(self, obj: CostCheckpoint) -> Dict:
+        return {
+            "id": obj.id,
+            "goods_id": obj.goods_id,
+            "as_of_date": obj.as_of_date,
+            "stock": obj.stock,
+            "unit_cost": obj.unit_cost,
+            "total_value": obj.total_value,
+            "create_time": obj.create_time,
+            "update_time": obj.update_time
+        }
@@ -0,0 +1,73 @@
+from typing import Optional, Dict, List, Iterable, Set
+from datetime import date
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.models.cost_recalc_job import CostRecalcJob
+from app.models.goods import Goods
+
+class CostRecalcJobRepository:
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def enqueue(self, goods_id: int, since_date: date) -> None:
+        # 同一商品只保留一条任务，重复登记时取更早的日期
+        stmt = sqlite_insert(CostRecalcJob).values(goods_id=goods_id, since_date=since_date)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CostRecalcJob.goods_id],
+            set_={
+                "since_date": func.min(CostRecalcJob.since_date, stmt.excluded.since_date),
+                "update_time": func.now()
+            }
+        )
+        self.db.execute(stmt)
+        self.db.flush()
+    
+    def get_batch(self, limit: int) -> List[Dict]:
+        # 按登记先后处理
+        objs = self.db.query(CostRecalcJob).order_by(CostRecalcJob.id).limit(limit).all()
+        return [self._to_dict(obj) for obj in objs]
+    
+    def delete_if_unchanged(self, goods_id: int, since_date: date) -> None:
+        # 处理期间若又登记了更早的日期，则保留任务等待下一轮
+        self.db.query(CostRecalcJob).filter(
+            CostRecalcJob.goods_id == goods_id,
+            CostRecalcJob.since_date >= since_date
+        ).delete(synchronize_session=False)
+        self.db.flush()
+    
+    def count(self) -> int:
+        return self.db.query(func.count(CostRecalcJob.id)).scalar()
+    
+    def list_pending(self, limit: int) -> List[Dict]:
+        results = self.db.query(
+            CostRecalcJob,
+            Goods.goods_name
+        ).outerjoin(
+            Goods, CostRecalcJob.goods_id == Goods.id
+        ).order_by(CostRecalcJob.id).limit(limit).all()
+        
+        items = []
+        for obj, g_name in results:
+            d = self._to_dict(obj)
+            d["goods_name"] = g_name
+            items.append(d)
+        return items
+    
+    def get_pending_goods_ids(self, goods_ids: Iterable[int]) -> Set[int]:
+        goods_ids = list(goods_ids)
+        if not goods_ids:
+            return set()
+        rows = self.db.query(CostRecalcJob.goods_id).filter(
+            CostRecalcJob.goods_id.in_(goods_ids)
+        ).all()
+        return {row[0] for row in rows}
+    
+    def _to_dict(self, obj: CostRecalcJob) -> Dict:
+        return {
+            "id": obj.id,
+            "goods_id": obj.goods_id,
+            "since_date": obj.since_date,
+            "create_time": obj.create_time,
+            "update_time": obj.update_time
+        }
@@ -0,0 +1,216 @@
+from typing import Optional, Dict, List, Iterable
+from datetime import date, datetime
+from sqlalchemy import func, insert, select, literal, union_all, true, cast, or_, Date, Float
+from sqlalchemy.orm import Session
+from app.models.daily_metrics import DailyMetrics
+from app.models.sale_info import SaleInfo
+from app.models.sale_statement import SaleStatement
+from app.models.purchase_info import PurchaseInfo
+from app.models.purchase_statement import PurchaseStatement
+from app.models.operating_expense import OperatingExpense
+from app.models.purchaser import Purchaser
+from app.models.goods import Goods
+
+
+# 未结束（end_date为空）对账单的汇总日期，查询时视为本日
+OPEN_STATEMENT_DATE = date(9999, 12, 31)
+
+
+def _to_date(value) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    return value
+
+
+def _statement_date(end_date_column):
+    # 对账单的汇总日期：结束日期，未结束的记为 OPEN_STATEMENT_DATE
+    return func.coalesce(end_date_column, literal(OPEN_STATEMENT_DATE, Date))
+
+
+def _in_range(start_date: date, end_date: date):
+    # 汇总日期在范围内的行；未结束的对账单视为本日，本日在范围内时一并统计
+    in_range = DailyMetrics.metric_date.between(start_date, end_date)
+    if start_date <= date.today() <= end_date:
+        return or_(in_range, DailyMetrics.metric_date == OPEN_STATEMENT_DATE)
+    return in_range
+
+
+class DailyMetricsRepository:
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def refresh_dates(self, dates: Iterable) -> int:
+        # 重新汇总指定汇总日期的全部指标（运营杂费写入、对账单确认/取消确认/删除后调用），在调用方事务内执行
+        dates = list(dict.fromkeys(_to_date(value) for value in dates if value is not None))
+        if not dates:
+            return 0
+        return self._refresh(
+            date_filter=lambda column: column.in_(dates),
+            delete_filter=DailyMetrics.metric_date.in_(dates)
+        )
+    
+    def refresh_statements(self, sale_statement_ids: Iterable[int] = (),
+                           purchase_statement_ids: Iterable[int] = (),
+                           goods_ids: Optional[Iterable[int]] = None) -> int:
+        # 重新汇总指定对账单所在汇总日期的销售/采购指标（销售/采购写入及成本重算回写后调用）
+        # goods_ids 不为空时只汇总这些商品
+        self.db.flush()
+        sale_statement_ids = list(sale_statement_ids)
+        purchase_statement_ids = list(purchase_statement_ids)
+        dates = set()
+        if sale_statement_ids:
+            dates.update(value for value, in self.db.query(
+                _statement_date(SaleStatement.end_date)
+            ).filter(SaleStatement.id.in_(sale_statement_ids)).distinct())
+        if purchase_statement_ids:
+            dates.update(value for value, in self.db.query(
+                _statement_date(PurchaseStatement.end_date)
+            ).filter(PurchaseStatement.id.in_(purchase_statement_ids)).distinct())
+        if not dates:
+            return 0
+        
+        delete_filter = DailyMetrics.metric_date.in_(dates)
+        if goods_ids is not None:
+            goods_ids = list(dict.fromkeys(goods_ids))
+            delete_filter = delete_filter & DailyMetrics.goods_id.in_(goods_ids)
+        return self._refresh(
+            date_filter=lambda column: column.in_(dates),
+            delete_filter=delete_filter,
+            goods_ids=goods_ids
+        )
+    
+    def rebuild(self) -> int:
+        # 从全部业务记录重建汇总表
+        return self._refresh(date_filter=lambda column: true(), delete_filter=true())
+    
+    def _refresh(self, date_filter, delete_filter, goods_ids: Optional[List[int]] = None) -> int:
+        # 销售/采购按所属对账单的结束日期汇总（与对账单统计口径一致，已删除的对账单不统计），
+        # 运营杂费按费用日期汇总；指定 goods_ids 时不汇总运营杂费
+        # 会话不自动 flush，先写出本事务中尚未提交的业务记录再汇总
+        self.db.flush()
+        zero = literal(0)
+        sale_date = _statement_date(SaleStatement.end_date)
+        purchase_date = _statement_date(PurchaseStatement.end_date)
+        sources = [
+            select(
+                sale_date,
+                SaleStatement.purchaser_id,
+                SaleInfo.goods_id,
+                func.sum(SaleInfo.sale_total_price),
+                func.sum(SaleInfo.trade_unit_cost * SaleInfo.sale_num * cast(SaleInfo.product_spec, Float)),
+                func.sum(SaleInfo.total_profit),
+                zero,
+                zero
+            ).join(
+                SaleStatement, SaleInfo.statement_id == SaleStatement.id
+            ).where(
+                date_filter(sale_date),
+                true() if goods_ids is None else SaleInfo.goods_id.in_(goods_ids),
+                SaleInfo.is_deleted == False,
+                SaleStatement.is_deleted == False
+            ).group_by(sale_date, SaleStatement.purchaser_id, SaleInfo.goods_id),
+            select(
+                purchase_date,
+                zero,
+                PurchaseInfo.goods_id,
+                zero,
+                zero,
+                zero,
+                func.sum(PurchaseInfo.purchase_total_price),
+                zero
+            ).join(
+                PurchaseStatement, PurchaseInfo.statement_id == PurchaseStatement.id
+            ).where(
+                date_filter(purchase_date),
+                true() if goods_ids is None else PurchaseInfo.goods_id.in_(goods_ids),
+                PurchaseInfo.is_deleted == False,
+                PurchaseStatement.is_deleted == False
+            ).group_by(purchase_date, PurchaseInfo.goods_id)
+        ]
+        if goods_ids is None:
+            sources.append(select(
+                OperatingExpense.expense_date,
+                zero,
+                zero,
+                zero,
+                zero,
+                zero,
+                zero,
+                func.sum(OperatingExpense.expense_amount)
+            ).where(
+                date_filter(OperatingExpense.expense_date),
+                OperatingExpense.is_deleted == False
+            ).group_by(OperatingExpense.expense_date))
+        
+        self.db.query(DailyMetrics).filter(delete_filter).delete(synchronize_session=False)
+        result = self.db.execute(insert(DailyMetrics).from_select([
+            DailyMetrics.metric_date,
+            DailyMetrics.purchaser_id,
+            DailyMetrics.goods_id,
+            DailyMetrics.sale_revenue,
+            DailyMetrics.sale_cost,
+            DailyMetrics.sale_profit,
+            DailyMetrics.purchase_amount,
+            DailyMetrics.expense_amount
+        ], union_all(*sources)))
+        self.db.flush()
+        return result.rowcount
+    
+    def count(self) -> int:
+        return self.db.query(func.count()).select_from(DailyMetrics).scalar()
+    
+    def sum_by_month(self, start_date: date, end_date: date) -> Dict[str, Dict[str, float]]:
+        # 按月汇总销售收入与支出（采购支出 + 运营杂费），未结束的对账单计入本日所在月份
+        # 按主键顺序逐日分组（无需临时排序），每日一行再在内存中并入所属月份
+        results = self.db.query(
+            DailyMetrics.metric_date,
+            func.sum(DailyMetrics.sale_revenue),
+            func.sum(DailyMetrics.purchase_amount + DailyMetrics.expense_amount)
+        ).filter(
+            _in_range(start_date, end_date)
+        ).group_by(DailyMetrics.metric_date).all()
+        today = date.today()
+        months: Dict[str, Dict[str, float]] = {}
+        for metric_date, revenue, expend in results:
+            if metric_date == OPEN_STATEMENT_DATE:
+                metric_date = today
+            totals = months.setdefault(metric_date.strftime("%Y-%m"), {"revenue": 0.0, "expend": 0.0})
+            totals["revenue"] += float(revenue or 0)
+            totals["expend"] += float(expend or 0)
+        return months
+    
+    def get_purchaser_profit_distribution(self, start_date: date, end_date: date) -> List[Dict]:
+        results = self.db.query(
+            Purchaser.purchaser_name,
+            func.sum(DailyMetrics.sale_profit).label("profit")
+        ).join(
+            Purchaser, DailyMetrics.purchaser_id == Purchaser.id
+        ).filter(
+            _in_range(start_date, end_date)
+        ).group_by(
+            Purchaser.purchaser_name
+        ).all()
+        return [
+            {"name": name, "value": float(profit or 0)}
+            for name, profit in results
+        ]
+    
+    def get_product_profit_distribution(self, start_date: date, end_date: date) -> List[Dict]:
+        # 只统计有销售的行（采购支出行的采购商ID为0）
+        results = self.db.query(
+            Goods.goods_name,
+            func.sum(DailyMetrics.sale_profit).label("profit")
+        ).join(
+            Goods, DailyMetrics.goods_id == Goods.id
+        ).filter(
+            _in_range(start_date, end_date),
+            DailyMetrics.purchaser_id != 0
+        ).group_by(
+            Goods.goods_name
+        ).all()
+        return [
+            {"name": name, "value": float(profit or 0)}
+            for name, profit in results
+        ]
@@ -0,0 +1,120 @@
+"""
+数据版本模块
+
+为每张业务表维护进程内的数据版本号，事务提交后递增被写入表的版本，供结果缓存判断是否失效。
+
+- 写入的表由会话事件自动收集：ORM 对象的增删改（flush）以及仓储中的批量 insert/update/delete，
+  各写入路径（采购、销售、报损、收付款、运营杂费、成本重算等）无需逐个登记
+- 事务回滚则丢弃收集结果，版本号不变
+- VersionedCache 以"依赖表的版本号组合"校验缓存项，任一依赖表被写入即视为失效
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Iterable, Tuple, Hashable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+# 会话中本事务写入的表名集合（Session.info 的键）
+_PENDING_KEY = "data_version_tables"
+
+_lock = threading.Lock()
+_versions: Dict[str, int] = {}
+
+
+def get_versions(tables: Iterable[str]) -> Tuple[int, ...]:
+    """按给定顺序返回各表当前的数据版本号"""
+    with _lock:
+        return tuple(_versions.get(table, 0) for table in tables)
+
+
+def bump(tables: Iterable[str]) -> None:
+    """递增各表的数据版本号"""
+    with _lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+
+
+class VersionedCache:
+    """
+    按依赖表数据版本校验的结果缓存
+
+    缓存项记录计算前读取的版本号组合，命中时要求与当前版本号完全一致；
+    计算期间若有事务提交，存入的旧版本号会让下一次读取重新计算。超出容量时淘汰最久未用的条目。
+    """
+    def __init__(self, tables: Iterable[str], max_entries: int = 256):
+        self.tables = tuple(tables)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple[int, ...], Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def versions(self) -> Tuple[int, ...]:
+        return get_versions(self.tables)
+
+    def get(self, key: Hashable, versions: Tuple[int, ...]) -> Optional[Any]:
+        """版本一致时返回缓存值，否则返回 None（计为未命中）"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == versions:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, versions: Tuple[int, ...], value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (versions, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "versions": dict(zip(self.tables, get_versions(self.tables)))
+            }
+
+
+def _record(session: Session, table_name: Optional[str]) -> None:
+    if table_name:
+        session.info.setdefault(_PENDING_KEY, set()).add(table_name)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed_tables(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(obj, "__table__", None)
+        _record(session, table.name if table is not None else None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_executed_tables(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        _record(orm_execute_state.session, getattr(table, "name", None))
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_committed_tables(session):
+    tables = session.info.pop(_PENDING_KEY, None)
+    if tables:
+        bump(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_tables(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,140 @@
+"""
+商品目录缓存模块
+
+进程内缓存全部商品的标识信息（ID、名称、规格、是否删除），按 (名称, 规格) 和 ID 建立索引，
+把录入采购/销售/报损时"按名称和规格查商品"的字符串查询变为字典查找加主键查询。
+
+- 启动时整表加载；商品新建随所在事务提交后写入缓存，事务回滚则丢弃，未提交的商品不会进入缓存
+- 每次变更递增版本号，依赖目录的派生结构（如联想输入索引）据此判断是否需要重建
+- 库存、成本等频繁变化的字段不缓存，命中后仍按主键读取最新记录；
+  若主键记录与缓存不一致（被外部修改），作废该条目并回退到按名称查询
+"""
+
+import threading
+from typing import Optional, Dict, Any, List, Tuple, NamedTuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.goods import Goods
+
+
+# 会话中待提交的目录变更（Session.info 的键）
+_PENDING_KEY = "goods_catalog_pending"
+
+
+class CatalogEntry(NamedTuple):
+    id: int
+    goods_name: str
+    product_spec: int
+    is_deleted: bool
+
+
+def _normalize_spec(spec) -> Optional[int]:
+    """路由层的规格可能是字符串，统一为整数；无法转换时返回 None（按未命中处理）"""
+    try:
+        return int(spec)
+    except (TypeError, ValueError):
+        return None
+
+
+class GoodsCatalog:
+    """
+    商品目录缓存
+    
+    读写均在锁内完成，可被事件循环线程和线程池同时访问。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_key: Dict[Tuple[str, int], CatalogEntry] = {}
+        self._by_id: Dict[int, CatalogEntry] = {}
+        self.loaded = False
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def load(self, db: Session) -> int:
+        """从数据库整表加载（覆盖现有内容），返回商品数"""
+        rows = db.query(Goods.id, Goods.goods_name, Goods.product_spec, Goods.is_deleted).all()
+        entries = [CatalogEntry(row[0], row[1], row[2], bool(row[3])) for row in rows]
+        with self._lock:
+            self._by_id = {entry.id: entry for entry in entries}
+            self._by_key = {(entry.goods_name, entry.product_spec): entry for entry in entries if not entry.is_deleted}
+            self.loaded = True
+            self.version += 1
+        return len(entries)
+    
+    def lookup(self, name: str, spec) -> Optional[CatalogEntry]:
+        """按 (名称, 规格) 查找未删除的商品；未加载或未命中返回 None"""
+        key = (name, _normalize_spec(spec))
+        with self._lock:
+            entry = self._by_key.get(key) if self.loaded else None
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+    
+    def get(self, goods_id: int) -> Optional[CatalogEntry]:
+        """按ID查找（含已删除商品）"""
+        with self._lock:
+            return self._by_id.get(goods_id)
+    
+    def entries(self) -> Tuple[int, List[CatalogEntry]]:
+        """返回当前版本号及全部未删除商品（供派生结构重建）"""
+        with self._lock:
+            return self.version, list(self._by_key.values())
+    
+    def stage(self, db: Session, entry: CatalogEntry) -> None:
+        """登记本事务内的商品变更，提交后生效"""
+        db.info.setdefault(_PENDING_KEY, []).append(entry)
+    
+    def apply(self, entries: List[CatalogEntry]) -> None:
+        """写入已提交的商品变更（新建、改名、删除均按最新状态覆盖）"""
+        with self._lock:
+            if not self.loaded:
+                return
+            for entry in entries:
+                old = self._by_id.get(entry.id)
+                if old is not None and self._by_key.get((old.goods_name, old.product_spec)) is old:
+                    del self._by_key[(old.goods_name, old.product_spec)]
+                self._by_id[entry.id] = entry
+                if not entry.is_deleted:
+                    self._by_key[(entry.goods_name, entry.product_spec)] = entry
+            self.version += 1
+    
+    def invalidate(self, goods_id: int) -> None:
+        """作废与数据库不一致的条目"""
+        with self._lock:
+            old = self._by_id.pop(goods_id, None)
+            if old is not None and self._by_key.get((old.goods_name, old.product_spec)) is old:
+                del self._by_key[(old.goods_name, old.product_spec)]
+            self.version += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "loaded": self.loaded,
+                "size": len(self._by_key),
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None
+            }
+
+
+# 进程内唯一实例
+goods_catalog = GoodsCatalog()
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_changes(session):
+    entries = session.info.pop(_PENDING_KEY, None)
+    if entries:
+        goods_catalog.apply(entries)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -4,15 +4,14 @@
 该模块定义了商品数据访问对象（Repository），负责商品相关的数据库操作。
 """
 
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from decimal import Decimal
-from datetime import datetime
 from sqlalchemy import func, desc
 from sqlalchemy.orm import Session
 
 from app.models.goods import Goods
-from app.models.purchase_info import PurchaseInfo
-from app.models.sale_info import SaleInfo
+from app.repositories.goods_catalog import goods_catalog, CatalogEntry
+from app.repositories.name_search import name_filter
 
 
 class GoodsRepository:
@@ -66,6 +65,9 @@ class GoodsRepository:
         """
         根据名称和规格获取商品信息
         
+        先在商品目录缓存中查找商品ID，命中后按主键读取最新记录；未命中或缓存与数据库不一致时按名称查询，
+        查到的商品随本事务提交写回商品目录（回滚则丢弃）。
+        
         Args:
             name (str): 商品名称
             spec (int): 商品规格
@@ -73,12 +75,25 @@ class GoodsRepository:
         Returns:
             Optional[Dict]: 商品信息字典，不存在返回None
         """
+        entry = goods_catalog.lookup(name, spec)
+        if entry is not None:
+            obj = self.db.query(Goods).filter(
+                Goods.id == entry.id,
+                Goods.is_deleted == False
+            ).first()
+            if obj and obj.goods_name == entry.goods_name and obj.product_spec == entry.product_spec:
+                return self._to_dict(obj)
+            goods_catalog.invalidate(entry.id)
+        
         obj = self.db.query(Goods).filter(
             Goods.goods_name == name,
             Goods.product_spec == spec,
             Goods.is_deleted == False
         ).first()
-        return self._to_dict(obj) if obj else None
+        if obj is None:
+            return None
+        goods_catalog.stage(self.db, CatalogEntry(obj.id, obj.goods_name, obj.product_spec, bool(obj.is_deleted)))
+        return self._to_dict(obj)
     
     def create(self, data: Dict) -> int:
         """
@@ -94,6 +109,8 @@ class GoodsRepository:
         self.db.add(obj)
         self.db.flush()
         self.db.refresh(obj)
+        # 事务提交后写入商品目录缓存
+        goods_catalog.stage(self.db, CatalogEntry(obj.id, obj.goods_name, obj.product_spec, bool(obj.is_deleted)))
         return obj.id
     
     def update_stock_and_cost(self, goods_id: int, new_stock: int, 
@@ -127,7 +144,7 @@ class GoodsRepository:
         """
         query = self.db.query(Goods.goods_name).distinct().filter(Goods.is_deleted == False)
         if keyword:
-            query = query.filter(Goods.goods_name.like(f"%{keyword}%"))
+            query = query.filter(name_filter(Goods.id, Goods.goods_name, keyword))
         objs = query.limit(limit).all()
         return [obj.goods_name for obj in objs]
     
@@ -147,10 +164,29 @@ class GoodsRepository:
             Goods.current_stock_num > 0
         )
         if keyword:
-            query = query.filter(Goods.goods_name.like(f"%{keyword}%"))
+            query = query.filter(name_filter(Goods.id, Goods.goods_name, keyword))
         objs = query.limit(limit).all()
         return [obj.goods_name for obj in objs]
     
+    def filter_names_with_stock(self, names: List[str]) -> set:
+        """
+        从给定商品名称中筛选出有库存的名称（按名称、规格唯一索引查找）
+        
+        Args:
+            names (List[str]): 商品名称列表
+        
+        Returns:
+            set: 有库存的商品名称集合
+        """
+        if not names:
+            return set()
+        objs = self.db.query(Goods.goods_name).distinct().filter(
+            Goods.goods_name.in_(names),
+            Goods.is_deleted == False,
+            Goods.current_stock_num > 0
+        ).all()
+        return {obj.goods_name for obj in objs}
+    
     def count_by_inventory_conditions(self, name: Optional[str], 
                                      min_num: Optional[int], max_num: Optional[int]) -> int:
         """
@@ -225,9 +261,12 @@ class GoodsRepository:
             Goods.current_stock_num < warning_line
         ).scalar()
     
-    def list_by_warning_line(self, warning_line: int, offset: int, limit: int) -> List[Dict]:
+    def page_by_warning_line(self, warning_line: int, offset: int, limit: int) -> Tuple[int, List[Dict]]:
         """
-        查询低于预警线的商品列表
+        分页查询低于预警线的商品，同时返回总数
+        
+        一条查询完成：总数用 COUNT(*) OVER () 与分页数据一起返回；最后采购日期和供货商
+        取自商品统计表，成本是否待重算取自重算任务表，均为按主键/唯一键的关联。
         
         Args:
             warning_line (int): 库存预警线
@@ -235,104 +274,41 @@ class GoodsRepository:
             limit (int): 限制数量
         
         Returns:
-            List[Dict]: 低于预警线的商品信息列表
-        """
-        objs = self.db.query(Goods).filter(
-            Goods.is_deleted == False,
-            Goods.current_stock_num < warning_line
-        ).order_by(Goods.current_stock_num.asc()).offset(offset).limit(limit).all()
-        return [self._to_dict(obj) for obj in objs]
-    
-    def get_last_purchase_date(self, goods_id: int) -> Optional[datetime]:
-        """
-        获取商品最后采购日期
-        
-        Args:
-            goods_id (int): 商品ID
-        
-        Returns:
-            Optional[datetime]: 最后采购日期
-        """
-        result = self.db.query(func.max(PurchaseInfo.purchase_date)).filter(
-            PurchaseInfo.goods_id == goods_id,
-            PurchaseInfo.is_deleted == False
-        ).scalar()
-        return result
-    
-    def get_last_sale_date(self, goods_id: int) -> Optional[datetime]:
-        """
-        获取商品最后销售日期
-        
-        Args:
-            goods_id (int): 商品ID
-        
-        Returns:
-            Optional[datetime]: 最后销售日期
-        """
-        result = self.db.query(func.max(SaleInfo.sale_date)).filter(
-            SaleInfo.goods_id == goods_id,
-            SaleInfo.is_deleted == False
-        ).scalar()
-        return result
-    
-    def get_total_purchase_num(self, goods_id: int) -> int:
-        """
-        获取商品总采购数量
-        
-        Args:
-            goods_id (int): 商品ID
-        
-        Returns:
-            int: 总采购数量
-        """
-        result = self.db.query(func.sum(PurchaseInfo.purchase_num)).filter(
-            PurchaseInfo.goods_id == goods_id,
-            PurchaseInfo.is_deleted == False
-        ).scalar()
-        return result or 0
-    
-    def get_total_sale_num(self, goods_id: int) -> int:
+            Tuple[int, List[Dict]]: 总数、当前页商品信息（含 last_purchase_date、supplier_name、cost_pending）
         """
-        获取商品总销售数量
-        
-        Args:
-            goods_id (int): 商品ID
-        
-        Returns:
-            int: 总销售数量
-        """
-        result = self.db.query(func.sum(SaleInfo.sale_num)).filter(
-            SaleInfo.goods_id == goods_id,
-            SaleInfo.is_deleted == False
-        ).scalar()
-        return result or 0
-    
-    def get_last_purchase_info(self, goods_id: int) -> Optional[Dict]:
-        """
-        获取商品最后采购信息
-        
-        Args:
-            goods_id (int): 商品ID
-        
-        Returns:
-            Optional[Dict]: 最后采购信息，包含采购日期和供货商名
-        """
-        # 最后采购信息包含供货商名
+        from app.models.goods_stats import GoodsStats
         from app.models.supplier import Supplier
-        result = self.db.query(PurchaseInfo, Supplier.supplier_name).join(
-            Supplier, PurchaseInfo.supplier_id == Supplier.id
+        from app.models.cost_recalc_job import CostRecalcJob
+        
+        rows = self.db.query(
+            Goods,
+            GoodsStats.last_purchase_date,
+            Supplier.supplier_name,
+            CostRecalcJob.id,
+            func.count().over().label("total")
+        ).outerjoin(
+            GoodsStats, GoodsStats.goods_id == Goods.id
+        ).outerjoin(
+            Supplier, Supplier.id == GoodsStats.last_supplier_id
+        ).outerjoin(
+            CostRecalcJob, CostRecalcJob.goods_id == Goods.id
         ).filter(
-            PurchaseInfo.goods_id == goods_id,
-            PurchaseInfo.is_deleted == False
-        ).order_by(desc(PurchaseInfo.purchase_date)).first()
-        
-        if result:
-            purchase_info, supplier_name = result
-            return {
-                "purchase_date": purchase_info.purchase_date,
-                "supplier_name": supplier_name
-            }
-        return None
+            Goods.is_deleted == False,
+            Goods.current_stock_num < warning_line
+        ).order_by(Goods.current_stock_num.asc(), Goods.id.asc()).offset(offset).limit(limit).all()
+        
+        if not rows:
+            # 页码超出范围时窗口函数没有结果行，单独统计总数
+            return self.count_by_warning_line(warning_line), []
+        items = []
+        for obj, last_purchase_date, supplier_name, job_id, _ in rows:
+            items.append(dict(
+                self._to_dict(obj),
+                last_purchase_date=last_purchase_date,
+                supplier_name=supplier_name,
+                cost_pending=job_id is not None
+            ))
+        return rows[0].total, items
     
     def get_total_inventory_value(self) -> Decimal:
         """
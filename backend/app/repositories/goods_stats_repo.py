@@ -0,0 +1,228 @@
+from typing import Optional, Dict, List
+from datetime import date, datetime
+from sqlalchemy import func, desc, insert, select, update, case, or_, true
+from sqlalchemy.orm import Session
+from app.models.goods import Goods
+from app.models.goods_stats import GoodsStats
+from app.models.purchase_info import PurchaseInfo
+from app.models.sale_info import SaleInfo
+from app.models.inventory_loss import InventoryLoss
+from app.models.supplier import Supplier
+
+
+
+def _to_date(value) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], "%Y-%m-%d").date()
+    return value
+
+
+class GoodsStatsRepository:
+    def __init__(self, db: Session):
+        self.db = db
+    
+    # 写入路径按单条记录增量维护统计行（在调用方事务内执行）：
+    # 新增累加数量并前移最后日期/供货商；删除或修改只在旧记录早于最后日期时增量扣减，
+    # 触及最后日期（最后日期/供货商可能回退）或商品尚无统计行时改为按明细重新汇总该商品
+    
+    def add_purchase(self, goods_id: int, num: int, purchase_date, supplier_id: int) -> None:
+        # 新增采购的ID最大，同日也取代原最后一次采购
+        if not self._record_purchase(goods_id, num, purchase_date, supplier_id, replace_same_day=True):
+            self.refresh([goods_id])
+    
+    def remove_purchase(self, goods_id: int, num: int, purchase_date) -> None:
+        if not self._revoke_purchase(goods_id, num, purchase_date):
+            self.refresh([goods_id])
+    
+    def update_purchase(self, old_goods_id: int, old_num: int, old_date,
+                        new_goods_id: int, new_num: int, new_date, new_supplier_id: int) -> None:
+        # 修改后的记录保留原ID，与最后采购日期同日时无法判断先后，也改为重新汇总
+        if not (self._revoke_purchase(old_goods_id, old_num, old_date)
+                and self._record_purchase(new_goods_id, new_num, new_date, new_supplier_id, replace_same_day=False)):
+            self.refresh([old_goods_id, new_goods_id])
+    
+    def add_sale(self, goods_id: int, num: int, sale_date) -> None:
+        if not self._record_sale(goods_id, num, sale_date):
+            self.refresh([goods_id])
+    
+    def remove_sale(self, goods_id: int, num: int, sale_date) -> None:
+        if not self._revoke_sale(goods_id, num, sale_date):
+            self.refresh([goods_id])
+    
+    def update_sale(self, old_goods_id: int, old_num: int, old_date,
+                    new_goods_id: int, new_num: int, new_date) -> None:
+        if not (self._revoke_sale(old_goods_id, old_num, old_date)
+                and self._record_sale(new_goods_id, new_num, new_date)):
+            self.refresh([old_goods_id, new_goods_id])
+    
+    def add_loss(self, goods_id: int, num: int) -> None:
+        if not self._adjust(goods_id, total_loss_num=GoodsStats.total_loss_num + num):
+            self.refresh([goods_id])
+    
+    def remove_loss(self, goods_id: int, num: int) -> None:
+        if not self._adjust(goods_id, total_loss_num=GoodsStats.total_loss_num - num):
+            self.refresh([goods_id])
+    
+    def _record_purchase(self, goods_id: int, num: int, purchase_date, supplier_id: int,
+                         replace_same_day: bool) -> bool:
+        purchase_date = _to_date(purchase_date)
+        last_date = GoodsStats.last_purchase_date
+        if replace_same_day:
+            is_latest = or_(last_date.is_(None), last_date <= purchase_date)
+            condition = true()
+        else:
+            is_latest = or_(last_date.is_(None), last_date < purchase_date)
+            condition = or_(last_date.is_(None), last_date != purchase_date)
+        return self._adjust(
+            goods_id,
+            condition,
+            total_purchase_num=GoodsStats.total_purchase_num + num,
+            last_purchase_date=case((is_latest, purchase_date), else_=last_date),
+            last_supplier_id=case((is_latest, supplier_id), else_=GoodsStats.last_supplier_id)
+        )
+    
+    def _revoke_purchase(self, goods_id: int, num: int, purchase_date) -> bool:
+        return self._adjust(
+            goods_id,
+            GoodsStats.last_purchase_date > _to_date(purchase_date),
+            total_purchase_num=GoodsStats.total_purchase_num - num
+        )
+    
+    def _record_sale(self, goods_id: int, num: int, sale_date) -> bool:
+        sale_date = _to_date(sale_date)
+        last_date = GoodsStats.last_sale_date
+        return self._adjust(
+            goods_id,
+            total_sale_num=GoodsStats.total_sale_num + num,
+            last_sale_date=case((or_(last_date.is_(None), last_date < sale_date), sale_date), else_=last_date)
+        )
+    
+    def _revoke_sale(self, goods_id: int, num: int, sale_date) -> bool:
+        return self._adjust(
+            goods_id,
+            GoodsStats.last_sale_date > _to_date(sale_date),
+            total_sale_num=GoodsStats.total_sale_num - num
+        )
+    
+    def _adjust(self, goods_id: int, condition=None, **values) -> bool:
+        # 条件满足时原地更新统计行（SET 中的列引用均为更新前的值），返回是否更新成功
+        result = self.db.execute(
+            update(GoodsStats).where(
+                GoodsStats.goods_id == goods_id,
+                true() if condition is None else condition
+            ).values(**values).execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+    
+    def refresh(self, goods_ids: Optional[List[int]] = None) -> int:
+        # 从采购、销售、报损记录重新汇总指定商品的统计（None 表示全部商品），在调用方事务内执行
+        # 用于启动初始化、手动重建，以及无法增量维护的删除/修改
+        if goods_ids is not None:
+            goods_ids = list(dict.fromkeys(goods_id for goods_id in goods_ids if goods_id is not None))
+            if not goods_ids:
+                return 0
+        # 会话不自动 flush，先写出本事务中尚未提交的业务记录再汇总
+        self.db.flush()
+        
+        def _goods_filter(column):
+            return true() if goods_ids is None else column.in_(goods_ids)
+        
+        purchase = select(
+            PurchaseInfo.goods_id,
+            func.max(PurchaseInfo.purchase_date).label("last_date"),
+            func.sum(PurchaseInfo.purchase_num).label("total_num")
+        ).where(
+            _goods_filter(PurchaseInfo.goods_id),
+            PurchaseInfo.is_deleted == False
+        ).group_by(PurchaseInfo.goods_id).subquery()
+        sale = select(
+            SaleInfo.goods_id,
+            func.max(SaleInfo.sale_date).label("last_date"),
+            func.sum(SaleInfo.sale_num).label("total_num")
+        ).where(
+            _goods_filter(SaleInfo.goods_id),
+            SaleInfo.is_deleted == False
+        ).group_by(SaleInfo.goods_id).subquery()
+        loss = select(
+            InventoryLoss.goods_id,
+            func.sum(InventoryLoss.loss_num).label("total_num")
+        ).where(
+            _goods_filter(InventoryLoss.goods_id),
+            InventoryLoss.is_deleted == False
+        ).group_by(InventoryLoss.goods_id).subquery()
+        # 最后一次采购（同日取ID最大者）的供货商
+        last_supplier = select(PurchaseInfo.supplier_id).where(
+            PurchaseInfo.goods_id == Goods.id,
+            PurchaseInfo.is_deleted == False
+        ).order_by(desc(PurchaseInfo.purchase_date), desc(PurchaseInfo.id)).limit(1).scalar_subquery()
+        
+        rows = select(
+            Goods.id,
+            purchase.c.last_date,
+            sale.c.last_date,
+            func.coalesce(purchase.c.total_num, 0),
+            func.coalesce(sale.c.total_num, 0),
+            func.coalesce(loss.c.total_num, 0),
+            last_supplier
+        ).outerjoin(
+            purchase, purchase.c.goods_id == Goods.id
+        ).outerjoin(
+            sale, sale.c.goods_id == Goods.id
+        ).outerjoin(
+            loss, loss.c.goods_id == Goods.id
+        ).where(_goods_filter(Goods.id))
+        
+        self.db.query(GoodsStats).filter(
+            _goods_filter(GoodsStats.goods_id)
+        ).delete(synchronize_session=False)
+        result = self.db.execute(insert(GoodsStats).from_select([
+            GoodsStats.goods_id,
+            GoodsStats.last_purchase_date,
+            GoodsStats.last_sale_date,
+            GoodsStats.total_purchase_num,
+            GoodsStats.total_sale_num,
+            GoodsStats.total_loss_num,
+            GoodsStats.last_supplier_id
+        ], rows))
+        self.db.flush()
+        return result.rowcount
+    
+    def count(self) -> int:
+        return self.db.query(func.count(GoodsStats.goods_id)).scalar()
+    
+    def get_by_goods_ids(self, goods_ids: List[int]) -> Dict[int, Dict]:
+        # 没有统计行的商品（尚无任何采购/销售/报损）按空统计返回
+        goods_ids = list(goods_ids)
+        stats = dict.fromkeys(goods_ids)
+        if goods_ids:
+            results = self.db.query(GoodsStats, Supplier.supplier_name).outerjoin(
+                Supplier, GoodsStats.last_supplier_id == Supplier.id
+            ).filter(GoodsStats.goods_id.in_(goods_ids)).all()
+            for obj, supplier_name in results:
+                stats[obj.goods_id] = dict(self._to_dict(obj), last_supplier_name=supplier_name)
+        return {
+            goods_id: item or {
+                "goods_id": goods_id,
+                "last_purchase_date": None,
+                "last_sale_date": None,
+                "total_purchase_num": 0,
+                "total_sale_num": 0,
+                "total_loss_num": 0,
+                "last_supplier_id": None,
+                "last_supplier_name": None
+            }
+            for goods_id, item in stats.items()
+        }
+    
+    def _to_dict(self, obj: GoodsStats) -> Dict:
+        return {
+            "goods_id": obj.goods_id,
+            "last_purchase_date": obj.last_purchase_date,
+            "last_sale_date": obj.last_sale_date,
+            "total_purchase_num": obj.total_purchase_num,
+            "total_sale_num": obj.total_sale_num,
+            "total_loss_num": obj.total_loss_num,
+            "last_supplier_id": obj.last_supplier_id
+        }
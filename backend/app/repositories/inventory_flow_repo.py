@@ -1,9 +1,13 @@
 from typing import Optional
-from typing import Dict, List
-from datetime import datetime
-from sqlalchemy import func, desc
+from typing import Dict, List, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy import func, desc, tuple_, select
 from sqlalchemy.orm import Session
 from app.models.inventory_flow import InventoryFlow
+from app.models.goods import Goods
+
+# 期初库存流水的操作类型（结存按流水累计，补齐流水之外的库存）
+OPENING_OPER_TYPE = 0
 
 class InventoryFlowRepository:
     def __init__(self, db: Session):
@@ -12,52 +16,44 @@ class InventoryFlowRepository:
     def create(self, data: Dict) -> int:
         """创建库存流动记录，支持非顺序录入
         
-        逻辑：
-        1. 筛选该商品的所有库存流动记录
-        2. 找到所有日期大于新创建记录日期的记录
-        3. 在这些记录中，找到离新创建日期最近的记录的变动前数量，作为新记录的变动前数量
-        4. 根据变动量计算新记录的变动后数量
-        5. 更新所有日期比新创建日期靠后的数据，调整它们的变动前和变动后数量
+        变动前后库存不再逐行维护：结存由读取时按 (操作时间, ID) 累计变动数量得出，
+        追溯录入不需要改写之后的记录。stock_before / stock_after 列只保存录入时调用方传入的值。
         """
-        goods_id = data['goods_id']
-        oper_time = data['oper_time']
-        change_num = data['change_num']
-        
-        # 找到所有日期大于新创建记录日期的记录
-        future_records = self.db.query(InventoryFlow).filter(
-            InventoryFlow.goods_id == goods_id,
-            InventoryFlow.oper_time > oper_time
-        ).order_by(InventoryFlow.oper_time).all()
-        
-        # 计算新记录的stock_before和stock_after
-        if future_records:
-            # 找到离新创建日期最近的记录的变动前数量
-            nearest_record = future_records[0]
-            stock_before = nearest_record.stock_before
-        else:
-            # 如果没有未来记录，使用传入的stock_before
-            stock_before = data.get('stock_before', 0)
-        
-        stock_after = stock_before + change_num
-        
-        # 创建新记录
-        new_data = data.copy()
-        new_data['stock_before'] = stock_before
-        new_data['stock_after'] = stock_after
-        
-        obj = InventoryFlow(**new_data)
+        obj = InventoryFlow(**data)
         self.db.add(obj)
-        self.db.flush()
-        self.db.refresh(obj)
-        
-        # 更新所有日期比新创建日期靠后的数据
-        for record in future_records:
-            record.stock_before += change_num
-            record.stock_after += change_num
-        
         self.db.flush()
         return obj.id
     
+    def _with_balance(self, goods_id: Optional[int] = None, end_date: datetime = None, goods_ids=None):
+        """
+        带结存的流水子查询：按商品分区、(操作时间, ID) 排序累计变动数量
+        
+        窗口函数在开始日期、操作类型等过滤之前计算，因此结存始终基于该商品的全部历史；
+        只有不影响结存的条件在窗口之前过滤：截止时间之后的记录，以及未涉及的商品（goods_ids 可为子查询）。
+        """
+        stock_after = func.sum(InventoryFlow.change_num).over(
+            partition_by=InventoryFlow.goods_id,
+            order_by=(InventoryFlow.oper_time, InventoryFlow.id)
+        )
+        query = self.db.query(
+            InventoryFlow.id,
+            InventoryFlow.goods_id,
+            InventoryFlow.oper_type,
+            InventoryFlow.biz_id,
+            InventoryFlow.change_num,
+            (stock_after - InventoryFlow.change_num).label("stock_before"),
+            stock_after.label("stock_after"),
+            InventoryFlow.oper_time,
+            InventoryFlow.oper_source
+        )
+        if goods_id:
+            query = query.filter(InventoryFlow.goods_id == goods_id)
+        elif goods_ids is not None:
+            query = query.filter(InventoryFlow.goods_id.in_(goods_ids))
+        if end_date:
+            query = query.filter(InventoryFlow.oper_time <= end_date)
+        return query.subquery()
+    
     def count_by_goods_and_date(self, goods_id: int, start_date: datetime = None, end_date: datetime = None) -> int:
         query = self.db.query(func.count(InventoryFlow.id)).filter(
             InventoryFlow.goods_id == goods_id
@@ -70,73 +66,157 @@ class InventoryFlowRepository:
     
     def list_by_goods_and_date(self, goods_id: int, start_date: datetime = None, 
                                end_date: datetime = None, offset: int = 0, limit: int = 10) -> List[Dict]:
-        query = self.db.query(InventoryFlow).filter(
-            InventoryFlow.goods_id == goods_id
-        )
+        flow = self._with_balance(goods_id, end_date)
+        query = self.db.query(flow)
         if start_date:
-            query = query.filter(InventoryFlow.oper_time >= start_date)
+            query = query.filter(flow.c.oper_time >= start_date)
         if end_date:
-            query = query.filter(InventoryFlow.oper_time <= end_date)
-        objs = query.order_by(desc(InventoryFlow.oper_time), desc(InventoryFlow.id)).offset(offset).limit(limit).all()
-        return [self._to_dict(obj) for obj in objs]
+            query = query.filter(flow.c.oper_time <= end_date)
+        rows = query.order_by(desc(flow.c.oper_time), desc(flow.c.id)).offset(offset).limit(limit).all()
+        return [self._to_dict(row) for row in rows]
     
-    def delete_by_biz(self, oper_type: int, biz_id: int) -> None:
-        """删除库存流动记录，支持非顺序操作
+    def list_by_goods_keyset(self, goods_id: int, before: Optional[Tuple[datetime, int]] = None,
+                             limit: int = 10) -> Tuple[List[Dict], bool]:
+        """
+        按 (操作时间, ID) 倒序的键集分页，沿 (goods_id, oper_time, id) 索引直接定位，不使用 OFFSET
+        
+        Args:
+            goods_id (int): 商品ID
+            before (Optional[Tuple[datetime, int]]): 上一页最后一条的 (操作时间, ID)，None 表示第一页
+            limit (int): 每页条数
         
-        逻辑：
-        1. 找到要删除的记录
-        2. 获取记录的goods_id、oper_time和change_num
-        3. 找到所有日期大于该记录日期的记录
-        4. 对这些记录的stock_before和stock_after进行逆向变动（即减去change_num）
-        5. 删除原记录
+        Returns:
+            Tuple[List[Dict], bool]: 本页记录（含结存）及是否还有下一页
         """
-        # 先找到要删除的记录，获取相关信息
-        records_to_delete = self.db.query(InventoryFlow).filter(
-            InventoryFlow.oper_type == oper_type,
-            InventoryFlow.biz_id == biz_id
+        query = self.db.query(InventoryFlow).filter(InventoryFlow.goods_id == goods_id)
+        if before is not None:
+            query = query.filter(tuple_(InventoryFlow.oper_time, InventoryFlow.id) < tuple_(*before))
+        objs = query.order_by(desc(InventoryFlow.oper_time), desc(InventoryFlow.id)).limit(limit + 1).all()
+        has_more = len(objs) > limit
+        objs = objs[:limit]
+        
+        # 本页第一条的变动后库存 = 位置之前全部流水的累计（沿同一索引范围求和，不信任客户端传入的结存）
+        balance_query = self.db.query(func.coalesce(func.sum(InventoryFlow.change_num), 0)).filter(
+            InventoryFlow.goods_id == goods_id
+        )
+        if before is not None:
+            balance_query = balance_query.filter(
+                tuple_(InventoryFlow.oper_time, InventoryFlow.id) < tuple_(*before)
+            )
+        balance = balance_query.scalar()
+        
+        # 倒序逐条回推：本条变动后库存 = 上一条（更晚记录）的变动前库存
+        items = []
+        for obj in objs:
+            item = self._to_dict(obj)
+            item["stock_after"] = balance
+            item["stock_before"] = balance - obj.change_num
+            balance = item["stock_before"]
+            items.append(item)
+        return items, has_more
+    
+    def get_balance_before(self, goods_id: int, end_time: datetime) -> Tuple[int, Optional[datetime]]:
+        # 截至指定时间（不含）的流水结存及最后一次变动时间，走 (goods_id, oper_time, id) 索引的范围扫描
+        balance, last_time = self.db.query(
+            func.coalesce(func.sum(InventoryFlow.change_num), 0),
+            func.max(InventoryFlow.oper_time)
+        ).filter(
+            InventoryFlow.goods_id == goods_id,
+            InventoryFlow.oper_time < end_time
+        ).one()
+        return int(balance), last_time
+    
+    def sum_by_goods_before(self, end_time: datetime, goods_ids: Optional[List[int]] = None) -> Dict[int, int]:
+        # 截至指定时间（不含）各商品的流水结存，一条分组汇总查询
+        query = self.db.query(
+            InventoryFlow.goods_id,
+            func.sum(InventoryFlow.change_num)
+        ).filter(InventoryFlow.oper_time < end_time)
+        if goods_ids is not None:
+            query = query.filter(InventoryFlow.goods_id.in_(goods_ids))
+        return {goods_id: int(balance or 0) for goods_id, balance in query.group_by(InventoryFlow.goods_id)}
+    
+    def insert_opening_balances(self) -> int:
+        """
+        为流水累计与当前库存不一致的商品补一条期初库存流水（在调用方事务内执行）
+        
+        结存按流水累计得出，只有流水覆盖了全部库存变动时才与实际库存一致；
+        已有数据可能带有期初库存或缺少部分流水，差额作为期初记录排在该商品最早的流水之前。
+        已有期初记录的商品不再重复补录。
+        """
+        self.db.flush()
+        totals = select(
+            InventoryFlow.goods_id,
+            func.sum(InventoryFlow.change_num).label("total"),
+            func.min(InventoryFlow.oper_time).label("first_time"),
+            func.max(InventoryFlow.oper_type == OPENING_OPER_TYPE).label("has_opening")
+        ).group_by(InventoryFlow.goods_id).subquery()
+        rows = self.db.query(
+            Goods.id,
+            Goods.current_stock_num,
+            func.coalesce(totals.c.total, 0),
+            totals.c.first_time,
+            Goods.create_time
+        ).outerjoin(
+            totals, totals.c.goods_id == Goods.id
+        ).filter(
+            Goods.is_deleted == False,
+            func.coalesce(totals.c.has_opening, 0) == 0,
+            Goods.current_stock_num != func.coalesce(totals.c.total, 0)
         ).all()
         
-        for record in records_to_delete:
-            goods_id = record.goods_id
-            oper_time = record.oper_time
-            change_num = record.change_num
-            
-            # 找到所有日期大于该记录日期的记录
-            future_records = self.db.query(InventoryFlow).filter(
-                InventoryFlow.goods_id == goods_id,
-                InventoryFlow.oper_time > oper_time
-            ).all()
-            
-            # 对这些记录的stock_before和stock_after进行逆向变动
-            for future_record in future_records:
-                future_record.stock_before -= change_num
-                future_record.stock_after -= change_num
+        for goods_id, current_stock, total, first_time, create_time in rows:
+            diff = int(current_stock) - int(total)
+            self.db.add(InventoryFlow(
+                goods_id=goods_id,
+                oper_type=OPENING_OPER_TYPE,
+                biz_id=0,
+                change_num=diff,
+                stock_before=0,
+                stock_after=diff,
+                oper_time=first_time - timedelta(seconds=1) if first_time else create_time,
+                oper_source="期初库存"
+            ))
+        self.db.flush()
+        return len(rows)
+    
+    def delete_by_biz(self, oper_type: int, biz_id: int) -> None:
+        """删除库存流动记录，支持非顺序操作
         
-        # 删除原记录
+        之后记录的结存在读取时累计得出，删除不需要改写其他记录。
+        """
         self.db.query(InventoryFlow).filter(
             InventoryFlow.oper_type == oper_type,
             InventoryFlow.biz_id == biz_id
-        ).delete()
-        
+        ).delete(synchronize_session=False)
         self.db.flush()
     
     def list_by_conditions(self, goods_id: Optional[int], oper_type: Optional[int],
                           start_date: datetime, end_date: datetime, 
                           offset: int, limit: int) -> List[Dict]:
-        query = self.db.query(InventoryFlow)
-        if goods_id:
-            query = query.filter(InventoryFlow.goods_id == goods_id)
+        goods_ids = None
+        if not goods_id:
+            # 不限商品时，窗口只计算在查询范围内有流水的商品（仍需其截止时间前的全部历史）
+            goods_ids = select(InventoryFlow.goods_id).distinct()
+            if oper_type:
+                goods_ids = goods_ids.where(InventoryFlow.oper_type == oper_type)
+            if start_date:
+                goods_ids = goods_ids.where(InventoryFlow.oper_time >= start_date)
+            if end_date:
+                goods_ids = goods_ids.where(InventoryFlow.oper_time <= end_date)
+        flow = self._with_balance(goods_id, end_date, goods_ids)
+        query = self.db.query(flow)
         if oper_type:
-            query = query.filter(InventoryFlow.oper_type == oper_type)
+            query = query.filter(flow.c.oper_type == oper_type)
         if start_date:
-            query = query.filter(InventoryFlow.oper_time >= start_date)
+            query = query.filter(flow.c.oper_time >= start_date)
         if end_date:
-            query = query.filter(InventoryFlow.oper_time <= end_date)
+            query = query.filter(flow.c.oper_time <= end_date)
         
-        objs = query.order_by(desc(InventoryFlow.oper_time), desc(InventoryFlow.id)).offset(offset).limit(limit).all()
-        return [self._to_dict(obj) for obj in objs]
+        rows = query.order_by(desc(flow.c.oper_time), desc(flow.c.id)).offset(offset).limit(limit).all()
+        return [self._to_dict(row) for row in rows]
     
-    def _to_dict(self, obj: InventoryFlow) -> Dict:
+    def _to_dict(self, obj) -> Dict:
         return {
             "id": obj.id,
             "goods_id": obj.goods_id,
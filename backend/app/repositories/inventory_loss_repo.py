@@ -4,6 +4,7 @@ from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.models.inventory_loss import InventoryLoss
 from app.models.goods import Goods
+from app.repositories.name_search import name_filter
 
 class InventoryLossRepository:
     def __init__(self, db: Session):
@@ -40,7 +41,7 @@ class InventoryLossRepository:
         if id:
             query = query.filter(InventoryLoss.id == id)
         if product_name:
-            query = query.filter(Goods.goods_name.like(f"%{product_name}%"))
+            query = query.filter(name_filter(InventoryLoss.goods_id, Goods.goods_name, product_name))
         if start_date:
             query = query.filter(InventoryLoss.loss_date >= start_date)
         if end_date:
@@ -59,7 +60,7 @@ class InventoryLossRepository:
         if id:
             query = query.filter(InventoryLoss.id == id)
         if product_name:
-            query = query.filter(Goods.goods_name.like(f"%{product_name}%"))
+            query = query.filter(name_filter(InventoryLoss.goods_id, Goods.goods_name, product_name))
         if start_date:
             query = query.filter(InventoryLoss.loss_date >= start_date)
         if end_date:
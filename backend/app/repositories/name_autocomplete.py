@@ -0,0 +1,324 @@
+"""
+名称联想索引模块
+
+进程内为商品、供货商、采购商名称建立联想索引，下拉联想直接在内存中查找，不再访问数据库。
+
+- 每个名称生成一组检索键：名称的全部后缀（保持原"包含关键字"的匹配语义）、拼音全拼及首字母
+  （按音节起点取后缀），检索键排成有序数组，关键字按前缀二分查找，如输入 "xm" 可联想出"小米"
+- 已安装 pypinyin 时使用其拼音（可识别多音字、覆盖全部汉字）；未安装时按 GB2312 一级汉字的
+  拼音排序区间推算首字母，只支持首字母检索
+- 结果按最近使用排序：启动时取最后一次采购/销售日期，之后每次录入单据把所用名称提到最前
+- 供货商/采购商的新增、改名、删除及录入单据的使用记录随所在事务提交后写入索引，事务回滚则丢弃；
+  商品名称跟随商品目录缓存（goods_catalog）的版本号增量同步
+"""
+
+import bisect
+import heapq
+import itertools
+import threading
+from datetime import date
+from typing import Optional, Dict, List, Tuple, Iterable
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+try:
+    from pypinyin import lazy_pinyin, Style
+    HAS_PYPINYIN = True
+except ImportError:  # pragma: no cover - pypinyin 为可选依赖
+    lazy_pinyin = Style = None
+    HAS_PYPINYIN = False
+
+from app.models.goods import Goods
+from app.models.goods_stats import GoodsStats
+from app.models.supplier import Supplier
+from app.models.purchaser import Purchaser
+from app.models.purchase_info import PurchaseInfo
+from app.models.sale_info import SaleInfo
+from app.repositories.goods_catalog import goods_catalog
+
+
+# 会话中待提交的索引变更（Session.info 的键）
+_PENDING_KEY = "name_autocomplete_pending"
+
+# GB2312 一级汉字（按拼音排序）各首字母的起始编码，及一级汉字区的结束编码
+_GB2312_INITIALS = (
+    (0xB0A1, "a"), (0xB0C5, "b"), (0xB2C1, "c"), (0xB4EE, "d"), (0xB6EA, "e"), (0xB7A2, "f"),
+    (0xB8C1, "g"), (0xB9FE, "h"), (0xBBF7, "j"), (0xBFA6, "k"), (0xC0AC, "l"), (0xC2E8, "m"),
+    (0xC4C3, "n"), (0xC5B6, "o"), (0xC5BE, "p"), (0xC6DA, "q"), (0xC8BB, "r"), (0xC8F6, "s"),
+    (0xCBFA, "t"), (0xCDDA, "w"), (0xCEF4, "x"), (0xD1B9, "y"), (0xD4D1, "z")
+)
+_GB2312_LEVEL1_END = 0xD7F9
+_GB2312_CODES = [code for code, _ in _GB2312_INITIALS]
+
+
+def _is_hanzi(char: str) -> bool:
+    return "一" <= char <= "鿿"
+
+
+def _gb2312_initial(char: str) -> str:
+    """推算单个汉字的拼音首字母；非一级汉字原样返回"""
+    try:
+        raw = char.encode("gb2312")
+    except UnicodeEncodeError:
+        return char
+    if len(raw) != 2:
+        return char
+    code = (raw[0] << 8) | raw[1]
+    if code < _GB2312_CODES[0] or code >= _GB2312_LEVEL1_END:
+        return char
+    return _GB2312_INITIALS[bisect.bisect_right(_GB2312_CODES, code) - 1][1]
+
+
+def _pinyin_forms(name: str) -> List[List[str]]:
+    """名称的拼音音节序列（全拼、首字母），不含汉字时返回空列表"""
+    if not any(_is_hanzi(char) for char in name):
+        return []
+    if HAS_PYPINYIN:
+        return [
+            [syllable.lower() for syllable in lazy_pinyin(name)],
+            [syllable.lower() for syllable in lazy_pinyin(name, style=Style.FIRST_LETTER)]
+        ]
+    return [[_gb2312_initial(char).lower() for char in name]]
+
+
+def search_keys(name: str) -> set:
+    """名称的全部检索键"""
+    text = name.lower()
+    keys = {text[i:] for i in range(len(text))}
+    for syllables in _pinyin_forms(name):
+        keys.update("".join(syllables[i:]) for i in range(len(syllables)))
+    keys.discard("")
+    return keys
+
+
+class NameIndex:
+    """
+    单类名称的联想索引
+    
+    排序分值为 (最近使用日期序数, 使用序号, 创建序号)，越大越靠前；读写均在锁内完成。
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: List[Tuple[str, str]] = []
+        self._scores: Dict[str, Tuple[int, int, int]] = {}
+        self._seq = itertools.count(1)
+        self.loaded = False
+        self.source_version: Optional[int] = None
+    
+    def load(self, items: Iterable[Tuple[str, Optional[date], int]], source_version: Optional[int] = None) -> int:
+        """整体重建（覆盖现有内容），items 为 (名称, 最近使用日期, 创建序号)，返回名称数"""
+        scores: Dict[str, Tuple[int, int, int]] = {}
+        for name, last_used, created in items:
+            if not name:
+                continue
+            score = (last_used.toordinal() if last_used else 0, 0, created or 0)
+            if name not in scores or score > scores[name]:
+                scores[name] = score
+        keys = sorted((key, name) for name in scores for key in search_keys(name))
+        with self._lock:
+            self._keys = keys
+            self._scores = scores
+            self.loaded = True
+            self.source_version = source_version
+        return len(scores)
+    
+    def upsert(self, name: str, created: int = 0) -> None:
+        """加入名称（已存在时保留原排序分值）"""
+        with self._lock:
+            self._upsert(name, created)
+    
+    def remove(self, name: str) -> None:
+        with self._lock:
+            self._remove(name)
+    
+    def touch(self, name: str, used_on: Optional[date] = None) -> None:
+        """记录一次使用，把名称提到最前（不存在的名称忽略）"""
+        with self._lock:
+            score = self._scores.get(name)
+            if score is None:
+                return
+            day = max(score[0], (used_on or date.today()).toordinal())
+            self._scores[name] = (day, next(self._seq), score[2])
+    
+    def sync(self, names: set, source_version: int) -> None:
+        """与最新名称集合做增量同步：新增缺少的名称，删除已不存在的名称"""
+        with self._lock:
+            for name in set(self._scores) - names:
+                self._remove(name)
+            for name in names - set(self._scores):
+                self._upsert(name, 0)
+            self.source_version = source_version
+    
+    def search(self, keyword: Optional[str], limit: Optional[int] = None) -> List[str]:
+        """
+        联想查询
+        
+        Args:
+            keyword (Optional[str]): 关键字（名称片段、拼音或首字母），为空时返回全部名称
+            limit (Optional[int]): 返回数量，为 None 时返回全部匹配结果
+        
+        Returns:
+            List[str]: 按最近使用排序的名称列表
+        """
+        with self._lock:
+            if keyword:
+                prefix = keyword.lower()
+                matched = set()
+                i = bisect.bisect_left(self._keys, (prefix,))
+                while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+                    matched.add(self._keys[i][1])
+                    i += 1
+            else:
+                matched = self._scores.keys()
+            if limit is None:
+                return sorted(matched, key=self._scores.__getitem__, reverse=True)
+            return heapq.nlargest(limit, matched, key=self._scores.__getitem__)
+    
+    def _upsert(self, name: str, created: int) -> None:
+        if not name or name in self._scores:
+            return
+        self._scores[name] = (0, 0, created)
+        for key in search_keys(name):
+            bisect.insort(self._keys, (key, name))
+    
+    def _remove(self, name: str) -> None:
+        if self._scores.pop(name, None) is None:
+            return
+        for key in search_keys(name):
+            i = bisect.bisect_left(self._keys, (key, name))
+            if i < len(self._keys) and self._keys[i] == (key, name):
+                del self._keys[i]
+
+
+# 进程内唯一实例
+goods_name_index = NameIndex()
+supplier_name_index = NameIndex()
+purchaser_name_index = NameIndex()
+
+_INDEXES = {
+    "goods": goods_name_index,
+    "supplier": supplier_name_index,
+    "purchaser": purchaser_name_index
+}
+
+
+def load_name_autocomplete(db: Session) -> Dict[str, int]:
+    """
+    启动时加载三类名称索引（需在商品目录缓存加载之后调用）
+    
+    Returns:
+        Dict[str, int]: 各类索引的名称数
+    """
+    goods_last_used = {}
+    for name, last_purchase_date, last_sale_date in db.query(
+        Goods.goods_name,
+        func.max(GoodsStats.last_purchase_date),
+        func.max(GoodsStats.last_sale_date)
+    ).join(GoodsStats, GoodsStats.goods_id == Goods.id).filter(
+        Goods.is_deleted == False
+    ).group_by(Goods.goods_name).all():
+        days = [_to_date(day) for day in (last_purchase_date, last_sale_date) if day]
+        goods_last_used[name] = max(days) if days else None
+    version, entries = goods_catalog.entries()
+    if goods_catalog.loaded:
+        goods_items = [(entry.goods_name, goods_last_used.get(entry.goods_name), entry.id) for entry in entries]
+    else:
+        goods_items = [
+            (row.goods_name, goods_last_used.get(row.goods_name), row.id)
+            for row in db.query(Goods.id, Goods.goods_name).filter(Goods.is_deleted == False).all()
+        ]
+        version = None
+    
+    last_purchase = db.query(
+        PurchaseInfo.supplier_id.label("owner_id"),
+        func.max(PurchaseInfo.purchase_date).label("last_used")
+    ).filter(PurchaseInfo.is_deleted == False).group_by(PurchaseInfo.supplier_id).subquery()
+    supplier_items = db.query(Supplier.supplier_name, last_purchase.c.last_used, Supplier.id).outerjoin(
+        last_purchase, last_purchase.c.owner_id == Supplier.id
+    ).filter(Supplier.is_deleted == False).all()
+    
+    last_sale = db.query(
+        SaleInfo.purchaser_id.label("owner_id"),
+        func.max(SaleInfo.sale_date).label("last_used")
+    ).filter(SaleInfo.is_deleted == False).group_by(SaleInfo.purchaser_id).subquery()
+    purchaser_items = db.query(Purchaser.purchaser_name, last_sale.c.last_used, Purchaser.id).outerjoin(
+        last_sale, last_sale.c.owner_id == Purchaser.id
+    ).filter(Purchaser.is_deleted == False).all()
+    
+    return {
+        "goods": goods_name_index.load(goods_items, version),
+        "supplier": supplier_name_index.load([(name, _to_date(day), id) for name, day, id in supplier_items]),
+        "purchaser": purchaser_name_index.load([(name, _to_date(day), id) for name, day, id in purchaser_items])
+    }
+
+
+def search_goods_names(keyword: Optional[str], limit: Optional[int] = None) -> Optional[List[str]]:
+    """商品名称联想；索引未加载时返回 None（由调用方回退到数据库查询）"""
+    if not goods_name_index.loaded:
+        return None
+    version, entries = goods_catalog.entries()
+    if goods_catalog.loaded and version != goods_name_index.source_version:
+        goods_name_index.sync({entry.goods_name for entry in entries}, version)
+    return goods_name_index.search(keyword, limit)
+
+
+def search_names(kind: str, keyword: Optional[str], limit: Optional[int] = None) -> Optional[List[str]]:
+    """供货商（supplier）/采购商（purchaser）名称联想；索引未加载时返回 None"""
+    index = _INDEXES[kind]
+    if not index.loaded:
+        return None
+    return index.search(keyword, limit)
+
+
+def stage_upsert(db: Session, kind: str, name: str, created: int = 0) -> None:
+    """登记本事务内新增（或恢复）的名称，提交后生效"""
+    db.info.setdefault(_PENDING_KEY, []).append(("upsert", kind, name, created))
+
+
+def stage_remove(db: Session, kind: str, name: str) -> None:
+    """登记本事务内删除（或改名前）的名称，提交后生效"""
+    db.info.setdefault(_PENDING_KEY, []).append(("remove", kind, name, None))
+
+
+def stage_use(db: Session, kind: str, name: str, used_on=None) -> None:
+    """登记本事务内录入单据所用的名称，提交后提到联想结果最前"""
+    db.info.setdefault(_PENDING_KEY, []).append(("touch", kind, name, _to_date(used_on)))
+
+
+def _to_date(value) -> Optional[date]:
+    if value is None:
+        return None
+    if hasattr(value, "date"):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_changes(session):
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes:
+        return
+    for action, kind, name, arg in changes:
+        index = _INDEXES[kind]
+        if not index.loaded:
+            continue
+        if action == "upsert":
+            index.upsert(name, arg or 0)
+        elif action == "remove":
+            index.remove(name)
+        elif kind == "goods":
+            # 新建商品先随目录版本同步进索引，再记录使用
+            version, entries = goods_catalog.entries()
+            if goods_catalog.loaded and version != index.source_version:
+                index.sync({entry.goods_name for entry in entries}, version)
+            index.touch(name, arg)
+        else:
+            index.touch(name, arg)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_changes(session):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,97 @@
+"""
+名称搜索模块
+
+为商品、供货商、采购商名称建立 FTS5 全文索引（trigram 分词，外部内容表），由触发器随基础表同步，
+把 LIKE '%关键字%' 的全表扫描改为索引查找。
+
+- 各仓储通过 name_filter 得到"ID 属于名称匹配集合"的条件：基础表直接按主键过滤，
+  采购/销售/报损等明细表按商品ID外键过滤（可走 goods_id 索引），不再关联后逐行比较名称
+- trigram 分词至少需要 3 个字符，更短的关键字以及 SQLite 不支持 FTS5/trigram 时，
+  匹配集合改由基础表上的 LIKE 得到（基础表数据量小，明细表仍按ID过滤）
+"""
+
+from typing import Dict
+
+from sqlalchemy import select, text, literal_column, table, column
+from sqlalchemy.exc import OperationalError
+
+
+# 需要名称搜索的基础表及其名称列
+NAME_SEARCH_TABLES: Dict[str, str] = {
+    "t_goods": "goods_name",
+    "t_supplier": "supplier_name",
+    "t_purchaser": "purchaser_name"
+}
+
+# trigram 分词可检索的最短关键字长度
+TRIGRAM_MIN_LENGTH = 3
+
+# 全文索引是否已就绪（启动时由 init_name_search 设置）
+_fts_enabled = False
+
+
+def _fts_table_name(table_name: str) -> str:
+    return f"{table_name}_fts"
+
+
+def init_name_search(engine) -> bool:
+    """
+    创建名称全文索引及同步触发器（已存在则跳过），新建的索引从基础表全量构建
+    
+    Returns:
+        bool: 全文索引是否可用；SQLite 不支持 FTS5 或 trigram 分词时返回 False，搜索退回 LIKE
+    """
+    global _fts_enabled
+    try:
+        with engine.begin() as conn:
+            for table_name, name_column in NAME_SEARCH_TABLES.items():
+                fts = _fts_table_name(table_name)
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {"name": fts}
+                ).first()
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                    f"{name_column}, content='{table_name}', content_rowid='id', tokenize='trigram')"
+                ))
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN "
+                    f"INSERT INTO {fts}(rowid, {name_column}) VALUES (new.id, new.{name_column}); END"
+                ))
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, {name_column}) VALUES ('delete', old.id, old.{name_column}); END"
+                ))
+                conn.execute(text(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {name_column} ON {table_name} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, {name_column}) VALUES ('delete', old.id, old.{name_column}); "
+                    f"INSERT INTO {fts}(rowid, {name_column}) VALUES (new.id, new.{name_column}); END"
+                ))
+                if not exists:
+                    conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    except OperationalError as e:
+        print(f"名称全文索引不可用，搜索使用 LIKE: {e}")
+        _fts_enabled = False
+        return False
+    _fts_enabled = True
+    return True
+
+
+def name_filter(id_column, name_column, keyword: str):
+    """
+    构造"id_column 属于名称包含关键字的记录ID集合"的过滤条件
+    
+    Args:
+        id_column: 被过滤的ID列（基础表主键，或明细表中的外键列，如 SaleInfo.goods_id）
+        name_column: 基础表的名称列（如 Goods.goods_name）
+        keyword (str): 关键字
+    """
+    table_name = name_column.table.name
+    if _fts_enabled and len(keyword) >= TRIGRAM_MIN_LENGTH and table_name in NAME_SEARCH_TABLES:
+        fts = _fts_table_name(table_name)
+        # 以短语方式检索，关键字中的双引号按 FTS5 语法转义
+        phrase = '"' + keyword.replace('"', '""') + '"'
+        ids = select(table(fts, column("rowid")).c.rowid).where(literal_column(fts).op("MATCH")(phrase))
+    else:
+        ids = select(name_column.table.c.id).where(name_column.like(f"%{keyword}%"))
+    return id_column.in_(ids)
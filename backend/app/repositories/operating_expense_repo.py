@@ -1,7 +1,7 @@
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from decimal import Decimal
 from datetime import datetime
-from sqlalchemy import func
+from sqlalchemy import func, case
 from sqlalchemy.orm import Session
 from app.models.operating_expense import OperatingExpense
 
@@ -80,6 +80,26 @@ class OperatingExpenseRepository:
         ).scalar()
         return Decimal(str(result)) if result is not None else Decimal("0.00")
     
+    def sum_amount_by_date_ranges(self, ranges: List[Tuple[datetime, datetime]]) -> List[Decimal]:
+        # 一次扫描统计多个时间范围内的运营杂费总额（条件聚合 SUM(CASE WHEN ...)）
+        if not ranges:
+            return []
+        columns = [
+            func.sum(case((
+                OperatingExpense.expense_date.between(start_date.date(), end_date.date()),
+                OperatingExpense.expense_amount
+            )))
+            for start_date, end_date in ranges
+        ]
+        row = self.db.query(*columns).filter(
+            OperatingExpense.is_deleted == False,
+            OperatingExpense.expense_date.between(
+                min(start for start, _ in ranges).date(),
+                max(end for _, end in ranges).date()
+            )
+        ).one()
+        return [Decimal(str(value)) if value is not None else Decimal("0.00") for value in row]
+    
     def _to_dict(self, obj: OperatingExpense) -> Dict:
         return {
             "id": obj.id,
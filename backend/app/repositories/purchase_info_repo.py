@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from app.models.purchase_info import PurchaseInfo
 from app.models.supplier import Supplier
 from app.models.goods import Goods
+from app.repositories.name_search import name_filter
 
 class PurchaseInfoRepository:
     def __init__(self, db: Session):
@@ -66,7 +67,7 @@ class PurchaseInfoRepository:
         if supplier_id:
             query = query.filter(PurchaseInfo.supplier_id == supplier_id)
         if product_name:
-            query = query.filter(Goods.goods_name.like(f"%{product_name}%"))
+            query = query.filter(name_filter(PurchaseInfo.goods_id, Goods.goods_name, product_name))
         if start_date:
             query = query.filter(PurchaseInfo.purchase_date >= start_date)
         if end_date:
@@ -96,7 +97,7 @@ class PurchaseInfoRepository:
         if supplier_id:
             query = query.filter(PurchaseInfo.supplier_id == supplier_id)
         if product_name:
-            query = query.filter(Goods.goods_name.like(f"%{product_name}%"))
+            query = query.filter(name_filter(PurchaseInfo.goods_id, Goods.goods_name, product_name))
         if start_date:
             query = query.filter(PurchaseInfo.purchase_date >= start_date)
         if end_date:
@@ -221,6 +222,7 @@ class PurchaseInfoRepository:
             "purchase_unit_price": obj.purchase_unit_price,
             "purchase_total_price": obj.purchase_total_price,
             "purchase_date": obj.purchase_date,
+            "statement_id": obj.statement_id,
             "remark": obj.remark,
             "create_by": obj.create_by,
             "is_deleted": obj.is_deleted,
@@ -1,12 +1,20 @@
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from decimal import Decimal
 from datetime import datetime
-from sqlalchemy import func
+from sqlalchemy import func, or_, case
 from sqlalchemy.orm import Session
 from app.models.purchase_statement import PurchaseStatement
 from app.models.supplier import Supplier
 from app.models.purchase_info import PurchaseInfo
 
+
+def _statement_in_range(end_date_column, start_date, end_date, today_date):
+    # 对账单按结束日期归属时间范围，未结束（end_date为空）的视为本日
+    if start_date <= today_date <= end_date:
+        return or_(end_date_column.is_(None), end_date_column.between(start_date, end_date))
+    return end_date_column.between(start_date, end_date)
+
+
 class PurchaseStatementRepository:
     def __init__(self, db: Session):
         self.db = db
@@ -175,6 +183,35 @@ class PurchaseStatementRepository:
         ).update({"end_date": end_date})
         self.db.flush()
     
+    def sum_amount_by_date_ranges(self, ranges: List[Tuple[datetime, datetime]]) -> List[Decimal]:
+        """
+        一次扫描统计多个时间范围内的采购对账单总金额（条件聚合 SUM(CASE WHEN ...)）
+        说明：end_date为空的记录视为本日，与 get_total_statement_amount_by_date 口径一致
+        
+        Returns:
+            List[Decimal]: 与 ranges 顺序对应的总金额
+        """
+        if not ranges:
+            return []
+        today_date = datetime.now().date()
+        columns = [
+            func.sum(case((
+                _statement_in_range(PurchaseStatement.end_date, start_date.date(), end_date.date(), today_date),
+                PurchaseStatement.statement_amount
+            )))
+            for start_date, end_date in ranges
+        ]
+        row = self.db.query(*columns).filter(
+            PurchaseStatement.is_deleted == False,
+            _statement_in_range(
+                PurchaseStatement.end_date,
+                min(start for start, _ in ranges).date(),
+                max(end for _, end in ranges).date(),
+                today_date
+            )
+        ).one()
+        return [Decimal(str(value)) if value is not None else Decimal("0.00") for value in row]
+    
     def get_total_statement_amount_by_date(self, start_date: datetime, end_date: datetime) -> Decimal:
         """
         获取指定时间范围内的采购对账单总金额
@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from app.models.purchaser import Purchaser
 from app.models.sale_info import SaleInfo
+from app.repositories.name_search import name_filter
 
 class PurchaserRepository:
     def __init__(self, db: Session):
@@ -63,7 +64,7 @@ class PurchaserRepository:
     def count_by_conditions(self, name: Optional[str], phone: Optional[str]) -> int:
         query = self.db.query(func.count(Purchaser.id)).filter(Purchaser.is_deleted == False)
         if name:
-            query = query.filter(Purchaser.purchaser_name.like(f"%{name}%"))
+            query = query.filter(name_filter(Purchaser.id, Purchaser.purchaser_name, name))
         if phone:
             query = query.filter(Purchaser.contact_phone.like(f"%{phone}%"))
         return query.scalar()
@@ -72,7 +73,7 @@ class PurchaserRepository:
                           offset: int, limit: int) -> List[Dict]:
         query = self.db.query(Purchaser).filter(Purchaser.is_deleted == False)
         if name:
-            query = query.filter(Purchaser.purchaser_name.like(f"%{name}%"))
+            query = query.filter(name_filter(Purchaser.id, Purchaser.purchaser_name, name))
         if phone:
             query = query.filter(Purchaser.contact_phone.like(f"%{phone}%"))
         
@@ -84,7 +85,7 @@ class PurchaserRepository:
             Purchaser.is_deleted == False
         )
         if keyword:
-            query = query.filter(Purchaser.purchaser_name.like(f"%{keyword}%"))
+            query = query.filter(name_filter(Purchaser.id, Purchaser.purchaser_name, keyword))
         
         objs = query.order_by(Purchaser.create_time.desc()).limit(limit).all()
         return [{"id": obj.id, "purchaser_name": obj.purchaser_name} for obj in objs]
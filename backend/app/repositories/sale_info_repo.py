@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from app.models.sale_info import SaleInfo
 from app.models.purchaser import Purchaser
 from app.models.goods import Goods
+from app.repositories.name_search import name_filter
 
 class SaleInfoRepository:
     def __init__(self, db: Session):
@@ -66,7 +67,7 @@ class SaleInfoRepository:
         if purchaser_id:
             query = query.filter(SaleInfo.purchaser_id == purchaser_id)
         if product_name:
-            query = query.filter(Goods.goods_name.like(f"%{product_name}%"))
+            query = query.filter(name_filter(SaleInfo.goods_id, Goods.goods_name, product_name))
         if start_date:
             query = query.filter(SaleInfo.sale_date >= start_date)
         if end_date:
@@ -96,7 +97,7 @@ class SaleInfoRepository:
         if purchaser_id:
             query = query.filter(SaleInfo.purchaser_id == purchaser_id)
         if product_name:
-            query = query.filter(Goods.goods_name.like(f"%{product_name}%"))
+            query = query.filter(name_filter(SaleInfo.goods_id, Goods.goods_name, product_name))
         if start_date:
             query = query.filter(SaleInfo.sale_date >= start_date)
         if end_date:
@@ -225,6 +226,7 @@ class SaleInfoRepository:
             "unit_profit": obj.unit_profit,
             "total_profit": obj.total_profit,
             "sale_date": obj.sale_date,
+            "statement_id": obj.statement_id,
             "delivery_no": obj.delivery_no,
             "remark": obj.remark,
             "create_by": obj.create_by,
@@ -234,13 +236,17 @@ class SaleInfoRepository:
             "customer_goods_name": obj.customer_goods_name
         }
     
-    def update_statement_id_for_sales(self, statement_id: int, new_statement_id: int, start_date: datetime.date) -> None:
+    def update_statement_id_for_sales(self, statement_id: int, new_statement_id: int,
+                                      start_date: Optional[datetime.date] = None) -> int:
         """
-        更新销售记录的对账单ID
+        更新销售记录的对账单ID（start_date 为 None 时转移全部记录），返回转移的记录数
         """
-        self.db.query(SaleInfo).filter(
+        query = self.db.query(SaleInfo).filter(
             SaleInfo.statement_id == statement_id,
-            SaleInfo.sale_date >= start_date,
             SaleInfo.is_deleted == False
-        ).update({"statement_id": new_statement_id})
-        self.db.flush()
\ No newline at end of file
+        )
+        if start_date is not None:
+            query = query.filter(SaleInfo.sale_date >= start_date)
+        count = query.update({"statement_id": new_statement_id})
+        self.db.flush()
+        return count
\ No newline at end of file
@@ -1,13 +1,21 @@
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from decimal import Decimal
 from datetime import datetime
-from sqlalchemy import func, desc
+from sqlalchemy import func, desc, and_, or_, case, cast, Float, update
 from sqlalchemy.orm import Session
 from app.models.sale_statement import SaleStatement
 from app.models.purchaser import Purchaser
 from app.models.sale_info import SaleInfo
 from app.models.goods import Goods
 
+
+def _statement_in_range(end_date_column, start_date, end_date, today_date):
+    # 对账单按结束日期归属时间范围，未结束（end_date为空）的视为本日
+    if start_date <= today_date <= end_date:
+        return or_(end_date_column.is_(None), end_date_column.between(start_date, end_date))
+    return end_date_column.between(start_date, end_date)
+
+
 class SaleStatementRepository:
     def __init__(self, db: Session):
         self.db = db
@@ -128,6 +136,41 @@ class SaleStatementRepository:
         })
         self.db.flush()
     
+    def sum_sale_totals(self, statement_ids: List[int]) -> List[Dict]:
+        # 一次分组汇总多个对账单的销售金额、成本、利润（成本按每条销售记录自身的规格计算）
+        if not statement_ids:
+            return []
+        results = self.db.query(
+            SaleStatement.id,
+            SaleStatement.received_amount,
+            func.coalesce(func.sum(SaleInfo.sale_total_price), 0),
+            func.coalesce(func.sum(
+                SaleInfo.trade_unit_cost * SaleInfo.sale_num * cast(SaleInfo.product_spec, Float)
+            ), 0),
+            func.coalesce(func.sum(SaleInfo.total_profit), 0)
+        ).outerjoin(
+            SaleInfo,
+            and_(SaleInfo.statement_id == SaleStatement.id, SaleInfo.is_deleted == False)
+        ).filter(
+            SaleStatement.id.in_(statement_ids),
+            SaleStatement.is_deleted == False
+        ).group_by(SaleStatement.id).all()
+        
+        return [{
+            "id": statement_id,
+            "received_amount": received_amount,
+            "total_amount": float(total_amount),
+            "total_cost": float(total_cost),
+            "total_profit": float(total_profit)
+        } for statement_id, received_amount, total_amount, total_cost, total_profit in results]
+    
+    def bulk_update_amount_and_profit(self, rows: List[Dict]) -> None:
+        # 按主键批量更新（executemany）
+        if not rows:
+            return
+        self.db.execute(update(SaleStatement), rows)
+        self.db.flush()
+    
     def update_receipt(self, statement_id: int, received_amount: Decimal,
                       unreceived_amount: Decimal, receive_status: bool) -> None:
         self.db.query(SaleStatement).filter(
@@ -236,6 +279,37 @@ class SaleStatementRepository:
         ).scalar()
         return Decimal(str(result)) if result is not None else Decimal("0.00")
     
+    def sum_by_date_ranges(self, ranges: List[Tuple[datetime, datetime]]) -> List[Dict[str, Decimal]]:
+        """
+        一次扫描统计多个时间范围内的销售对账单总金额与总利润（条件聚合 SUM(CASE WHEN ...)）
+        说明：end_date为空的记录视为本日，与 get_total_statement_amount_by_date 口径一致
+        
+        Returns:
+            List[Dict[str, Decimal]]: 与 ranges 顺序对应的 {"amount": 总金额, "profit": 总利润}
+        """
+        if not ranges:
+            return []
+        today_date = datetime.now().date()
+        columns = []
+        for start_date, end_date in ranges:
+            in_range = _statement_in_range(SaleStatement.end_date, start_date.date(), end_date.date(), today_date)
+            columns.append(func.sum(case((in_range, SaleStatement.statement_amount))))
+            columns.append(func.sum(case((in_range, SaleStatement.total_profit))))
+        row = self.db.query(*columns).filter(
+            SaleStatement.is_deleted == False,
+            _statement_in_range(
+                SaleStatement.end_date,
+                min(start for start, _ in ranges).date(),
+                max(end for _, end in ranges).date(),
+                today_date
+            )
+        ).one()
+        totals = [Decimal(str(value)) if value is not None else Decimal("0.00") for value in row]
+        return [
+            {"amount": totals[i * 2], "profit": totals[i * 2 + 1]}
+            for i in range(len(ranges))
+        ]
+    
     def get_purchaser_profit_distribution(self, start_date: datetime, end_date: datetime) -> List[Dict]:
         """
         获取指定时间范围内的采购商利润分布
@@ -5,6 +5,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from app.models.supplier import Supplier
 from app.models.purchase_info import PurchaseInfo
+from app.repositories.name_search import name_filter
 
 class SupplierRepository:
     def __init__(self, db: Session):
@@ -65,7 +66,7 @@ class SupplierRepository:
     def count_by_conditions(self, name: Optional[str], phone: Optional[str]) -> int:
         query = self.db.query(func.count(Supplier.id)).filter(Supplier.is_deleted == False)
         if name:
-            query = query.filter(Supplier.supplier_name.like(f"%{name}%"))
+            query = query.filter(name_filter(Supplier.id, Supplier.supplier_name, name))
         if phone:
             query = query.filter(Supplier.contact_phone.like(f"%{phone}%"))
         return query.scalar()
@@ -74,7 +75,7 @@ class SupplierRepository:
                           offset: int, limit: int) -> List[Dict]:
         query = self.db.query(Supplier).filter(Supplier.is_deleted == False)
         if name:
-            query = query.filter(Supplier.supplier_name.like(f"%{name}%"))
+            query = query.filter(name_filter(Supplier.id, Supplier.supplier_name, name))
         if phone:
             query = query.filter(Supplier.contact_phone.like(f"%{phone}%"))
         
@@ -86,7 +87,7 @@ class SupplierRepository:
             Supplier.is_deleted == False
         )
         if keyword:
-            query = query.filter(Supplier.supplier_name.like(f"%{keyword}%"))
+            query = query.filter(name_filter(Supplier.id, Supplier.supplier_name, keyword))
         
         objs = query.order_by(Supplier.create_time.desc()).limit(limit).all()
         return [{"id": obj.id, "supplier_name": obj.supplier_name} for obj in objs]
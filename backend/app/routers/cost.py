@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Query
-from typing import Optional
+from typing import Optional, List
 from pydantic import BaseModel
 from app.schemas.common import ResponseModel, PageModel
-from app.services import cost_service
+from app.services import cost_service, cost_recalc_service, cost_recalc_preview
 
 router = APIRouter()
 
@@ -16,6 +16,18 @@ class OperatingExpenseAdd(BaseModel):
 class OperatingExpenseUpdate(OperatingExpenseAdd):
     id: int
 
+class CostPreviewChange(BaseModel):
+    type: str
+    action: str
+    id: Optional[int] = None
+    date: Optional[str] = None
+    num: Optional[int] = None
+    unit_price: Optional[float] = None
+
+class CostRecalcPreview(BaseModel):
+    goods_id: int
+    changes: List[CostPreviewChange]
+
 @router.post("/fee/add", response_model=ResponseModel[dict])
 async def add_operating_expense(data: OperatingExpenseAdd):
     """
@@ -55,4 +67,30 @@ async def delete_operating_expense(id: int = Query(...)):
     6.1.4 删除杂费记录
     """
     await cost_service.delete_operating_expense(id)
-    return ResponseModel(message="删除杂费记录成功")
\ No newline at end of file
+    return ResponseModel(message="删除杂费记录成功")
+
+@router.get("/recalc/status", response_model=ResponseModel[dict])
+async def get_recalc_status(limit: int = Query(20)):
+    """
+    6.2.1 查询后台成本重算状态
+    """
+    result = cost_recalc_service.get_recalc_status(limit)
+    return ResponseModel(data=result)
+
+@router.post("/recalc/rebuild", response_model=ResponseModel[dict])
+async def rebuild_all_costs(workers: Optional[int] = Query(None, ge=1)):
+    """
+    6.2.2 启动成本全量并行重建（后台执行，进度见 6.2.1）
+    """
+    result = await cost_recalc_service.start_rebuild_all_costs(workers)
+    return ResponseModel(data=result)
+
+@router.post("/recalc/preview", response_model=ResponseModel[dict])
+async def preview_cost_recalc(data: CostRecalcPreview, limit: int = Query(100, ge=1, le=1000)):
+    """
+    6.2.3 预览拟议修改对成本的影响（只读，不写入数据）
+    """
+    result = await cost_recalc_preview.preview_cost_recalc(
+        data.goods_id, [change.model_dump() for change in data.changes], limit
+    )
+    return ResponseModel(data=result)
\ No newline at end of file
@@ -126,4 +126,27 @@ async def get_trend_chart(
             raise ParamErrorException(message="开始时间不能晚于结束时间")
     
     result = await home_service.get_trend_chart_data(time_type, start_date, end_date)
+    return ResponseModel(data=result)
+
+
+@router.get("/home/cache/status", response_model=ResponseModel[dict])
+async def get_home_cache_status():
+    """
+    查询首页缓存状态
+    
+    Returns:
+        ResponseModel[dict]: 缓存条目数、命中/未命中次数、命中率及各依赖表数据版本
+    """
+    return ResponseModel(data=home_service.get_home_cache_status())
+
+
+@router.post("/home/metrics/rebuild", response_model=ResponseModel[dict])
+async def rebuild_daily_metrics():
+    """
+    重建每日经营指标汇总表（趋势图、饼状图的数据来源）
+    
+    Returns:
+        ResponseModel[dict]: 重建后的汇总行数
+    """
+    result = await home_service.rebuild_daily_metrics()
     return ResponseModel(data=result)
\ No newline at end of file
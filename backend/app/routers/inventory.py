@@ -1,4 +1,6 @@
 from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from urllib.parse import quote
 from typing import Optional, List
 from pydantic import BaseModel
 from app.schemas.common import ResponseModel, PageModel
@@ -31,16 +33,67 @@ async def get_inventory_detail(
     product_name: str = Query(...),
     product_spec: str = Query(...),
     page_num: int = Query(1),
-    page_size: int = Query(10)
+    page_size: int = Query(10),
+    cursor: Optional[str] = Query(None),
+    with_total: bool = Query(True)
 ):
     """
     5.1.2 单个商品库存详情（含变动记录）
+    - cursor：上一页返回的 next_cursor，传入时忽略 page_num
+    - with_total：是否统计变动记录总数
     """
     result = await inventory_service.get_inventory_detail(
-        product_name, product_spec, page_num, page_size
+        product_name, product_spec, page_num, page_size, cursor, with_total
     )
     return ResponseModel(data=result)
 
+@router.get("/as_of", response_model=ResponseModel[dict])
+async def get_inventory_as_of(
+    product_name: str = Query(...),
+    product_spec: str = Query(...),
+    as_of_date: str = Query(...)
+):
+    """
+    5.1.3 单个商品指定日期的库存与估值（日终状态）
+    """
+    result = await inventory_service.get_inventory_as_of(product_name, product_spec, as_of_date)
+    return ResponseModel(data=result)
+
+@router.get("/valuation", response_model=ResponseModel[PageModel[dict]])
+async def get_inventory_valuation(
+    as_of_date: str = Query(...),
+    product_name: Optional[str] = Query(None),
+    page_num: int = Query(1),
+    page_size: int = Query(10)
+):
+    """
+    5.1.4 全部商品指定日期的库存估值（分页）
+    """
+    result = await inventory_service.get_inventory_valuation(product_name, as_of_date, page_num, page_size)
+    return ResponseModel(data=result)
+
+@router.get("/valuation/export")
+async def export_inventory_valuation(
+    as_of_date: str = Query(...),
+    product_name: Optional[str] = Query(None)
+):
+    """
+    导出全部商品指定日期的库存估值
+    """
+    result = await inventory_service.export_inventory_valuation(product_name, as_of_date)
+    
+    def iterfile():
+        yield result["xlsx_bytes"]
+    
+    encoded_filename = quote(result["filename"])
+    return StreamingResponse(
+        iterfile(),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={
+            "Content-Disposition": f'attachment; filename*=UTF-8\'\'{encoded_filename}'
+        }
+    )
+
 # ==================== 库存报损 ====================
 
 class InventoryLossAdd(BaseModel):
@@ -106,4 +159,21 @@ class CheckItem(BaseModel):
 class InventoryCheck(BaseModel):
     checkDate: str
     remark: Optional[str] = None
-    checkList: List[CheckItem]
\ No newline at end of file
+    checkList: List[CheckItem]
+
+# ==================== 商品统计 ====================
+
+@router.post("/stats/rebuild", response_model=ResponseModel[dict])
+async def rebuild_goods_stats():
+    """
+    5.4.1 重建商品统计（最后采购/销售日期、累计数量、最后供货商）
+    """
+    result = await inventory_service.rebuild_goods_stats()
+    return ResponseModel(data=result)
+
+@router.get("/catalog/status", response_model=ResponseModel[dict])
+async def get_goods_catalog_status():
+    """
+    5.4.2 商品目录缓存状态
+    """
+    return ResponseModel(data=inventory_service.get_goods_catalog_status())
\ No newline at end of file
@@ -5,6 +5,7 @@ from pydantic import BaseModel
 from urllib.parse import quote
 from app.schemas.common import ResponseModel, PageModel
 from app.services import purchase_service
+from app.repositories.daily_metrics_repo import DailyMetricsRepository, OPEN_STATEMENT_DATE
 
 router = APIRouter()
 
@@ -295,6 +296,9 @@ async def confirm_purchase_statement(data: PurchaseStatementConfirm):
                 pay_status=(total_amount - float(statement["received_amount"])) <= 0
             )
     
+    # 对账单结束后，其采购指标从"未结束"改按结束日期汇总
+    DailyMetricsRepository(db).refresh_dates([end_date, OPEN_STATEMENT_DATE])
+    
     db.commit()
     
     return ResponseModel(message="对账单确认成功")
@@ -318,6 +322,7 @@ async def delete_purchase_statement(statement_id: int = Query(...)):
     
     # 软删除对账单
     statement_repo.soft_delete(statement_id)
+    DailyMetricsRepository(db).refresh_dates([statement["end_date"] or OPEN_STATEMENT_DATE])
     db.commit()
     
     return ResponseModel(message="对账单删除成功")
@@ -402,6 +407,9 @@ async def unconfirm_purchase_statement(statement_id: int = Query(...)):
     if active_statement:
         statement_repo.soft_delete(active_statement["id"])
     
+    # 对账单恢复为未结束，其采购指标从原结束日期移回"未结束"
+    DailyMetricsRepository(db).refresh_dates([statement["end_date"], OPEN_STATEMENT_DATE])
+    
     db.commit()
     
     return ResponseModel(message="对账单取消确认成功")
\ No newline at end of file
@@ -6,6 +6,8 @@ from urllib.parse import quote
 from app.schemas.common import ResponseModel, PageModel
 from app.schemas.sale import SaleAdd, SaleUpdate, SaleReceipt, SaleInvoiceStatusUpdate, SaleStatementConfirm
 from app.services import sale_service
+from app.services.cost_recalc_service import refresh_sale_statements
+from app.repositories.daily_metrics_repo import DailyMetricsRepository, OPEN_STATEMENT_DATE
 
 router = APIRouter()
 
@@ -188,40 +190,6 @@ async def confirm_sale_statement(data: SaleStatementConfirm):
             from app.utils.exceptions import ParamErrorException
             raise ParamErrorException(message="结束日期不得早于起始日期")
     
-    # 重新计算对账金额：筛选日期符合条件的所有销售信息
-    sale_list = sale_info_repo.list_by_statement(
-        purchaser_id=statement["purchaser_id"],
-        statement_id=data.statement_id,
-        start_date=start_date,
-        end_date=end_date
-    )
-    
-    # 计算总金额、总成本和总利润
-    total_amount = 0.0
-    total_cost = 0.0
-    total_profit = 0.0
-    for sale in sale_list:
-        total_amount += float(sale["sale_total_price"])
-        total_cost += float(sale["trade_unit_cost"]) * float(sale["sale_num"])
-        total_profit += float(sale["total_profit"])
-    
-    # 转换为 Decimal 类型
-    total_amount_decimal = Decimal(str(total_amount))
-    total_cost_decimal = Decimal(str(total_cost))
-    total_profit_decimal = Decimal(str(total_profit))
-    received_amount_decimal = Decimal(str(statement["received_amount"]))
-    unreceived_amount_decimal = total_amount_decimal - received_amount_decimal
-    
-    # 更新对账单结束日期和金额
-    statement_repo.update_amount_and_profit(
-        statement_id=data.statement_id,
-        statement_amount=total_amount_decimal,
-        total_profit=total_profit_decimal,
-        total_cost=total_cost_decimal,
-        unreceived_amount=unreceived_amount_decimal,
-        receive_status=(unreceived_amount_decimal <= 0)
-    )
-    
     # 更新对账单结束日期
     statement_repo.update_end_date(data.statement_id, end_date)
     
@@ -244,62 +212,21 @@ async def confirm_sale_statement(data: SaleStatementConfirm):
     new_statement_id = statement_repo.create(new_statement_data)
     
     # 将销售日期大于对账单结束日期的记录转移到新对账单
+    refresh_ids = [data.statement_id]
     if end_date:
-        # 获取所有属于当前对账单但销售日期大于结束日期的记录
-        sale_info_repo = SaleInfoRepository(db)
-        # 注意：这里需要在SaleInfoRepository中添加一个方法来更新记录的statement_id
-        # 同时，我们需要更新新对账单的金额
-        # 首先获取这些记录
-        future_sales = sale_info_repo.list_by_statement(
-            purchaser_id=statement["purchaser_id"],
+        moved = sale_info_repo.update_statement_id_for_sales(
             statement_id=data.statement_id,
-            start_date=end_date + timedelta(days=1)
+            new_statement_id=new_statement_id,
+            start_date=new_start_date
         )
-        
-        # 计算这些记录的总金额、总成本和总利润
-        future_total_amount = 0.0
-        future_total_cost = 0.0
-        future_total_profit = 0.0
-        for sale in future_sales:
-            future_total_amount += float(sale["sale_total_price"])
-            future_total_cost += float(sale["trade_unit_cost"]) * float(sale["sale_num"])
-            future_total_profit += float(sale["total_profit"])
-        
-        # 如果有未来的销售记录
-        if future_sales:
-            # 转换为 Decimal 类型
-            future_total_amount_decimal = Decimal(str(future_total_amount))
-            future_total_cost_decimal = Decimal(str(future_total_cost))
-            future_total_profit_decimal = Decimal(str(future_total_profit))
-            
-            # 更新这些记录的statement_id
-            sale_info_repo.update_statement_id_for_sales(
-                statement_id=data.statement_id,
-                new_statement_id=new_statement_id,
-                start_date=end_date + timedelta(days=1)
-            )
-            
-            # 更新新对账单的金额
-            statement_repo.update_amount_and_profit(
-                statement_id=new_statement_id,
-                statement_amount=future_total_amount_decimal,
-                total_profit=future_total_profit_decimal,
-                total_cost=future_total_cost_decimal,
-                unreceived_amount=future_total_amount_decimal,
-                receive_status=False
-            )
-            
-            # 重新计算旧对账单的金额：只包含指定日期范围内的销售金额
-            # 因为future_sales的记录已经被转移到新对账单，所以不需要从total_amount中扣除
-            # 直接使用total_amount作为旧对账单的最终金额
-            statement_repo.update_amount_and_profit(
-                statement_id=data.statement_id,
-                statement_amount=total_amount_decimal,
-                total_profit=total_profit_decimal,
-                total_cost=total_cost_decimal,
-                unreceived_amount=unreceived_amount_decimal,
-                receive_status=(unreceived_amount_decimal <= 0)
-            )
+        if moved:
+            refresh_ids.append(new_statement_id)
+    
+    # 重新汇总新旧对账单的金额、成本和利润（一次分组聚合）
+    refresh_sale_statements(db, refresh_ids)
+    
+    # 对账单结束后，其销售指标从"未结束"改按结束日期汇总
+    DailyMetricsRepository(db).refresh_dates([end_date, OPEN_STATEMENT_DATE])
     
     db.commit()
     
@@ -324,6 +251,7 @@ async def delete_sale_statement(statement_id: int = Query(...)):
     
     # 软删除对账单
     statement_repo.soft_delete(statement_id)
+    DailyMetricsRepository(db).refresh_dates([statement["end_date"] or OPEN_STATEMENT_DATE])
     db.commit()
     
     return ResponseModel(message="对账单删除成功")
@@ -375,45 +303,21 @@ async def unconfirm_sale_statement(statement_id: int = Query(...)):
     
     # 如果存在活跃对账单，将其销售记录重定向到要撤销的对账单
     if active_statement:
-        # 获取活跃对账单的销售记录
-        active_sale_list = sale_info_repo.list_by_statement(
-            purchaser_id=purchaser_id,
-            statement_id=active_statement["id"]
+        sale_info_repo.update_statement_id_for_sales(
+            statement_id=active_statement["id"],
+            new_statement_id=statement_id
         )
-        
-        # 将活跃对账单的销售记录的 statement_id 改为要撤销的对账单的 statement_id
-        for sale in active_sale_list:
-            sale_info_repo.update(sale["id"], {"statement_id": statement_id})
-    
-    # 重新计算对账单金额（包含所有销售记录）
-    sale_list = sale_info_repo.list_by_statement(
-        purchaser_id=purchaser_id,
-        statement_id=statement_id
-    )
-    
-    # 计算总金额、总成本和总利润
-    total_amount = 0.0
-    total_cost = 0.0
-    total_profit = 0.0
-    for sale in sale_list:
-        total_amount += float(sale["sale_total_price"])
-        total_cost += float(sale["trade_unit_cost"]) * float(sale["sale_num"])
-        total_profit += float(sale["total_profit"])
     
-    # 更新对账单金额
-    statement_repo.update_amount_and_profit(
-        statement_id=statement_id,
-        statement_amount=total_amount,
-        total_profit=total_profit,
-        total_cost=total_cost,
-        unreceived_amount=total_amount - float(statement["received_amount"]),
-        receive_status=(total_amount - float(statement["received_amount"])) <= 0
-    )
+    # 重新汇总对账单金额（包含所有销售记录）
+    refresh_sale_statements(db, [statement_id])
     
     # 如果存在活跃对账单，删除它
     if active_statement:
         statement_repo.soft_delete(active_statement["id"])
     
+    # 对账单恢复为未结束，其销售指标从原结束日期移回"未结束"
+    DailyMetricsRepository(db).refresh_dates([statement["end_date"], OPEN_STATEMENT_DATE])
+    
     db.commit()
     
     return ResponseModel(message="对账单取消确认成功")
\ No newline at end of file
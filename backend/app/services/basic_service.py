@@ -3,6 +3,7 @@ from fastapi import status
 
 from app.repositories.supplier_repo import SupplierRepository
 from app.repositories.purchaser_repo import PurchaserRepository
+from app.repositories import name_autocomplete
 from app.database import get_db
 from app.utils.exceptions import CustomAPIException, NotFoundException
 
@@ -48,6 +49,7 @@ async def add_supplier(data) -> Dict[str, int]:
         # 情况3：无同名数据→全新插入（原逻辑不变）
         supplier_id = supplier_repo.create(data)
     
+    name_autocomplete.stage_upsert(db, "supplier", data.supplier_name, supplier_id)
     # 统一提交事务（新增/恢复+更新 都走这一个commit，保证原子性）
     db.commit()
     return {"id": supplier_id}
@@ -111,6 +113,9 @@ async def update_supplier(data) -> None:
             )
     
     supplier_repo.update(supplier_id, data)
+    if getattr(data, "supplier_name", None) and data.supplier_name != existing["supplier_name"]:
+        name_autocomplete.stage_remove(db, "supplier", existing["supplier_name"])
+        name_autocomplete.stage_upsert(db, "supplier", data.supplier_name, supplier_id)
     db.commit()
 
 
@@ -137,16 +142,22 @@ async def delete_supplier(id: int) -> None:
         )
     
     supplier_repo.soft_delete(id)
+    name_autocomplete.stage_remove(db, "supplier", existing["supplier_name"])
     db.commit()
 
 
 async def select_suppliers(keyword: Optional[str], limit: int = 5) -> List[str]:
     """
     供货商下拉联想查询
-    - 关键词模糊匹配名称
+    - 关键词模糊匹配名称，支持拼音全拼/首字母（内存联想索引，按最近使用排序）
     - 返回不重复的结果
     - 格式：["供货商1", "供货商2"]
     """
+    names = name_autocomplete.search_names("supplier", keyword, limit)
+    if names is not None:
+        return names
+    
+    # 联想索引未加载时查询数据库
     db = next(get_db())
     supplier_repo = SupplierRepository(db)
     suppliers = supplier_repo.select_by_keyword(keyword, limit=limit)
@@ -197,6 +208,7 @@ async def add_purchaser(data) -> Dict[str, int]:
         # 情况3：无同名采购商→正常新增（原逻辑不变）
         purchaser_id = purchaser_repo.create(data)
     
+    name_autocomplete.stage_upsert(db, "purchaser", data.purchaser_name, purchaser_id)
     # 统一提交事务：新增/恢复+更新 都走这一个commit，保证原子性
     db.commit()
     return {"id": purchaser_id}
@@ -260,6 +272,9 @@ async def update_purchaser(data) -> None:
             )
     
     purchaser_repo.update(purchaser_id, data)
+    if getattr(data, "purchaser_name", None) and data.purchaser_name != existing["purchaser_name"]:
+        name_autocomplete.stage_remove(db, "purchaser", existing["purchaser_name"])
+        name_autocomplete.stage_upsert(db, "purchaser", data.purchaser_name, purchaser_id)
     db.commit()
 
 
@@ -286,16 +301,22 @@ async def delete_purchaser(id: int) -> None:
         )
     
     purchaser_repo.soft_delete(id)
+    name_autocomplete.stage_remove(db, "purchaser", existing["purchaser_name"])
     db.commit()
 
 
 async def select_purchasers(keyword: Optional[str], limit: int = 5) -> List[str]:
     """
     采购商下拉联想查询
-    - 关键词模糊匹配名称
+    - 关键词模糊匹配名称，支持拼音全拼/首字母（内存联想索引，按最近使用排序）
     - 返回不重复的结果
     - 格式：["采购商1", "采购商2"]
     """
+    names = name_autocomplete.search_names("purchaser", keyword, limit)
+    if names is not None:
+        return names
+    
+    # 联想索引未加载时查询数据库
     db = next(get_db())
     purchaser_repo = PurchaserRepository(db)
     purchasers = purchaser_repo.select_by_keyword(keyword, limit=limit)
@@ -0,0 +1,298 @@
+"""
+成本重算的 NumPy 向量化实现
+
+与 cost_recalc_service 中的逐条回放引擎接口一致、结果逐位相同：
+- 库存数量用前缀和一次算出
+- 加权平均成本只在采购时变化，按采购记录逐条递推（保持与原引擎相同的浮点运算顺序），
+  其余记录的成本由最近一次采购向前填充
+- 销售利润、报损成本、检查点按数组整体计算
+- 金额按分取整后与已存储快照比对，只为变化的记录构造 Decimal
+
+未安装 numpy 时自动退回逐条回放引擎。
+"""
+
+from typing import Optional, Dict, Any, List, Union
+from datetime import datetime, date
+from decimal import Decimal
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:  # pragma: no cover - numpy 为可选依赖
+    np = None
+    HAS_NUMPY = False
+
+from app.repositories.goods_repo import GoodsRepository
+from app.services.cost_recalc_service import (
+    EVENT_TYPE_PRIORITY,
+    get_start_state,
+    replay_queries,
+    replay_goods,
+    apply_replay_result,
+    refresh_sale_statements,
+    _to_date
+)
+
+
+# 距离 .5 小于该阈值的金额视为舍入临界值，改用 Python round 逐个计算
+_ROUND_TIE_TOLERANCE = 1e-6
+
+
+def _round_cents(values):
+    """
+    按 Python round(x, 2) 的结果返回以分为单位的整数数组
+    
+    x * 100 的浮点误差只会影响落在 .5 附近的值，这部分逐个用 round 复核。
+    """
+    scaled = values * 100
+    cents = np.rint(scaled)
+    fraction = np.abs(scaled - np.trunc(scaled))
+    suspicious = np.nonzero(np.abs(fraction - 0.5) < _ROUND_TIE_TOLERANCE)[0]
+    for i in suspicious:
+        cents[i] = round(round(float(values[i]), 2) * 100)
+    return cents.astype(np.int64)
+
+
+def _to_cents(value: Decimal) -> int:
+    """已存储的两位小数金额转换为分"""
+    return int(value * 100)
+
+
+def _from_cents(cents) -> Decimal:
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def replay_goods_numpy(db, goods_id: int, product_spec: float, since: Optional[date] = None) -> Dict[str, Any]:
+    """
+    向量化回放单个商品的成本（只读，不修改数据库）
+    
+    参数与返回值同 cost_recalc_service.replay_goods。
+    """
+    if not HAS_NUMPY:
+        return replay_goods(db, goods_id, product_spec, since)
+    
+    # 1. 获取起始状态（增量模式的期初折算沿用逐条引擎，区间很短）
+    state, collector = get_start_state(db, goods_id, product_spec, since)
+    
+    # 2. 读取记录并组装为列数组
+    purchase_query, sale_query, loss_query = replay_queries(db, goods_id, since)
+    purchases = purchase_query.all()
+    sales = sale_query.all()
+    losses = loss_query.all()
+    
+    n_purchase, n_sale, n_loss = len(purchases), len(sales), len(losses)
+    n = n_purchase + n_sale + n_loss
+    if n == 0:
+        return {
+            "goods_id": goods_id,
+            "since": since,
+            "stock": state.stock,
+            "unit_cost": state.cost,
+            "total_value": state.total_value,
+            "sale_updates": [],
+            "loss_updates": [],
+            "checkpoints": collector.rows,
+            "statement_ids": []
+        }
+    
+    all_rows = (purchases, sales, losses)
+    event_dates = [row[1] for rows in all_rows for row in rows]
+    ordinals = np.fromiter((d.toordinal() for d in event_dates), dtype=np.int64, count=n)
+    months = np.fromiter((d.year * 12 + d.month - 1 for d in event_dates), dtype=np.int64, count=n)
+    ids = np.fromiter((row[0] for rows in all_rows for row in rows), dtype=np.int64, count=n)
+    nums = np.fromiter((row[2] for rows in all_rows for row in rows), dtype=np.int64, count=n)
+    types = np.concatenate([
+        np.full(n_purchase, EVENT_TYPE_PRIORITY["purchase"], dtype=np.int64),
+        np.full(n_sale, EVENT_TYPE_PRIORITY["sale"], dtype=np.int64),
+        np.full(n_loss, EVENT_TYPE_PRIORITY["loss"], dtype=np.int64)
+    ])
+    
+    # 按日期、类型优先级、ID 排序（与逐条引擎一致）
+    order = np.lexsort((ids, types, ordinals))
+    position = np.empty(n, dtype=np.int64)
+    position[order] = np.arange(n)
+    months = months[order]
+    nums_sorted = nums[order]
+    is_purchase = types[order] == EVENT_TYPE_PRIORITY["purchase"]
+    
+    # 3. 库存数量：前缀和
+    signed = np.where(is_purchase, nums_sorted, -nums_sorted)
+    stock_after = state.stock + np.cumsum(signed)
+    stock_before = stock_after - signed
+    
+    # 4. 加权平均成本：按采购逐条递推，运算顺序与 CostState.apply_purchase 相同
+    purchase_positions = position[:n_purchase]
+    purchase_costs = np.empty(n_purchase, dtype=np.float64)
+    cost = state.cost
+    for k in np.argsort(purchase_positions, kind="stable"):
+        _, _, num, unit_price, total_price, _ = purchases[k]
+        stock = int(stock_before[purchase_positions[k]])
+        old_total_value = stock * cost * product_spec
+        new_stock = stock + num
+        new_total_value = old_total_value + float(total_price)
+        if new_stock > 0:
+            cost = new_total_value / (new_stock * product_spec)
+        else:
+            cost = float(unit_price)
+        purchase_costs[k] = cost
+    
+    # 采购之后的成本向前填充；cost_before 为处理每条记录前的单位成本
+    cost_after_purchase = np.empty(n, dtype=np.float64)
+    cost_after_purchase[purchase_positions] = purchase_costs
+    last_purchase = np.maximum.accumulate(np.where(is_purchase, np.arange(n), -1))
+    cost_after = np.where(last_purchase >= 0, cost_after_purchase[np.maximum(last_purchase, 0)], state.cost)
+    cost_before = np.empty(n, dtype=np.float64)
+    cost_before[0] = state.cost
+    cost_before[1:] = cost_after[:-1]
+    
+    # 5. 销售：成本快照与利润
+    sale_updates = []
+    statement_ids = {}
+    if n_sale:
+        sale_pos = position[n_purchase:n_purchase + n_sale]
+        sale_nums = nums[n_purchase:n_purchase + n_sale].astype(np.float64)
+        sale_prices = np.array([float(row[3]) for row in sales], dtype=np.float64)
+        unit_cost = cost_before[sale_pos]
+        unit_profit = sale_prices - unit_cost
+        total_profit = unit_profit * sale_nums * product_spec
+        
+        new_cents = np.column_stack([_round_cents(unit_cost), _round_cents(unit_profit), _round_cents(total_profit)])
+        stored_cents = np.array([[_to_cents(row[6]), _to_cents(row[7]), _to_cents(row[8])] for row in sales], dtype=np.int64)
+        changed = np.nonzero((new_cents != stored_cents).any(axis=1))[0]
+        for k in changed[np.argsort(sale_pos[changed], kind="stable")]:
+            sale_updates.append({
+                "id": sales[k][0],
+                "trade_unit_cost": _from_cents(new_cents[k, 0]),
+                "unit_profit": _from_cents(new_cents[k, 1]),
+                "total_profit": _from_cents(new_cents[k, 2])
+            })
+        for k in np.argsort(sale_pos, kind="stable"):
+            statement_ids[sales[k][5]] = True
+    
+    # 6. 报损：成本快照
+    loss_updates = []
+    if n_loss:
+        loss_pos = position[n_purchase + n_sale:]
+        loss_nums = nums[n_purchase + n_sale:].astype(np.float64)
+        unit_cost = cost_before[loss_pos]
+        total_cost = unit_cost * loss_nums * product_spec
+        
+        new_cents = np.column_stack([_round_cents(unit_cost), _round_cents(total_cost)])
+        stored_cents = np.array([[_to_cents(row[3]), _to_cents(row[4])] for row in losses], dtype=np.int64)
+        changed = np.nonzero((new_cents != stored_cents).any(axis=1))[0]
+        for k in changed[np.argsort(loss_pos[changed], kind="stable")]:
+            loss_updates.append({
+                "id": losses[k][0],
+                "loss_unit_cost": _from_cents(new_cents[k, 0]),
+                "loss_total_cost": _from_cents(new_cents[k, 1])
+            })
+    
+    # 7. 检查点：每个新月份第一条记录之前的状态
+    month_start = np.ones(n, dtype=bool)
+    month_start[1:] = months[1:] != months[:-1]
+    if collector.last_date is None:
+        # 从头回放时第一个月的期初状态为空，无需记录
+        month_start[0] = False
+    else:
+        month_start[0] = months[0] > collector.last_date.year * 12 + collector.last_date.month - 1
+    value_before = cost_before * stock_before * product_spec
+    for i in np.nonzero(month_start)[0]:
+        year, month = divmod(int(months[i]), 12)
+        collector.rows.append({
+            "goods_id": goods_id,
+            "as_of_date": date(year, month + 1, 1),
+            "stock": int(stock_before[i]),
+            "unit_cost": float(cost_before[i]),
+            "total_value": float(value_before[i]) if i > 0 else state.total_value
+        })
+    last_year, last_month = divmod(int(months[-1]), 12)
+    collector.last_date = date(last_year, last_month + 1, 1)
+    
+    final_stock = int(stock_after[-1])
+    final_cost = float(cost_after[-1])
+    return {
+        "goods_id": goods_id,
+        "since": since,
+        "stock": final_stock,
+        "unit_cost": final_cost,
+        "total_value": final_cost * final_stock * product_spec,
+        "sale_updates": sale_updates,
+        "loss_updates": loss_updates,
+        "checkpoints": collector.rows,
+        "statement_ids": list(statement_ids)
+    }
+
+
+async def recalculate_cost_for_goods(goods_id: int, since: Union[datetime, date, None] = None) -> None:
+    """
+    按时间顺序重新计算指定商品的成本、库存和销售利润（向量化实现）
+    
+    接口与 cost_recalc_service.recalculate_cost_for_goods 相同。
+    
+    Args:
+        goods_id (int): 商品ID
+        since (Union[datetime, date, None]): 受影响的最早日期，None 表示全量回放
+    """
+    from app.database import SessionLocal
+    db = SessionLocal()
+    
+    try:
+        goods = GoodsRepository(db).get_by_id(goods_id)
+        if not goods:
+            return
+        
+        product_spec = float(goods.get("product_spec", 1))
+        
+        result = replay_goods_numpy(db, goods_id, product_spec, _to_date(since))
+        apply_replay_result(db, result)
+        refresh_sale_statements(db, result["statement_ids"])
+        
+        db.commit()
+    
+    except Exception as e:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def compare_engines(goods_ids: Optional[List[int]] = None,
+                    since: Union[datetime, date, None] = None) -> Dict[str, Any]:
+    """
+    对比两套引擎在当前数据上的回放结果（只读，不修改数据库）
+    
+    用于升级或修改引擎后核对向量化实现与逐条回放是否逐位一致。
+    
+    Args:
+        goods_ids (Optional[List[int]]): 要核对的商品ID，None 表示全部未删除商品
+        since (Union[datetime, date, None]): 增量模式的起始日期，None 表示全量回放
+    
+    Returns:
+        Dict[str, Any]: 核对的商品数及不一致的商品ID列表
+    """
+    from app.database import SessionLocal
+    from app.models.goods import Goods
+    
+    db = SessionLocal()
+    try:
+        query = db.query(Goods.id, Goods.product_spec).filter(Goods.is_deleted == False)
+        if goods_ids is not None:
+            query = query.filter(Goods.id.in_(goods_ids))
+        since = _to_date(since)
+        
+        mismatched = []
+        checked = 0
+        for goods_id, product_spec in query.order_by(Goods.id).all():
+            expected = replay_goods(db, goods_id, float(product_spec), since)
+            actual = replay_goods_numpy(db, goods_id, float(product_spec), since)
+            if expected != actual:
+                mismatched.append(goods_id)
+            checked += 1
+        return {"checked": checked, "mismatched": mismatched}
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    # 核对当前数据库上两套引擎的结果：python -m app.services.cost_recalc_numpy
+    print(compare_engines())
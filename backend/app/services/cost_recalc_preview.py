@@ -0,0 +1,356 @@
+"""
+成本重算预览（只读的"假设"回放）
+
+在数据库的只读快照上，把拟议的修改（如追溯修正采购单价、删除报损）叠加到记录流中回放，
+返回受影响的销售、报损、销售对账单以及商品最终库存/成本的差异，不写入任何数据。
+
+用于在提交代价较大的修改前预览其影响：
+- 读取使用独立的只读连接，不持有写锁，也不阻塞正在进行的写入
+- 快照只包含已提交的数据；若商品仍有待处理的重算任务，差异中也会包含该任务尚未回写的变化
+"""
+
+import asyncio
+from typing import Optional, Dict, Any, List, Union
+from datetime import datetime, date
+
+from app.repositories.sale_statement_repo import SaleStatementRepository
+from app.repositories.cost_recalc_job_repo import CostRecalcJobRepository
+from app.models.goods import Goods
+from app.models.purchase_info import PurchaseInfo
+from app.models.sale_info import SaleInfo
+from app.models.inventory_loss import InventoryLoss
+from app.services.cost_recalc_service import (
+    EVENT_TYPE_PRIORITY,
+    get_checkpoint_start,
+    replay_queries,
+    merge_events,
+    readonly_session,
+    _replay_events,
+    _to_date
+)
+from app.utils.exceptions import NotFoundException, ParamErrorException
+
+
+# 各记录类型对应的模型、日期字段及支持的修改方式（销售新增需要分配对账单，暂不支持）
+PREVIEW_RECORD_TYPES = {
+    "purchase": (PurchaseInfo, "purchase_date", ("add", "update", "delete")),
+    "sale": (SaleInfo, "sale_date", ("update", "delete")),
+    "loss": (InventoryLoss, "loss_date", ("add", "update", "delete"))
+}
+
+# 差异列表默认最多返回的条数
+PREVIEW_DIFF_LIMIT = 100
+
+
+def _parse_date(value: Union[str, datetime, date, None]) -> Optional[date]:
+    if isinstance(value, str):
+        try:
+            return datetime.strptime(value, "%Y-%m-%d").date()
+        except ValueError:
+            raise ParamErrorException(message=f"日期格式错误: {value}")
+    return _to_date(value)
+
+
+def _money(value) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _load_changes(db, goods_id: int, changes: List[Dict[str, Any]]) -> Dict[str, Dict]:
+    """
+    校验拟议修改并读取被修改记录的原始数据
+    
+    Returns:
+        Dict[str, Dict]: {记录类型: {"original": {ID: 原始行}, "changes": [修改]}}
+    """
+    prepared = {record_type: {"original": {}, "changes": []} for record_type in PREVIEW_RECORD_TYPES}
+    
+    for change in changes:
+        record_type = change.get("type")
+        action = change.get("action")
+        if record_type not in PREVIEW_RECORD_TYPES:
+            raise ParamErrorException(message=f"不支持的记录类型: {record_type}")
+        model, date_field, actions = PREVIEW_RECORD_TYPES[record_type]
+        if action not in actions:
+            raise ParamErrorException(message=f"{record_type} 不支持的修改方式: {action}")
+        
+        change = dict(change, date=_parse_date(change.get("date")))
+        if change.get("num") is not None and change["num"] <= 0:
+            raise ParamErrorException(message="数量必须大于0")
+        
+        if action == "add":
+            if change["date"] is None or change.get("num") is None:
+                raise ParamErrorException(message="新增记录必须填写日期和数量")
+            if record_type == "purchase" and change.get("unit_price") is None:
+                raise ParamErrorException(message="新增采购记录必须填写单价")
+        else:
+            record_id = change.get("id")
+            obj = db.query(model).filter(
+                model.id == record_id,
+                model.is_deleted == False
+            ).first()
+            if not obj or obj.goods_id != goods_id:
+                raise NotFoundException(message=f"{record_type} 记录 {record_id} 不存在或不属于该商品")
+            prepared[record_type]["original"][record_id] = obj
+        
+        prepared[record_type]["changes"].append(change)
+    
+    return prepared
+
+
+def _earliest_affected_date(prepared: Dict[str, Dict]) -> Optional[date]:
+    """修改涉及的最早日期（包括被修改记录的原日期和新日期）"""
+    dates = []
+    for record_type, (_, date_field, _) in PREVIEW_RECORD_TYPES.items():
+        for change in prepared[record_type]["changes"]:
+            if change["date"] is not None:
+                dates.append(change["date"])
+            original = prepared[record_type]["original"].get(change.get("id"))
+            if original is not None:
+                dates.append(_to_date(getattr(original, date_field)))
+    return min(dates) if dates else None
+
+
+def _build_row(record_type: str, change: Dict[str, Any], row: Optional[tuple],
+               goods_id: int, product_spec: float) -> tuple:
+    """
+    按修改内容构造回放用的记录行（格式同 replay_queries）
+    
+    已存储的成本快照保持原值，回放时据此判断快照是否变化；新增记录没有快照。
+    product_spec 为该记录自身的规格（新增记录取商品规格），总价按分取整，与写入数据库后的值一致。
+    """
+    if row is None:
+        row_id, row_date, num = None, None, None
+    else:
+        row_id, row_date, num = row[0], row[1], row[2]
+    row_date = change["date"] or row_date
+    num = change.get("num") or num
+    
+    if record_type == "purchase":
+        unit_price = change.get("unit_price")
+        if unit_price is None:
+            unit_price = float(row[3])
+        return (row_id, row_date, num, unit_price, round(unit_price * product_spec * num, 2), goods_id)
+    
+    if record_type == "sale":
+        unit_price = change.get("unit_price")
+        if unit_price is None:
+            unit_price = float(row[3])
+        return (row_id, row_date, num, unit_price, round(unit_price * product_spec * num, 2)) + tuple(row[5:])
+    
+    if row is None:
+        return (None, row_date, num, None, None, goods_id)
+    return (row_id, row_date, num) + tuple(row[3:])
+
+
+def _apply_changes(events: List[tuple], prepared: Dict[str, Dict],
+                   goods_id: int, product_spec: float) -> List[tuple]:
+    """把拟议修改叠加到记录流上，并按回放顺序重新排序"""
+    replaced = {
+        (record_type, change["id"]): change
+        for record_type in PREVIEW_RECORD_TYPES
+        for change in prepared[record_type]["changes"]
+        if change["action"] != "add"
+    }
+    
+    result = []
+    for event in events:
+        _, _, priority, event_id, event_type, row = event
+        change = replaced.get((event_type, event_id))
+        if change is None:
+            result.append(event)
+        elif change["action"] == "update":
+            original = prepared[event_type]["original"].get(event_id)
+            row_spec = float(getattr(original, "product_spec", None) or product_spec)
+            new_row = _build_row(event_type, change, row, goods_id, row_spec)
+            result.append((goods_id, new_row[1], priority, event_id, event_type, new_row))
+    
+    for record_type in PREVIEW_RECORD_TYPES:
+        for change in prepared[record_type]["changes"]:
+            if change["action"] == "add":
+                new_row = _build_row(record_type, change, None, goods_id, product_spec)
+                result.append((goods_id, new_row[1], EVENT_TYPE_PRIORITY[record_type], None, record_type, new_row))
+    
+    # 新增记录排在同日同类型的已有记录之后（与实际插入后的 ID 顺序一致）
+    result.sort(key=lambda event: (event[1], event[2], event[3] is None, event[3] or 0))
+    return result
+
+
+def _sale_amounts(row: tuple, snapshot: Optional[Dict[str, Any]], product_spec: float) -> Dict[str, float]:
+    """一条销售记录计入对账单的金额、成本和利润"""
+    trade_unit_cost = snapshot["trade_unit_cost"] if snapshot else row[6]
+    total_profit = snapshot["total_profit"] if snapshot else row[8]
+    return {
+        "amount": float(row[4]),
+        "cost": float(trade_unit_cost) * row[2] * product_spec,
+        "profit": float(total_profit)
+    }
+
+
+def _preview_in_snapshot(goods_id: int, changes: List[Dict[str, Any]], limit: int) -> Dict[str, Any]:
+    """在只读快照上计算预览结果（在线程池中执行）"""
+    with readonly_session() as db:
+        goods = db.query(Goods).filter(Goods.id == goods_id, Goods.is_deleted == False).first()
+        if not goods:
+            raise NotFoundException(message="商品不存在")
+        product_spec = float(goods.product_spec)
+        
+        prepared = _load_changes(db, goods_id, changes)
+        since = _earliest_affected_date(prepared)
+        
+        # 1. 从不晚于 since 的检查点开始读取当前记录
+        state, start_date = get_checkpoint_start(db, goods_id, since)
+        purchase_query, sale_query, loss_query = replay_queries(db, goods_id, start_date)
+        events = list(merge_events(purchase_query, sale_query, loss_query))
+        original_sales = {event[3]: event[5] for event in events if event[4] == "sale"}
+        original_losses = {event[3]: event[5] for event in events if event[4] == "loss"}
+        
+        # 2. 叠加修改后回放（结果只用于比对，不回写）
+        modified = _apply_changes(events, prepared, goods_id, product_spec)
+        result = _replay_events(goods_id, product_spec, since, state, start_date, modified)
+        sale_changes = {change["id"]: change for change in prepared["sale"]["changes"]}
+        loss_changes = {change["id"]: change for change in prepared["loss"]["changes"] if change["action"] != "add"}
+        modified_sales = {event[3]: event[5] for event in modified if event[4] == "sale"}
+        sale_snapshots = {item["id"]: item for item in result["sale_updates"]}
+        
+        # 3. 销售差异：成本快照变化或被直接修改/删除的记录
+        sale_ids = list(dict.fromkeys(list(sale_snapshots) + list(sale_changes)))
+        # 对账单成本按每条销售记录自身的规格计算（与 sum_sale_totals 一致）
+        sale_specs = dict(db.query(SaleInfo.id, SaleInfo.product_spec).filter(SaleInfo.id.in_(sale_ids)).all()) if sale_ids else {}
+        sales = []
+        statement_deltas = {}
+        for sale_id in sale_ids:
+            old_row = original_sales[sale_id]
+            new_row = modified_sales.get(sale_id)
+            snapshot = sale_snapshots.get(sale_id)
+            action = sale_changes[sale_id]["action"] if sale_id in sale_changes else "recalc"
+            
+            sale_spec = float(sale_specs.get(sale_id) or product_spec)
+            old_amounts = _sale_amounts(old_row, None, sale_spec)
+            new_amounts = _sale_amounts(new_row, snapshot, sale_spec) if new_row else {"amount": 0.0, "cost": 0.0, "profit": 0.0}
+            delta = statement_deltas.setdefault(old_row[5], {"amount": 0.0, "cost": 0.0, "profit": 0.0})
+            for key in delta:
+                delta[key] += new_amounts[key] - old_amounts[key]
+            
+            sales.append({
+                "id": sale_id,
+                "action": action,
+                "statement_id": old_row[5],
+                "old": {
+                    "sale_date": old_row[1].strftime("%Y-%m-%d"),
+                    "sale_num": old_row[2],
+                    "sale_total_price": _money(old_row[4]),
+                    "trade_unit_cost": _money(old_row[6]),
+                    "unit_profit": _money(old_row[7]),
+                    "total_profit": _money(old_row[8])
+                },
+                "new": {
+                    "sale_date": new_row[1].strftime("%Y-%m-%d"),
+                    "sale_num": new_row[2],
+                    "sale_total_price": round(float(new_row[4]), 2),
+                    "trade_unit_cost": _money(snapshot["trade_unit_cost"] if snapshot else new_row[6]),
+                    "unit_profit": _money(snapshot["unit_profit"] if snapshot else new_row[7]),
+                    "total_profit": _money(snapshot["total_profit"] if snapshot else new_row[8])
+                } if new_row else None
+            })
+        
+        # 4. 报损差异（新增报损没有 ID）
+        losses = []
+        loss_snapshots = {item["id"]: item for item in result["loss_updates"] if item["id"] is not None}
+        new_losses = [event[5] for event in modified if event[4] == "loss" and event[3] is None]
+        for loss_id in dict.fromkeys(list(loss_snapshots) + list(loss_changes)):
+            old_row = original_losses[loss_id]
+            snapshot = loss_snapshots.get(loss_id)
+            deleted = loss_changes.get(loss_id, {}).get("action") == "delete"
+            losses.append({
+                "id": loss_id,
+                "action": loss_changes[loss_id]["action"] if loss_id in loss_changes else "recalc",
+                "old": {
+                    "loss_unit_cost": _money(old_row[3]),
+                    "loss_total_cost": _money(old_row[4])
+                },
+                "new": None if deleted else {
+                    "loss_unit_cost": _money(snapshot["loss_unit_cost"] if snapshot else old_row[3]),
+                    "loss_total_cost": _money(snapshot["loss_total_cost"] if snapshot else old_row[4])
+                }
+            })
+        new_loss_snapshots = [item for item in result["loss_updates"] if item["id"] is None]
+        for row, snapshot in zip(new_losses, new_loss_snapshots):
+            losses.append({
+                "id": None,
+                "action": "add",
+                "old": None,
+                "new": {
+                    "loss_date": row[1].strftime("%Y-%m-%d"),
+                    "loss_num": row[2],
+                    "loss_unit_cost": _money(snapshot["loss_unit_cost"]),
+                    "loss_total_cost": _money(snapshot["loss_total_cost"])
+                }
+            })
+        
+        # 5. 销售对账单差异：当前汇总值加上各销售记录的变化量
+        statements = []
+        for totals in SaleStatementRepository(db).sum_sale_totals(list(statement_deltas)):
+            delta = statement_deltas[totals["id"]]
+            statements.append({
+                "statement_id": totals["id"],
+                "old": {
+                    "statement_amount": round(totals["total_amount"], 2),
+                    "total_cost": round(totals["total_cost"], 2),
+                    "total_profit": round(totals["total_profit"], 2)
+                },
+                "new": {
+                    "statement_amount": round(totals["total_amount"] + delta["amount"], 2),
+                    "total_cost": round(totals["total_cost"] + delta["cost"], 2),
+                    "total_profit": round(totals["total_profit"] + delta["profit"], 2)
+                }
+            })
+        
+        return {
+            "goods_id": goods_id,
+            "since": since.strftime("%Y-%m-%d") if since else None,
+            "cost_pending": bool(CostRecalcJobRepository(db).get_pending_goods_ids([goods_id])),
+            "goods": {
+                "old": {
+                    "current_stock_num": goods.current_stock_num,
+                    "stock_unit_cost": _money(goods.stock_unit_cost),
+                    "stock_total_value": _money(goods.stock_total_value)
+                },
+                "new": {
+                    "current_stock_num": result["stock"],
+                    "stock_unit_cost": round(result["unit_cost"], 2),
+                    "stock_total_value": round(result["total_value"], 2)
+                }
+            },
+            "sale_count": len(sales),
+            "sales": sales[:limit],
+            "loss_count": len(losses),
+            "losses": losses[:limit],
+            "statements": statements
+        }
+
+
+async def preview_cost_recalc(goods_id: int, changes: List[Dict[str, Any]],
+                              limit: int = PREVIEW_DIFF_LIMIT) -> Dict[str, Any]:
+    """
+    预览拟议修改对成本的影响（只读，不修改数据库）
+    
+    每条修改为字典：
+    - type: purchase / sale / loss
+    - action: add / update / delete（销售不支持 add）
+    - id: 被修改或删除的记录ID
+    - date, num, unit_price: 新的日期（YYYY-MM-DD）、数量、单价，未填写的字段保持原值
+    
+    计算在线程池中以独立的只读连接执行，不占用应用的写连接。
+    
+    Args:
+        goods_id (int): 商品ID
+        changes (List[Dict[str, Any]]): 拟议修改
+        limit (int): 销售、报损差异各自最多返回的条数
+    
+    Returns:
+        Dict[str, Any]: 商品库存/成本、销售、报损、销售对账单的新旧值对比
+    """
+    if not changes:
+        raise ParamErrorException(message="请至少提供一条修改")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _preview_in_snapshot, goods_id, changes, limit)
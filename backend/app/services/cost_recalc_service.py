@@ -1,5 +1,11 @@
-from typing import Optional, Dict, Any, List
-from datetime import datetime
+import asyncio
+import heapq
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Tuple, Union
+from datetime import datetime, date, timedelta
 from decimal import Decimal
 
 from app.database import get_db
@@ -8,13 +14,501 @@ from app.repositories.purchase_info_repo import PurchaseInfoRepository
 from app.repositories.sale_info_repo import SaleInfoRepository
 from app.repositories.inventory_loss_repo import InventoryLossRepository
 from app.repositories.sale_statement_repo import SaleStatementRepository
+from app.repositories.cost_checkpoint_repo import CostCheckpointRepository
+from app.repositories.cost_recalc_job_repo import CostRecalcJobRepository
+from app.repositories.daily_metrics_repo import DailyMetricsRepository
 from app.models.purchase_info import PurchaseInfo
 from app.models.sale_info import SaleInfo
 from app.models.inventory_loss import InventoryLoss
-from sqlalchemy import and_, or_
+from app.utils.exceptions import CustomAPIException
+from sqlalchemy import and_, or_, true, update
 
 
-async def recalculate_cost_for_goods(goods_id: int) -> None:
+# 同一日期内的事件处理顺序：采购先于销售，销售先于报损
+EVENT_TYPE_PRIORITY = {"purchase": 0, "sale": 1, "loss": 2}
+
+# 回放时每批从数据库读取的记录数
+REPLAY_BATCH_SIZE = 1000
+
+# 后台任务每批合并重算的商品数
+RECALC_JOB_BATCH_SIZE = 50
+
+
+class CostState:
+    """
+    加权平均成本的回放状态
+    
+    全量回放与增量回放共用同一套浮点运算（运算顺序完全一致），
+    保证从中间状态续算得到的结果与从头回放逐位相同。
+    """
+    def __init__(self, stock: int = 0, cost: float = 0.0, total_value: float = 0.0):
+        self.stock = stock
+        self.cost = cost
+        self.total_value = total_value
+    
+    def apply_purchase(self, num: int, unit_price: float, total_price: float, product_spec: float) -> None:
+        """采购：增加库存，计算新加权平均成本"""
+        old_total_value = self.stock * self.cost * product_spec
+        new_stock = self.stock + num
+        new_total_value = old_total_value + total_price
+        
+        if new_stock > 0:
+            new_cost = new_total_value / (new_stock * product_spec)
+        else:
+            new_cost = unit_price
+        
+        self.stock = new_stock
+        self.cost = new_cost
+        self.total_value = new_cost * new_stock * product_spec
+    
+    def apply_sale(self, num: int, unit_price: float, product_spec: float) -> Dict[str, float]:
+        """销售：减少库存，返回该笔销售的成本快照"""
+        unit_cost = self.cost
+        total_cost = unit_cost * num * product_spec
+        unit_profit = unit_price - unit_cost
+        total_profit = unit_profit * num * product_spec
+        
+        self.stock = self.stock - num
+        self.total_value = self.cost * self.stock * product_spec
+        return {
+            "unit_cost": unit_cost,
+            "total_cost": total_cost,
+            "unit_profit": unit_profit,
+            "total_profit": total_profit
+        }
+    
+    def apply_loss(self, num: int, product_spec: float) -> Dict[str, float]:
+        """报损：减少库存，返回该笔报损的成本快照"""
+        unit_cost = self.cost
+        total_cost = self.cost * num * product_spec
+        
+        self.stock = self.stock - num
+        self.total_value = self.cost * self.stock * product_spec
+        return {"unit_cost": unit_cost, "total_cost": total_cost}
+
+
+def _to_date(value: Union[datetime, date, None]) -> Optional[date]:
+    """将 datetime/date 统一为 date（datetime 是 date 的子类，需先判断）"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+class CheckpointCollector:
+    """
+    回放过程中按月收集成本检查点
+    
+    每跨入一个新的月份，在处理该月第一条记录之前记下当前状态，
+    检查点日期取该月1日，表示“该日期之前所有记录回放后的期初状态”。
+    """
+    def __init__(self, goods_id: int, last_date: Optional[date] = None):
+        self.goods_id = goods_id
+        self.last_date = last_date
+        self.rows: List[Dict[str, Any]] = []
+    
+    def before_event(self, event_date: date, state: CostState) -> None:
+        month_start = event_date.replace(day=1)
+        if self.last_date is None:
+            # 从头回放时第一个月的期初状态为空，无需记录
+            self.last_date = month_start
+        elif month_start > self.last_date:
+            self.rows.append({
+                "goods_id": self.goods_id,
+                "as_of_date": month_start,
+                "stock": state.stock,
+                "unit_cost": state.cost,
+                "total_value": state.total_value
+            })
+            self.last_date = month_start
+
+
+def _replay_state_before(db, goods_id: int, since: date, product_spec: float,
+                         state: CostState, start_date: Optional[date],
+                         collector: CheckpointCollector) -> CostState:
+    """
+    从起始状态回放 [start_date, since) 区间内的记录，得到 since 之前的库存/成本状态
+    
+    只按列流式读取，不加载 ORM 对象、不回写任何记录。
+    """
+    purchase_query, sale_query, loss_query = replay_queries(db, goods_id, start_date, until=since)
+    _fold_events(merge_events(purchase_query, sale_query, loss_query), state, product_spec, collector)
+    return state
+
+
+def _fold_events(events, state: CostState, product_spec: float,
+                 collector: Optional[CheckpointCollector] = None) -> int:
+    """只把记录折算进状态（不计算快照差异），返回折算的记录数"""
+    count = 0
+    for _, event_date, _, _, event_type, row in events:
+        if collector is not None:
+            collector.before_event(event_date, state)
+        if event_type == "purchase":
+            state.apply_purchase(row[2], float(row[3]), float(row[4]), product_spec)
+        elif event_type == "sale":
+            state.apply_sale(row[2], float(row[3]), product_spec)
+        elif event_type == "loss":
+            state.apply_loss(row[2], product_spec)
+        count += 1
+    return count
+
+
+def _goods_filter(column, goods_ids: Union[int, List[int], None]):
+    if goods_ids is None:
+        return true()
+    if isinstance(goods_ids, int):
+        return column == goods_ids
+    return column.in_(goods_ids)
+
+
+def replay_queries(db, goods_ids: Union[int, List[int], None], since: Optional[date] = None, until: Optional[date] = None):
+    """
+    构造回放所需的采购、销售、报损查询（只读取列，不加载 ORM 对象）
+    
+    - goods_ids 可以是单个商品ID，也可以是商品ID列表（每张表仍只有一条查询），None 表示全部商品
+    - 日期范围为 [since, until)，None 表示不限
+    - 各查询已按 (商品ID, 日期, ID) 排序，可直接交给 merge_events 归并
+    - 销售和报损连同当前存储的成本快照一起读取，用于比对是否变化
+    - 每行最后一列为商品ID
+    
+    Returns:
+        Tuple[Query, Query, Query]: 采购、销售、报损查询
+    """
+    purchase_query = db.query(
+        PurchaseInfo.id, PurchaseInfo.purchase_date, PurchaseInfo.purchase_num,
+        PurchaseInfo.purchase_unit_price, PurchaseInfo.purchase_total_price,
+        PurchaseInfo.goods_id
+    ).filter(
+        _goods_filter(PurchaseInfo.goods_id, goods_ids),
+        PurchaseInfo.is_deleted == False
+    )
+    if since is not None:
+        purchase_query = purchase_query.filter(PurchaseInfo.purchase_date >= since)
+    if until is not None:
+        purchase_query = purchase_query.filter(PurchaseInfo.purchase_date < until)
+    purchase_query = purchase_query.order_by(PurchaseInfo.goods_id, PurchaseInfo.purchase_date, PurchaseInfo.id)
+    
+    sale_query = db.query(
+        SaleInfo.id, SaleInfo.sale_date, SaleInfo.sale_num,
+        SaleInfo.sale_unit_price, SaleInfo.sale_total_price, SaleInfo.statement_id,
+        SaleInfo.trade_unit_cost, SaleInfo.unit_profit, SaleInfo.total_profit,
+        SaleInfo.goods_id
+    ).filter(
+        _goods_filter(SaleInfo.goods_id, goods_ids),
+        SaleInfo.is_deleted == False
+    )
+    if since is not None:
+        sale_query = sale_query.filter(SaleInfo.sale_date >= since)
+    if until is not None:
+        sale_query = sale_query.filter(SaleInfo.sale_date < until)
+    sale_query = sale_query.order_by(SaleInfo.goods_id, SaleInfo.sale_date, SaleInfo.id)
+    
+    loss_query = db.query(
+        InventoryLoss.id, InventoryLoss.loss_date, InventoryLoss.loss_num,
+        InventoryLoss.loss_unit_cost, InventoryLoss.loss_total_cost,
+        InventoryLoss.goods_id
+    ).filter(
+        _goods_filter(InventoryLoss.goods_id, goods_ids),
+        InventoryLoss.is_deleted == False
+    )
+    if since is not None:
+        loss_query = loss_query.filter(InventoryLoss.loss_date >= since)
+    if until is not None:
+        loss_query = loss_query.filter(InventoryLoss.loss_date < until)
+    loss_query = loss_query.order_by(InventoryLoss.goods_id, InventoryLoss.loss_date, InventoryLoss.id)
+    
+    return purchase_query, sale_query, loss_query
+
+
+def merge_events(purchase_query, sale_query, loss_query, batch_size: int = REPLAY_BATCH_SIZE):
+    """
+    按 (商品ID, 日期, 类型优先级, ID) 惰性归并三个已排序的记录流
+    
+    每个查询用 yield_per 分批读取，内存占用只与批大小有关，与历史记录数无关。
+    
+    Yields:
+        Tuple: (商品ID, 日期, 类型优先级, ID, 类型, 原始行)
+    """
+    def _stream(query, event_type):
+        priority = EVENT_TYPE_PRIORITY[event_type]
+        for row in query.yield_per(batch_size):
+            yield (row[-1], row[1], priority, row[0], event_type, row)
+    
+    # 前四项唯一确定顺序，比较不会落到后两项
+    return heapq.merge(
+        _stream(purchase_query, "purchase"),
+        _stream(sale_query, "sale"),
+        _stream(loss_query, "loss")
+    )
+
+
+def get_checkpoint_start(db, goods_id: int, since: Optional[date]) -> Tuple[CostState, Optional[date]]:
+    """
+    取回放的起点：不晚于 since 的最近检查点及其日期
+    
+    全量模式或没有可用检查点时从零开始，起点日期为 None。
+    """
+    if since is None:
+        return CostState(), None
+    checkpoint = CostCheckpointRepository(db).get_latest_on_or_before(goods_id, since)
+    if not checkpoint:
+        return CostState(), None
+    return CostState(checkpoint["stock"], checkpoint["unit_cost"], checkpoint["total_value"]), checkpoint["as_of_date"]
+
+
+def get_start_state(db, goods_id: int, product_spec: float,
+                    since: Optional[date]) -> Tuple[CostState, CheckpointCollector]:
+    """
+    获取回放的起始状态
+    
+    全量模式从零开始；增量模式从不晚于 since 的最近检查点恢复，
+    再把检查点到 since 之间的记录折算进去。
+    """
+    state, start_date = get_checkpoint_start(db, goods_id, since)
+    collector = CheckpointCollector(goods_id, start_date)
+    if since is not None:
+        state = _replay_state_before(db, goods_id, since, product_spec, state, start_date, collector)
+    return state, collector
+
+
+def get_state_as_of(db, goods_id: int, product_spec: float, as_of: date) -> Tuple[CostState, Optional[date], int]:
+    """
+    计算商品在指定日期日终的库存/成本状态（只读）
+    
+    按 (商品ID, 日期) 唯一索引定位不晚于次日的最近检查点，只回放检查点之后到该日为止的记录，
+    回放量最多为一个月的记录。回放直接基于采购、销售、报损原始记录，
+    不依赖已存储的成本快照，因此成本重算任务未完成时结果同样准确。
+    
+    Returns:
+        Tuple[CostState, Optional[date], int]: 日终状态、所用检查点日期（None 表示从头回放）、回放的记录数
+    """
+    until = as_of + timedelta(days=1)
+    state, start_date = get_checkpoint_start(db, goods_id, until)
+    purchase_query, sale_query, loss_query = replay_queries(db, goods_id, start_date, until=until)
+    count = _fold_events(merge_events(purchase_query, sale_query, loss_query), state, product_spec)
+    return state, start_date, count
+
+
+def get_states_as_of(db, as_of: date, goods_ids: Optional[List[int]] = None) -> Dict[int, CostState]:
+    """
+    批量计算多个商品在指定日期日终的库存/成本状态（只读）
+    
+    与逐个调用 get_state_as_of 结果相同，但：
+    - 各商品的最近检查点由一条分组查询取回
+    - 采购、销售、报损各只查询一次，每个商品只读取其检查点之后到该日为止的记录
+    
+    Args:
+        db: 数据库会话
+        as_of (date): 查询日期（日终）
+        goods_ids (Optional[List[int]]): 商品ID列表，None 表示全部未删除商品
+    
+    Returns:
+        Dict[int, CostState]: {商品ID: 日终状态}
+    """
+    from app.models.goods import Goods
+    
+    until = as_of + timedelta(days=1)
+    goods_query = db.query(Goods.id, Goods.product_spec).filter(Goods.is_deleted == False)
+    if goods_ids is not None:
+        goods_query = goods_query.filter(Goods.id.in_(goods_ids))
+    product_specs = {goods_id: float(product_spec) for goods_id, product_spec in goods_query}
+    
+    # 1. 各商品的起始状态（最近检查点）
+    checkpoint_repo = CostCheckpointRepository(db)
+    states = {goods_id: CostState() for goods_id in product_specs}
+    for goods_id, checkpoint in checkpoint_repo.list_latest_on_or_before(until, goods_ids).items():
+        if goods_id in states:
+            states[goods_id] = CostState(checkpoint["stock"], checkpoint["unit_cost"], checkpoint["total_value"])
+    
+    # 2. 每张表一条查询，按商品关联其检查点日期，跳过检查点之前的记录
+    starts = checkpoint_repo.latest_on_or_before_subquery(until, goods_ids)
+    purchase_query, sale_query, loss_query = replay_queries(db, goods_ids, until=until)
+    purchase_query = _after_checkpoint(purchase_query, starts, PurchaseInfo.goods_id, PurchaseInfo.purchase_date)
+    sale_query = _after_checkpoint(sale_query, starts, SaleInfo.goods_id, SaleInfo.sale_date)
+    loss_query = _after_checkpoint(loss_query, starts, InventoryLoss.goods_id, InventoryLoss.loss_date)
+    
+    # 3. 按商品分组折算
+    for goods_id, events in itertools.groupby(merge_events(purchase_query, sale_query, loss_query),
+                                              key=lambda event: event[0]):
+        if goods_id in states:
+            _fold_events(events, states[goods_id], product_specs[goods_id])
+    return states
+
+
+def _after_checkpoint(query, starts, goods_column, date_column):
+    """限定查询只返回各商品检查点日期及之后的记录（没有检查点的商品不限）"""
+    return query.outerjoin(starts, starts.c.goods_id == goods_column).filter(
+        or_(starts.c.as_of_date.is_(None), date_column >= starts.c.as_of_date)
+    )
+
+
+def replay_goods(db, goods_id: int, product_spec: float, since: Optional[date] = None) -> Dict[str, Any]:
+    """
+    回放单个商品的成本（只读，不修改数据库）
+    
+    逻辑：
+    1. 获取起始状态：全量模式从零开始；增量模式从不晚于 since 的最近检查点恢复
+    2. 从起点开始读取记录（各自按时间排序，流式归并）
+    3. 按时间顺序遍历，since 之前的记录只折算状态，之后的重新计算加权平均成本并与已存储的快照比对
+    
+    Args:
+        db: 数据库会话（可以是只读连接）
+        goods_id (int): 商品ID
+        product_spec (float): 商品规格
+        since (Optional[date]): 受影响的最早日期，None 表示全量回放
+    
+    Returns:
+        Dict[str, Any]: 回放结果，包括最终状态、需回写的销售/报损快照、
+        新的检查点以及涉及的销售对账单ID
+    """
+    # 1. 获取起始状态：增量模式从最近检查点恢复
+    state, start_date = get_checkpoint_start(db, goods_id, since)
+    
+    # 2. 获取需要回放的记录（各自按时间排序，流式归并）
+    purchase_query, sale_query, loss_query = replay_queries(db, goods_id, start_date)
+    events = merge_events(purchase_query, sale_query, loss_query)
+    
+    return _replay_events(goods_id, product_spec, since, state, start_date, events)
+
+
+def _replay_events(goods_id: int, product_spec: float, since: Optional[date],
+                   state: CostState, start_date: Optional[date], events) -> Dict[str, Any]:
+    """
+    从起始状态按顺序回放一个商品的记录流，得到回放结果
+    
+    events 须从 start_date 开始、按 merge_events 的顺序排列。
+    """
+    collector = CheckpointCollector(goods_id, start_date)
+    
+    # 3. 按时间顺序遍历，重新计算
+    # 用于跟踪需要更新的销售对账单（保持首次出现的顺序）
+    statement_ids = {}
+    # 只收集成本快照实际发生变化的记录，最后批量回写
+    sale_updates = []
+    loss_updates = []
+    
+    for _, event_date, _, event_id, event_type, row in events:
+        collector.before_event(event_date, state)
+        if since is not None and event_date < since:
+            # since 之前的记录只折算状态，快照不受影响
+            if event_type == "purchase":
+                state.apply_purchase(row[2], float(row[3]), float(row[4]), product_spec)
+            elif event_type == "sale":
+                state.apply_sale(row[2], float(row[3]), product_spec)
+            elif event_type == "loss":
+                state.apply_loss(row[2], product_spec)
+            continue
+        
+        if event_type == "purchase":
+            # 采购：增加库存，计算新加权平均成本
+            _, _, num, unit_price, total_price, _ = row
+            state.apply_purchase(num, float(unit_price), float(total_price), product_spec)
+        
+        elif event_type == "sale":
+            # 销售：减少库存，记录成本快照
+            _, _, num, unit_price, _, statement_id, trade_unit_cost, unit_profit, total_profit, _ = row
+            snapshot = state.apply_sale(num, float(unit_price), product_spec)
+            
+            new_values = (
+                Decimal(str(round(snapshot["unit_cost"], 2))),
+                Decimal(str(round(snapshot["unit_profit"], 2))),
+                Decimal(str(round(snapshot["total_profit"], 2)))
+            )
+            if new_values != (trade_unit_cost, unit_profit, total_profit):
+                sale_updates.append({
+                    "id": event_id,
+                    "trade_unit_cost": new_values[0],
+                    "unit_profit": new_values[1],
+                    "total_profit": new_values[2]
+                })
+            
+            # 跟踪需要更新的对账单
+            statement_ids[statement_id] = True
+        
+        elif event_type == "loss":
+            # 报损：减少库存，记录报损成本快照
+            _, _, num, loss_unit_cost, loss_total_cost, _ = row
+            snapshot = state.apply_loss(num, product_spec)
+            new_values = (
+                Decimal(str(round(snapshot["unit_cost"], 2))),
+                Decimal(str(round(snapshot["total_cost"], 2)))
+            )
+            if new_values != (loss_unit_cost, loss_total_cost):
+                loss_updates.append({
+                    "id": event_id,
+                    "loss_unit_cost": new_values[0],
+                    "loss_total_cost": new_values[1]
+                })
+    
+    return {
+        "goods_id": goods_id,
+        "since": since,
+        "stock": state.stock,
+        "unit_cost": state.cost,
+        "total_value": state.total_value,
+        "sale_updates": sale_updates,
+        "loss_updates": loss_updates,
+        "checkpoints": collector.rows,
+        "statement_ids": list(statement_ids)
+    }
+
+
+def apply_replay_result(db, result: Dict[str, Any]) -> None:
+    """
+    回写单个商品的回放结果（不提交事务）
+    
+    - 作废旧检查点（全量回放时清空该商品全部检查点），写入新检查点
+    - 批量回写变化的销售/报损快照（按主键 executemany，一次往返）
+    - 销售快照有变化时重新汇总该商品在所涉对账单上的每日经营指标
+    - 更新商品的当前库存和成本
+    """
+    goods_id = result["goods_id"]
+    checkpoint_repo = CostCheckpointRepository(db)
+    if result["since"] is not None:
+        checkpoint_repo.delete_after(goods_id, result["since"])
+    else:
+        checkpoint_repo.delete_by_goods(goods_id)
+    
+    if result["sale_updates"]:
+        db.execute(update(SaleInfo), result["sale_updates"])
+        DailyMetricsRepository(db).refresh_statements(sale_statement_ids=result["statement_ids"], goods_ids=[goods_id])
+    if result["loss_updates"]:
+        db.execute(update(InventoryLoss), result["loss_updates"])
+    
+    GoodsRepository(db).update_stock_and_cost(
+        goods_id=goods_id,
+        new_stock=result["stock"],
+        new_cost=Decimal(str(round(result["unit_cost"], 2))),
+        new_value=Decimal(str(round(result["total_value"], 2)))
+    )
+    checkpoint_repo.bulk_create(result["checkpoints"])
+
+
+def refresh_sale_statements(db, statement_ids: List[int]) -> None:
+    """
+    重新汇总销售对账单的对账金额、总成本和总利润（不提交事务）
+    
+    所有对账单用一次分组聚合查询汇总，再用一次批量更新写回；
+    成本按每条销售记录自身的规格计算。
+    """
+    statement_repo = SaleStatementRepository(db)
+    rows = []
+    for totals in statement_repo.sum_sale_totals(list(statement_ids)):
+        total_amount = totals["total_amount"]
+        unreceived = total_amount - float(totals["received_amount"] or 0)
+        rows.append({
+            "id": totals["id"],
+            "statement_amount": Decimal(str(round(total_amount, 2))),
+            "total_profit": Decimal(str(round(totals["total_profit"], 2))),
+            "total_cost": Decimal(str(round(totals["total_cost"], 2))),
+            "unreceived_amount": Decimal(str(round(unreceived, 2))),
+            "receive_status": unreceived <= 0
+        })
+    statement_repo.bulk_update_amount_and_profit(rows)
+
+
+async def recalculate_cost_for_goods(goods_id: int, since: Union[datetime, date, None] = None) -> None:
     """
     按时间顺序重新计算指定商品的成本、库存和销售利润
     
@@ -24,197 +518,98 @@ async def recalculate_cost_for_goods(goods_id: int) -> None:
     3. 更新销售记录的成本快照
     4. 更新商品的当前库存和成本
     5. 更新销售对账单的总成本和总利润
+    
+    增量模式（传入 since）：
+    - 作废 since 之后的检查点，从不晚于 since 的最近检查点恢复状态
+    - 检查点到 since 之间的记录只按列读取并折算出期初状态，不回写
+    - 只回放并回写 since 当天及之后的记录，结果与全量回放一致
+    - 回放过程中按月重新写入检查点
+    
+    Args:
+        goods_id (int): 商品ID
+        since (Union[datetime, date, None]): 受影响的最早日期，None 表示全量回放
+    """
+    await recalculate_costs_for_goods([goods_id], since=since)
+
+
+async def recalculate_costs_for_goods(goods_ids: List[int],
+                                      since: Union[datetime, date, None, Dict[int, Union[datetime, date, None]]] = None) -> None:
+    """
+    批量重算多个商品的成本（一个会话、一次提交）
+    
+    与逐个调用 recalculate_cost_for_goods 结果相同，但：
+    - 采购、销售、报损各只查询一次（goods_id IN），按商品分组后流式回放
+    - 所有商品涉及的销售对账单只汇总刷新一次
+    - 全部写入在同一事务内提交，任一商品失败则整体回滚
+    
+    Args:
+        goods_ids (List[int]): 商品ID列表（已删除或不存在的商品会被跳过）
+        since: 受影响的最早日期；可传入单个日期（所有商品共用）、
+            {商品ID: 日期} 字典（逐个商品指定），None 表示全量回放
     """
     from app.database import SessionLocal
+    from app.models.goods import Goods
+    
+    goods_ids = list(dict.fromkeys(goods_ids))
+    if not goods_ids:
+        return
+    if isinstance(since, dict):
+        since_map = {goods_id: _to_date(value) for goods_id, value in since.items()}
+    else:
+        since_map = dict.fromkeys(goods_ids, _to_date(since))
+    
     db = SessionLocal()
     
     try:
-        goods_repo = GoodsRepository(db)
-        purchase_repo = PurchaseInfoRepository(db)
-        sale_repo = SaleInfoRepository(db)
-        loss_repo = InventoryLossRepository(db)
-        statement_repo = SaleStatementRepository(db)
-        
-        # 获取商品信息
-        goods = goods_repo.get_by_id(goods_id)
-        if not goods:
+        goods_list = db.query(Goods.id, Goods.product_spec).filter(
+            Goods.id.in_(goods_ids),
+            Goods.is_deleted == False
+        ).order_by(Goods.id).all()
+        if not goods_list:
             return
         
-        product_spec = float(goods.get("product_spec", 1))
-        
-        # 1. 获取所有相关记录，按时间排序
-        all_events = []
-        
-        # 获取采购记录
-        purchases = db.query(PurchaseInfo).filter(
-            PurchaseInfo.goods_id == goods_id,
-            PurchaseInfo.is_deleted == False
-        ).order_by(PurchaseInfo.purchase_date, PurchaseInfo.id).all()
-        
-        for p in purchases:
-            all_events.append({
-                "type": "purchase",
-                "date": p.purchase_date,
-                "id": p.id,
-                "num": p.purchase_num,
-                "unit_price": float(p.purchase_unit_price),
-                "total_price": float(p.purchase_total_price),
-                "obj": p
-            })
+        # 1. 各商品的起始状态（检查点），读取下界取最早的起点
+        starts = {
+            goods_id: get_checkpoint_start(db, goods_id, since_map.get(goods_id))
+            for goods_id, _ in goods_list
+        }
+        start_dates = [start_date for _, start_date in starts.values()]
+        lower_bound = None if None in start_dates else min(start_dates)
         
-        # 获取销售记录
-        sales = db.query(SaleInfo).filter(
-            SaleInfo.goods_id == goods_id,
-            SaleInfo.is_deleted == False
-        ).order_by(SaleInfo.sale_date, SaleInfo.id).all()
-        
-        for s in sales:
-            all_events.append({
-                "type": "sale",
-                "date": s.sale_date,
-                "id": s.id,
-                "num": s.sale_num,
-                "unit_price": float(s.sale_unit_price),
-                "total_price": float(s.sale_total_price),
-                "obj": s
-            })
-        
-        # 获取报损记录
-        losses = db.query(InventoryLoss).filter(
-            InventoryLoss.goods_id == goods_id,
-            InventoryLoss.is_deleted == False
-        ).order_by(InventoryLoss.loss_date, InventoryLoss.id).all()
-        
-        for l in losses:
-            all_events.append({
-                "type": "loss",
-                "date": l.loss_date,
-                "id": l.id,
-                "num": l.loss_num,
-                "obj": l
-            })
-        
-        # 按日期和类型排序（同一日期，采购先于销售，销售先于报损）
-        def sort_key(event):
-            type_priority = {"purchase": 0, "sale": 1, "loss": 2}
-            return (event["date"], type_priority[event["type"]], event["id"])
-        
-        all_events.sort(key=sort_key)
-        
-        # 2. 按时间顺序遍历，重新计算
-        current_stock = 0
-        current_cost = 0.0
-        current_total_value = 0.0
-        
-        # 用于跟踪需要更新的销售对账单
-        statements_to_update = {}
+        # 2. 每张表一条查询读取全部商品的记录，按商品分组
+        purchase_query, sale_query, loss_query = replay_queries(
+            db, [goods_id for goods_id, _ in goods_list], lower_bound
+        )
+        groups = itertools.groupby(
+            merge_events(purchase_query, sale_query, loss_query),
+            key=lambda event: event[0]
+        )
+        current = next(groups, None)
         
-        for event in all_events:
-            if event["type"] == "purchase":
-                # 采购：增加库存，计算新加权平均成本
-                purchase_num = event["num"]
-                purchase_total = event["total_price"]
-                
-                old_total_value = current_stock * current_cost * product_spec
-                new_stock = current_stock + purchase_num
-                new_total_value = old_total_value + purchase_total
-                
-                if new_stock > 0:
-                    new_cost = new_total_value / (new_stock * product_spec)
-                else:
-                    new_cost = event["unit_price"]
-                
-                new_total_value = new_cost * new_stock * product_spec
-                
-                current_stock = new_stock
-                current_cost = new_cost
-                current_total_value = new_total_value
-            
-            elif event["type"] == "sale":
-                # 销售：减少库存，记录成本快照
-                sale_num = event["num"]
-                sale_unit_price = event["unit_price"]
-                sale_total_price = event["total_price"]
-                sale_obj = event["obj"]
-                
-                # 计算成本和利润
-                unit_cost = current_cost
-                total_cost = unit_cost * sale_num * product_spec
-                unit_profit = sale_unit_price - unit_cost
-                total_profit = unit_profit * sale_num * product_spec
-                
-                # 更新销售记录
-                sale_obj.trade_unit_cost = Decimal(str(round(unit_cost, 2)))
-                sale_obj.unit_profit = Decimal(str(round(unit_profit, 2)))
-                sale_obj.total_profit = Decimal(str(round(total_profit, 2)))
-                
-                # 跟踪需要更新的对账单
-                statement_id = sale_obj.statement_id
-                if statement_id not in statements_to_update:
-                    statements_to_update[statement_id] = {
-                        "total_amount": 0.0,
-                        "total_cost": 0.0,
-                        "total_profit": 0.0
-                    }
-                statements_to_update[statement_id]["total_amount"] += sale_total_price
-                statements_to_update[statement_id]["total_cost"] += total_cost
-                statements_to_update[statement_id]["total_profit"] += total_profit
-                
-                # 更新库存
-                current_stock = current_stock - sale_num
-                current_total_value = current_cost * current_stock * product_spec
+        # 3. 逐个商品回放（商品与记录均按商品ID排序），读取结束后再统一回写
+        results = []
+        for goods_id, product_spec in goods_list:
+            state, start_date = starts[goods_id]
+            events = ()
+            if current is not None and current[0] == goods_id:
+                events = current[1]
+                if start_date is not None and start_date != lower_bound:
+                    # 下界早于本商品的检查点，跳过检查点之前的记录
+                    events = itertools.dropwhile(lambda event, d=start_date: event[1] < d, events)
             
-            elif event["type"] == "loss":
-                # 报损：减少库存
-                loss_num = event["num"]
-                loss_obj = event["obj"]
-                
-                # 更新报损记录的成本快照
-                loss_obj.loss_unit_cost = Decimal(str(round(current_cost, 2)))
-                loss_obj.loss_total_cost = Decimal(str(round(current_cost * loss_num * product_spec, 2)))
-                
-                # 更新库存
-                current_stock = current_stock - loss_num
-                current_total_value = current_cost * current_stock * product_spec
-        
-        # 3. 更新商品当前库存和成本
-        goods_repo.update_stock_and_cost(
-            goods_id=goods_id,
-            new_stock=current_stock,
-            new_cost=Decimal(str(round(current_cost, 2))),
-            new_value=Decimal(str(round(current_total_value, 2)))
-        )
+            result = _replay_events(goods_id, float(product_spec), since_map.get(goods_id), state, start_date, events)
+            if current is not None and current[0] == goods_id:
+                current = next(groups, None)
+            results.append(result)
         
-        # 4. 更新销售对账单
-        for statement_id, data in statements_to_update.items():
-            statement = statement_repo.get_by_id(statement_id)
-            if statement:
-                # 获取该对账单的所有销售记录重新计算（确保准确）
-                sales_in_statement = db.query(SaleInfo).filter(
-                    SaleInfo.statement_id == statement_id,
-                    SaleInfo.is_deleted == False
-                ).all()
-                
-                total_amount = 0.0
-                total_cost = 0.0
-                total_profit = 0.0
-                
-                for s in sales_in_statement:
-                    total_amount += float(s.sale_total_price)
-                    total_cost += float(s.trade_unit_cost) * int(s.sale_num) * product_spec
-                    total_profit += float(s.total_profit)
-                
-                statement_repo.update_amount_and_profit(
-                    statement_id=statement_id,
-                    statement_amount=Decimal(str(round(total_amount, 2))),
-                    total_profit=Decimal(str(round(total_profit, 2))),
-                    total_cost=Decimal(str(round(total_cost, 2))),
-                    unreceived_amount=Decimal(str(round(total_amount - float(statement.get("received_amount", 0)), 2))),
-                    receive_status=(total_amount - float(statement.get("received_amount", 0))) <= 0
-                )
+        statement_ids = {}
+        for result in results:
+            apply_replay_result(db, result)
+            statement_ids.update(dict.fromkeys(result["statement_ids"]))
+        refresh_sale_statements(db, list(statement_ids))
         
         db.commit()
-        
+    
     except Exception as e:
         db.rollback()
         raise
@@ -222,19 +617,361 @@ async def recalculate_cost_for_goods(goods_id: int) -> None:
         db.close()
 
 
-async def recalculate_all_costs() -> None:
-    """重新计算所有商品的成本"""
+async def recalculate_all_costs(workers: Optional[int] = None) -> None:
+    """
+    重新计算所有商品的成本，并重建全部成本检查点
+    
+    与全量重建共用同一条路径（多进程分区计算、按分区回写提交），见 rebuild_all_costs_parallel。
+    """
+    await rebuild_all_costs_parallel(workers=workers)
+
+
+# ==================== 后台重算任务 ====================
+
+# 后台任务运行状态（仅进程内可见，用于状态查询接口）
+_worker_status: Dict[str, Any] = {
+    "running": False,
+    "current_goods_id": None,
+    "processed_count": 0,
+    "last_finished_time": None,
+    "last_error": None
+}
+_worker_wakeup: Optional[asyncio.Event] = None
+
+
+def _get_wakeup_event() -> asyncio.Event:
+    global _worker_wakeup
+    if _worker_wakeup is None:
+        _worker_wakeup = asyncio.Event()
+    return _worker_wakeup
+
+
+def enqueue_cost_recalc(db, goods_id: int, since: Union[datetime, date]) -> None:
+    """
+    登记商品的成本重算任务
+    
+    必须在业务数据所在的事务内调用，随业务数据一起提交：
+    - 同一商品的多次登记合并为一条任务，日期取最早者
+    - 立即作废该日期之后的成本检查点，避免其他查询读到过期快照
+    - 唤醒后台任务；后台任务在当前请求让出事件循环后才会执行
+    
+    Args:
+        db: 业务数据所在的数据库会话
+        goods_id (int): 商品ID
+        since (Union[datetime, date]): 受影响的最早日期
+    """
+    since = _to_date(since)
+    CostRecalcJobRepository(db).enqueue(goods_id, since)
+    CostCheckpointRepository(db).delete_after(goods_id, since)
+    _get_wakeup_event().set()
+
+
+async def process_pending_recalc_jobs() -> int:
+    """
+    分批处理所有待重算任务
+    
+    每批最多取 RECALC_JOB_BATCH_SIZE 个商品，用 recalculate_costs_for_goods 一次读取、
+    一次提交；每处理完一批让出一次事件循环，避免长时间阻塞请求。
+    
+    Returns:
+        int: 本轮处理的任务数
+    """
+    from app.database import SessionLocal
+    processed = 0
+    
+    while True:
+        # 全量重建期间暂停，重建结束后会再次唤醒
+        if _rebuild_status["running"]:
+            break
+        
+        db = SessionLocal()
+        try:
+            jobs = CostRecalcJobRepository(db).get_batch(RECALC_JOB_BATCH_SIZE)
+        finally:
+            db.close()
+        if not jobs:
+            break
+        
+        since_map = {job["goods_id"]: job["since_date"] for job in jobs}
+        _worker_status["current_goods_id"] = jobs[0]["goods_id"]
+        try:
+            await recalculate_costs_for_goods(list(since_map), since=since_map)
+        except Exception as e:
+            # 任务保留在表中，等待下次唤醒时重试
+            goods_text = ",".join(str(goods_id) for goods_id in since_map)
+            _worker_status["last_error"] = f"商品{goods_text}成本重算失败: {e}"
+            print(f"⚠️  {_worker_status['last_error']}")
+            _worker_status["current_goods_id"] = None
+            break
+        
+        db = SessionLocal()
+        try:
+            repo = CostRecalcJobRepository(db)
+            for goods_id, since in since_map.items():
+                repo.delete_if_unchanged(goods_id, since)
+            db.commit()
+        finally:
+            db.close()
+        
+        processed += len(jobs)
+        _worker_status["processed_count"] += len(jobs)
+        _worker_status["last_finished_time"] = datetime.now()
+        _worker_status["current_goods_id"] = None
+        await asyncio.sleep(0)
+    
+    return processed
+
+
+async def run_recalc_worker(idle_timeout: float = 30.0) -> None:
+    """
+    后台成本重算任务主循环
+    
+    在应用的事件循环内运行（SQLite 使用单连接的 StaticPool，不能跨线程并发写）。
+    启动时先处理上次退出时遗留的任务，之后等待新任务登记后被唤醒。
+    
+    Args:
+        idle_timeout (float): 无新任务时的最长等待秒数，超时后重新检查任务表
+    """
+    wakeup = _get_wakeup_event()
+    _worker_status["running"] = True
+    try:
+        while True:
+            wakeup.clear()
+            await process_pending_recalc_jobs()
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=idle_timeout)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        _worker_status["running"] = False
+
+
+def get_recalc_status(limit: int = 20) -> Dict[str, Any]:
+    """
+    查询后台成本重算状态
+    
+    Args:
+        limit (int): 返回的待处理任务条数上限
+    
+    Returns:
+        Dict[str, Any]: 任务运行状态及待处理任务列表
+    """
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        repo = CostRecalcJobRepository(db)
+        pending = repo.list_pending(limit)
+        return {
+            "running": _worker_status["running"],
+            "current_goods_id": _worker_status["current_goods_id"],
+            "pending_count": repo.count(),
+            "pending_jobs": [{
+                "goods_id": job["goods_id"],
+                "goods_name": job["goods_name"],
+                "since_date": job["since_date"].strftime("%Y-%m-%d"),
+                "update_time": job["update_time"].strftime("%Y-%m-%d %H:%M:%S") if job["update_time"] else None
+            } for job in pending],
+            "processed_count": _worker_status["processed_count"],
+            "last_finished_time": _worker_status["last_finished_time"].strftime("%Y-%m-%d %H:%M:%S") if _worker_status["last_finished_time"] else None,
+            "last_error": _worker_status["last_error"],
+            "rebuild": get_rebuild_status()
+        }
+    finally:
+        db.close()
+
+
+def get_pending_goods_ids(db, goods_ids) -> set:
+    """返回给定商品中成本尚待重算的商品ID集合"""
+    return CostRecalcJobRepository(db).get_pending_goods_ids(goods_ids)
+
+
+# ==================== 并行全量重建 ====================
+
+# 全量重建进度（仅进程内可见，用于状态查询接口）
+_rebuild_status: Dict[str, Any] = {
+    "running": False,
+    "total_goods": 0,
+    "computed_goods": 0,
+    "written_goods": 0,
+    "start_time": None,
+    "finish_time": None,
+    "last_error": None
+}
+_rebuild_task: Optional[asyncio.Task] = None
+
+
+def _get_database_path() -> str:
+    """获取当前 SQLite 数据库文件的绝对路径（供子进程以只读方式打开）"""
+    from app.database import engine
+    return os.path.abspath(engine.url.database)
+
+
+@contextmanager
+def readonly_session(db_path: Optional[str] = None):
+    """
+    以只读方式打开数据库的独立会话（独立连接，不共享应用的写连接）
+    
+    会话内的查询读取同一份已提交数据的一致性快照，WAL 模式下既不阻塞写入，
+    也不会持有写锁。
+    
+    Args:
+        db_path (Optional[str]): 数据库文件绝对路径，None 表示当前数据库
+    """
+    from sqlalchemy import create_engine, event
+    from sqlalchemy.orm import sessionmaker
+    
+    ro_engine = create_engine(
+        f"sqlite:///file:{db_path or _get_database_path()}?mode=ro&uri=true",
+        connect_args={"check_same_thread": False}
+    )
+    
+    # pysqlite 默认不为查询开启事务，每条 SELECT 各读一份快照；
+    # 这里显式 BEGIN，使整个会话读取同一份快照
+    @event.listens_for(ro_engine, "connect")
+    def _disable_pysqlite_transaction(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+    
+    @event.listens_for(ro_engine, "begin")
+    def _begin_snapshot(connection):
+        connection.exec_driver_sql("BEGIN")
+    
+    db = sessionmaker(bind=ro_engine)()
+    try:
+        yield db
+    finally:
+        db.close()
+        ro_engine.dispose()
+
+
+def _compute_partition(db_path: str, goods_items: List[Tuple[int, float]]) -> List[Dict[str, Any]]:
+    """
+    子进程入口：以只读方式打开数据库，计算一批商品的全量回放结果
+    
+    整批商品在同一个读事务内完成，读取的是同一份一致性快照（WAL 模式下不阻塞写入）。
+    
+    Args:
+        db_path (str): 数据库文件绝对路径
+        goods_items (List[Tuple[int, float]]): (商品ID, 商品规格) 列表
+    
+    Returns:
+        List[Dict[str, Any]]: 每个商品的回放结果
+    """
+    from app.services.cost_recalc_numpy import replay_goods_numpy
+    
+    with readonly_session(db_path) as db:
+        return [replay_goods_numpy(db, goods_id, product_spec) for goods_id, product_spec in goods_items]
+
+
+async def rebuild_all_costs_parallel(workers: Optional[int] = None,
+                                     partition_size: int = 200) -> None:
+    """
+    多进程并行重建所有商品的成本和检查点
+    
+    - 子进程按商品分区，从只读快照计算回放结果（使用向量化引擎）
+    - 主进程作为唯一写入方，在事件循环内按分区回写，每个分区回写后立即提交：
+      所有会话共用同一个数据库连接（StaticPool），未提交的写入不能跨越 await，
+      否则其他请求的提交/回滚会一并提交或丢弃这部分写入
+    - 重建期间暂停后台重算任务，结束后再处理期间登记的任务（以覆盖快照之后的修改）
+    - 销售对账单在全部商品回写后统一汇总一次
+    
+    Args:
+        workers (Optional[int]): 子进程数，默认使用 CPU 核数
+        partition_size (int): 每个分区的商品数（也是每次提交回写的商品数）
+    """
     from app.database import SessionLocal
     from app.models.goods import Goods
     
+    if _rebuild_status["running"]:
+        raise CustomAPIException(code=409, message="成本全量重建正在进行中")
+    
+    _rebuild_status.update({
+        "running": True,
+        "total_goods": 0,
+        "computed_goods": 0,
+        "written_goods": 0,
+        "start_time": datetime.now(),
+        "finish_time": None,
+        "last_error": None
+    })
     db = SessionLocal()
     
     try:
-        # 获取所有未删除的商品
-        goods_list = db.query(Goods).filter(Goods.is_deleted == False).all()
+        goods_items = [
+            (goods_id, float(product_spec))
+            for goods_id, product_spec in db.query(Goods.id, Goods.product_spec).filter(
+                Goods.is_deleted == False
+            ).order_by(Goods.id).all()
+        ]
+        _rebuild_status["total_goods"] = len(goods_items)
         
-        for goods in goods_list:
-            await recalculate_cost_for_goods(goods.id)
-            
+        # 清空检查点（包括已删除商品遗留的），由各商品的回放结果重新生成
+        CostCheckpointRepository(db).delete_all()
+        db.commit()
+        
+        partitions = [goods_items[i:i + partition_size] for i in range(0, len(goods_items), partition_size)]
+        db_path = _get_database_path()
+        loop = asyncio.get_running_loop()
+        
+        statement_ids = set()
+        
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [loop.run_in_executor(pool, _compute_partition, db_path, part) for part in partitions]
+            for future in asyncio.as_completed(futures):
+                results = await future
+                _rebuild_status["computed_goods"] += len(results)
+                
+                for result in results:
+                    apply_replay_result(db, result)
+                    statement_ids.update(result["statement_ids"])
+                
+                # 下一次 await 之前提交本分区的写入
+                db.commit()
+                _rebuild_status["written_goods"] += len(results)
+        
+        # 汇总销售对账单
+        refresh_sale_statements(db, statement_ids)
+        db.commit()
+    
+    except Exception as e:
+        db.rollback()
+        _rebuild_status["last_error"] = f"成本全量重建失败: {e}"
+        raise
     finally:
         db.close()
+        _rebuild_status["running"] = False
+        _rebuild_status["finish_time"] = datetime.now()
+        # 处理重建期间登记的重算任务
+        _get_wakeup_event().set()
+
+
+def get_rebuild_status() -> Dict[str, Any]:
+    """查询成本全量重建进度"""
+    total = _rebuild_status["total_goods"]
+    return {
+        "running": _rebuild_status["running"],
+        "total_goods": total,
+        "computed_goods": _rebuild_status["computed_goods"],
+        "written_goods": _rebuild_status["written_goods"],
+        "progress": round(_rebuild_status["written_goods"] / total * 100, 2) if total else 0,
+        "start_time": _rebuild_status["start_time"].strftime("%Y-%m-%d %H:%M:%S") if _rebuild_status["start_time"] else None,
+        "finish_time": _rebuild_status["finish_time"].strftime("%Y-%m-%d %H:%M:%S") if _rebuild_status["finish_time"] else None,
+        "last_error": _rebuild_status["last_error"]
+    }
+
+
+async def start_rebuild_all_costs(workers: Optional[int] = None) -> Dict[str, Any]:
+    """在后台启动并行全量重建，立即返回当前进度"""
+    global _rebuild_task
+    if _rebuild_status["running"]:
+        raise CustomAPIException(code=409, message="成本全量重建正在进行中")
+    
+    async def _run():
+        try:
+            await rebuild_all_costs_parallel(workers=workers)
+        except Exception as e:
+            print(f"⚠️  {_rebuild_status['last_error'] or e}")
+    
+    _rebuild_task = asyncio.create_task(_run())
+    # 让任务先进入运行状态，返回的进度才有意义
+    await asyncio.sleep(0)
+    return get_rebuild_status()
@@ -2,6 +2,7 @@ from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 from app.repositories.operating_expense_repo import OperatingExpenseRepository
+from app.repositories.daily_metrics_repo import DailyMetricsRepository
 from app.database import get_db
 # 替换废弃异常：导入项目统一自定义异常（和其他服务层路径一致）
 from app.utils.exceptions import CustomAPIException, NotFoundException
@@ -38,6 +39,7 @@ async def add_operating_expense(data) -> Dict[str, int]:
     # 初始化仓库并执行新增
     expense_repo = OperatingExpenseRepository(db)
     expense_id = expense_repo.create(repo_data)
+    DailyMetricsRepository(db).refresh_dates([fee_date])
     db.commit()
     return {"id": expense_id}
 
@@ -140,6 +142,7 @@ async def update_operating_expense(data) -> None:
     # 存在更新数据时执行更新并提交
     if repo_data:
         expense_repo.update(expense_id, repo_data)
+        DailyMetricsRepository(db).refresh_dates([existing["expense_date"], repo_data.get("expense_date")])
         db.commit()
 
 
@@ -159,4 +162,5 @@ async def delete_operating_expense(id: int) -> None:
         raise NotFoundException(message="杂费记录不存在")
     
     expense_repo.soft_delete(id)
+    DailyMetricsRepository(db).refresh_dates([existing["expense_date"]])
     db.commit()
\ No newline at end of file
@@ -1,17 +1,63 @@
 import asyncio
 import time
-from typing import Optional, Dict, List, Any
-from datetime import datetime, timedelta
+from contextvars import ContextVar
+from typing import Optional, Dict, List, Any, Tuple
+from datetime import datetime, timedelta, date
 from decimal import Decimal
+from dateutil.relativedelta import relativedelta
 from app.repositories.goods_repo import GoodsRepository
 from app.repositories.purchase_statement_repo import PurchaseStatementRepository
 from app.repositories.sale_statement_repo import SaleStatementRepository
 from app.repositories.operating_expense_repo import OperatingExpenseRepository
+from app.repositories.daily_metrics_repo import DailyMetricsRepository
+from app.repositories.data_version import VersionedCache
 from app.database import SessionLocal  # 保留原有会话获取方法
 # 替换废弃异常：导入项目统一自定义异常（和其他服务层路径完全一致）
 from app.utils.exceptions import CustomAPIException, ParamErrorException
 
 
+# 首页统计读取的表：采购/销售/报损/收付款/运营杂费/成本重算等写入路径提交后，
+# 对应表的数据版本递增，首页缓存随之失效（收付款通过更新对账单金额体现）
+HOME_CACHE_TABLES = (
+    "t_goods",
+    "t_sale_info",
+    "t_sale_statement",
+    "t_purchase_statement",
+    "t_operating_expense",
+    "t_purchaser",
+    "t_daily_metrics"
+)
+_home_cache = VersionedCache(HOME_CACHE_TABLES)
+# 本次计算中查询失败、以默认值代替的统计项（子任务和线程复制上下文后共享同一列表）
+_home_fallbacks: ContextVar[Optional[List[str]]] = ContextVar("home_fallbacks", default=None)
+
+
+async def _cached(key, compute):
+    """
+    按依赖表数据版本读取首页缓存，未命中时计算并写入
+    - 未结束的对账单按"今天"统计，缓存键包含当天日期，跨天自动失效
+    - 有查询失败、以默认值代替时不写入缓存，下次请求重新计算
+    """
+    key = key + (date.today(),)
+    versions = _home_cache.versions()
+    result = _home_cache.get(key, versions)
+    if result is None:
+        fallbacks: List[str] = []
+        token = _home_fallbacks.set(fallbacks)
+        try:
+            result = await compute()
+        finally:
+            _home_fallbacks.reset(token)
+        if not fallbacks:
+            _home_cache.put(key, versions, result)
+    return result
+
+
+def get_home_cache_status() -> Dict[str, Any]:
+    """首页缓存状态（条目数、命中/未命中次数、各依赖表数据版本）"""
+    return _home_cache.stats()
+
+
 async def get_statistic_card_data(
     time_type: Optional[str],
     start_date: Optional[str],
@@ -21,6 +67,10 @@ async def get_statistic_card_data(
     获取数字卡片数据
     说明：返回固定的统计数据
     """
+    return await _cached(("statistic_card",), _get_statistic_card_data)
+
+
+async def _get_statistic_card_data() -> Dict[str, Any]:
     # 获取当前月份和年度的时间范围
     today = datetime.now()
     current_month_start = datetime(today.year, today.month, 1)
@@ -35,15 +85,18 @@ async def get_statistic_card_data(
     all_time_start = datetime(2000, 1, 1)
     all_time_end = datetime.now().replace(hour=23, minute=59, second=59)
     
-    # 并行查询数字卡片核心数据
-    inventory_value, purchase_unreceived, sale_unreceived, month_stats, year_stats, total_stats = await asyncio.gather(
+    # 并行查询数字卡片核心数据（本月/本年/全部统计合并为一组条件聚合查询）
+    inventory_value, purchase_unreceived, sale_unreceived, range_stats = await asyncio.gather(
         asyncio.to_thread(_get_total_inventory_value),
         asyncio.to_thread(_get_total_purchase_unreceived),
         asyncio.to_thread(_get_total_sale_unreceived),
-        _get_cycle_statistics(current_month_start, current_month_end),
-        _get_cycle_statistics(current_year_start, current_year_end),
-        _get_cycle_statistics(all_time_start, all_time_end)
+        _get_range_statistics([
+            (current_month_start, current_month_end),
+            (current_year_start, current_year_end),
+            (all_time_start, all_time_end)
+        ])
     )
+    month_stats, year_stats, total_stats = range_stats
     
     # 数据兜底处理
     month_stats = month_stats or {}
@@ -78,7 +131,10 @@ async def get_pie_chart_data(
     start_date, end_date = await _resolve_date_range(
         time_type, start_date, end_date
     )
-    
+    return await _cached(("pie_chart", start_date, end_date), lambda: _get_pie_chart_data(start_date, end_date))
+
+
+async def _get_pie_chart_data(start_date: datetime, end_date: datetime) -> Dict[str, Any]:
     # 并行查询饼状图分布数据
     purchaser_profit, product_profit = await asyncio.gather(
         asyncio.to_thread(
@@ -115,7 +171,10 @@ async def get_trend_chart_data(
     start_date, end_date = await _resolve_date_range(
         time_type, start_date, end_date
     )
-    
+    return await _cached(("trend_chart", start_date, end_date), lambda: _get_trend_chart_data(start_date, end_date))
+
+
+async def _get_trend_chart_data(start_date: datetime, end_date: datetime) -> Dict[str, Any]:
     # 获取趋势图数据
     trend_data = await _get_trend_chart_data_by_range(
         start_date, end_date
@@ -149,7 +208,10 @@ async def get_home_data(
     start_date, end_date = await _resolve_date_range(
         time_type, start_date, end_date
     )
-    
+    return await _cached(("home_data", start_date, end_date), lambda: _get_home_data(start_date, end_date))
+
+
+async def _get_home_data(start_date: datetime, end_date: datetime) -> Dict[str, Any]:
     # 获取当前月份和年度的时间范围
     today = datetime.now()
     current_month_start = datetime(today.year, today.month, 1)
@@ -165,22 +227,22 @@ async def get_home_data(
     all_time_end = datetime.now().replace(hour=23, minute=59, second=59)
     
     # 并行查询数字卡片核心数据 - 每个线程独立创建会话+仓库，保证线程隔离
-    inventory_value, purchase_unreceived, sale_unreceived, current_stats, month_stats, year_stats, total_stats = await asyncio.gather(
+    inventory_value, purchase_unreceived, sale_unreceived, range_stats = await asyncio.gather(
         # 库存总价值：独立线程+独立会话
         asyncio.to_thread(_get_total_inventory_value),
         # 采购未付款：独立线程+独立会话
         asyncio.to_thread(_get_total_purchase_unreceived),
         # 销售未收款：独立线程+独立会话
         asyncio.to_thread(_get_total_sale_unreceived),
-        # 当前时间范围统计：内部已做线程隔离，直接调用
-        _get_cycle_statistics(start_date, end_date),
-        # 本月统计
-        _get_cycle_statistics(current_month_start, current_month_end),
-        # 本年统计
-        _get_cycle_statistics(current_year_start, current_year_end),
-        # 全部统计
-        _get_cycle_statistics(all_time_start, all_time_end)
+        # 当前时间范围/本月/本年/全部统计：每张表一次条件聚合扫描，内部已做线程隔离
+        _get_range_statistics([
+            (start_date, end_date),
+            (current_month_start, current_month_end),
+            (current_year_start, current_year_end),
+            (all_time_start, all_time_end)
+        ])
     )
+    current_stats, month_stats, year_stats, total_stats = range_stats
     
     # 查询趋势图数据（单线程执行，内部并行已做隔离）
     trend_data = await _get_trend_chart_data_by_range(
@@ -264,17 +326,17 @@ def _get_total_sale_unreceived():
 
 def _get_purchaser_profit_distribution(start_date, end_date):
     db = SessionLocal()
-    repo = SaleStatementRepository(db)
+    repo = DailyMetricsRepository(db)
     try:
-        return repo.get_purchaser_profit_distribution(start_date, end_date)
+        return repo.get_purchaser_profit_distribution(start_date.date(), end_date.date())
     finally:
         db.close()
 
 def _get_product_profit_distribution(start_date, end_date):
     db = SessionLocal()
-    repo = SaleStatementRepository(db)
+    repo = DailyMetricsRepository(db)
     try:
-        return repo.get_product_profit_distribution(start_date, end_date)
+        return repo.get_product_profit_distribution(start_date.date(), end_date.date())
     finally:
         db.close()
 
@@ -310,105 +372,61 @@ async def _resolve_date_range(
         raise ParamErrorException(message=f"不支持的time_type参数：{time_type}")
 
 
-async def _get_cycle_statistics(
-    start_date: datetime,
-    end_date: datetime,
-) -> Dict[str, float]:
+async def _get_range_statistics(
+    ranges: List[Tuple[datetime, datetime]],
+) -> List[Dict[str, float]]:
     """
-    获取指定时间范围的经营统计数据
+    获取多个时间范围的经营统计数据（返回顺序与 ranges 一致）
     - revenue: 销售收入（销售对账单金额）
     - profit: 经营毛利（销售利润 - 运营杂费）
     - expend: 总支出（采购支出 + 运营杂费）
+    - 每张表按条件聚合一次扫描算出全部范围，共3次查询，各在独立线程执行
     """
-    # 内部并行查询，同样做线程隔离
-    sale_revenue, sale_profit, purchase_expend, operating_expend = await asyncio.gather(
-        asyncio.to_thread(_get_sale_revenue_by_date, start_date, end_date),
-        asyncio.to_thread(_get_sale_profit_by_date, start_date, end_date),
-        asyncio.to_thread(_get_purchase_expend_by_date, start_date, end_date),
-        asyncio.to_thread(_get_operating_expend_by_date, start_date, end_date)
+    zero = Decimal("0.00")
+    sale_totals, purchase_expends, operating_expends = await asyncio.gather(
+        asyncio.to_thread(
+            _query_by_ranges, SaleStatementRepository, "sum_by_date_ranges", ranges,
+            [{"amount": zero, "profit": zero} for _ in ranges]
+        ),
+        asyncio.to_thread(
+            _query_by_ranges, PurchaseStatementRepository, "sum_amount_by_date_ranges", ranges,
+            [zero for _ in ranges]
+        ),
+        asyncio.to_thread(
+            _query_by_ranges, OperatingExpenseRepository, "sum_amount_by_date_ranges", ranges,
+            [zero for _ in ranges]
+        )
     )
     
     # 计算统计指标，空值默认0（逻辑不变）
-    revenue = float(sale_revenue or 0)
-    profit = float(sale_profit or 0) - float(operating_expend or 0)
-    expend = float(purchase_expend or 0) + float(operating_expend or 0)
-    
-    return {"revenue": revenue, "profit": profit, "expend": expend}
-
-# 周期统计的独立线程方法
-def _get_sale_revenue_by_date(start_date, end_date):
-    max_retries = 3
-    retry_delay = 0.5
-    
-    for attempt in range(max_retries):
-        db = SessionLocal()
-        repo = SaleStatementRepository(db)
-        try:
-            return repo.get_total_statement_amount_by_date(start_date, end_date)
-        except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-                continue
-            else:
-                # 最终失败返回默认值
-                return Decimal("0.00")
-        finally:
-            db.close()
+    result = []
+    for sale_total, purchase_expend, operating_expend in zip(sale_totals, purchase_expends, operating_expends):
+        revenue = float(sale_total["amount"] or 0)
+        profit = float(sale_total["profit"] or 0) - float(operating_expend or 0)
+        expend = float(purchase_expend or 0) + float(operating_expend or 0)
+        result.append({"revenue": revenue, "profit": profit, "expend": expend})
+    return result
 
-def _get_sale_profit_by_date(start_date, end_date):
+# 多范围统计的独立线程方法
+def _query_by_ranges(repo_class, method_name: str, ranges, default):
     max_retries = 3
     retry_delay = 0.5
     
     for attempt in range(max_retries):
         db = SessionLocal()
-        repo = SaleStatementRepository(db)
+        repo = repo_class(db)
         try:
-            return repo.get_total_profit_by_date(start_date, end_date)
+            return getattr(repo, method_name)(ranges)
         except Exception as e:
             if attempt < max_retries - 1:
                 time.sleep(retry_delay)
                 continue
             else:
-                # 最终失败返回默认值
-                return Decimal("0.00")
-        finally:
-            db.close()
-
-def _get_purchase_expend_by_date(start_date, end_date):
-    max_retries = 3
-    retry_delay = 0.5
-    
-    for attempt in range(max_retries):
-        db = SessionLocal()
-        repo = PurchaseStatementRepository(db)
-        try:
-            return repo.get_total_statement_amount_by_date(start_date, end_date)
-        except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-                continue
-            else:
-                # 最终失败返回默认值
-                return Decimal("0.00")
-        finally:
-            db.close()
-
-def _get_operating_expend_by_date(start_date, end_date):
-    max_retries = 3
-    retry_delay = 0.5
-    
-    for attempt in range(max_retries):
-        db = SessionLocal()
-        repo = OperatingExpenseRepository(db)
-        try:
-            return repo.get_total_amount_by_date(start_date, end_date)
-        except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep(retry_delay)
-                continue
-            else:
-                # 最终失败返回默认值
-                return Decimal("0.00")
+                # 最终失败返回默认值，并标记本次结果不可缓存
+                fallbacks = _home_fallbacks.get()
+                if fallbacks is not None:
+                    fallbacks.append(method_name)
+                return default
         finally:
             db.close()
 
@@ -419,21 +437,31 @@ async def _get_trend_chart_data_by_range(
 ) -> Dict[str, List]:
     """
     获取趋势图数据
-    - custom类型：按月份聚合营收/支出数据
+    - custom类型：按月份聚合营收/支出数据（读取每日经营指标汇总表，销售/采购按对账单结束日期归属月份，未结束的对账单视为本日）
     """
     # 按月份聚合获取趋势数据，独立线程执行
     def _get_monthly_data():
         db = SessionLocal()
-        repo = SaleStatementRepository(db)
+        repo = DailyMetricsRepository(db)
         try:
-            return repo.get_monthly_revenue_expend(current_start, current_end)
+            return repo.sum_by_month(current_start.date(), current_end.date())
         finally:
             db.close()
-    monthly_data = await asyncio.to_thread(_get_monthly_data)
+    month_totals = await asyncio.to_thread(_get_monthly_data) or {}
     
-    # 确保monthly_data是列表
-    if not isinstance(monthly_data, list):
-        monthly_data = []
+    # 补齐范围内没有数据的月份
+    monthly_data = []
+    current_month = datetime(current_start.year, current_start.month, 1)
+    end_month = datetime(current_end.year, current_end.month, 1)
+    while current_month <= end_month:
+        month_str = current_month.strftime("%Y-%m")
+        totals = month_totals.get(month_str, {})
+        monthly_data.append({
+            "month": month_str,
+            "revenue": totals.get("revenue", 0),
+            "expend": totals.get("expend", 0)
+        })
+        current_month += relativedelta(months=1)
     
     x_axis = [d["month"] for d in monthly_data]
     revenue = [float(d["revenue"]) for d in monthly_data]
@@ -466,4 +494,30 @@ def _format_pie_data(data_list: List[Dict]) -> List[Dict[str, Any]]:
             "proportion": round(item["value"] / total * 100, 2)
         }
         for item in data_list
-    ]
\ No newline at end of file
+    ]
+
+
+# ==================== 每日经营指标汇总 ====================
+async def rebuild_daily_metrics() -> Dict[str, Any]:
+    """
+    从销售、采购、运营杂费记录重建每日经营指标汇总表
+    - 汇总表平时随写入及成本重算同步维护，数据被外部修改或表损坏时用于修复
+    """
+    db = SessionLocal()
+    try:
+        count = DailyMetricsRepository(db).rebuild()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return {"row_count": count}
+
+
+def init_daily_metrics(db) -> None:
+    """启动时为已有数据补建每日经营指标（汇总表为空时全量重建）"""
+    metrics_repo = DailyMetricsRepository(db)
+    if metrics_repo.count() == 0:
+        metrics_repo.rebuild()
+        db.commit()
@@ -1,12 +1,21 @@
 from typing import Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from app.database import get_db
 from app.repositories.goods_repo import GoodsRepository
 from app.repositories.inventory_flow_repo import InventoryFlowRepository
+from app.repositories.goods_stats_repo import GoodsStatsRepository
+from app.repositories.goods_catalog import goods_catalog
 from app.repositories.inventory_loss_repo import InventoryLossRepository
+from app.repositories.data_version import VersionedCache
+from app.services.cost_recalc_service import get_pending_goods_ids, get_state_as_of, get_states_as_of
 # 导入项目统一自定义异常（和其他服务层路径完全一致）
-from app.utils.exceptions import CustomAPIException, NotFoundException
+from app.utils.exceptions import CustomAPIException, NotFoundException, ParamErrorException
+from app.utils.cursor_utils import encode_cursor, decode_cursor
+
+
+# 各商品变动记录总数（按商品ID缓存，库存流水表被写入后失效）
+_flow_total_cache = VersionedCache(("t_inventory_flow",), max_entries=1024)
 
 
 # ==================== 库存信息查询 ====================
@@ -25,6 +34,7 @@ async def list_inventory(
     - 支持库存数量范围筛选
     - 支持字段排序（inventory_num/inventory_value）
     - 返回最后采购/销售日期（需关联采购/销售记录）
+    - 返回成本是否待后台重算（cost_pending）
     """
     # 处理排序字段映射（驼峰转下划线）
     sort_mapping = {
@@ -58,11 +68,16 @@ async def list_inventory(
         limit=page_size
     )
 
-    # 补充最后采购/销售日期
+    # 成本尚待后台重算的商品
+    goods_ids = [item["id"] for item in list_data]
+    pending_ids = get_pending_goods_ids(db, goods_ids)
+
+    # 补充最后采购/销售日期（读取商品统计表，不扫描采购/销售记录）
+    stats = GoodsStatsRepository(db).get_by_goods_ids(goods_ids)
     enriched_list = []
     for item in list_data:
-        last_purchase = goods_repo.get_last_purchase_date(item["id"])
-        last_sale = goods_repo.get_last_sale_date(item["id"])
+        last_purchase = stats[item["id"]]["last_purchase_date"]
+        last_sale = stats[item["id"]]["last_sale_date"]
 
         enriched_list.append({
             "product_name": item["goods_name"],
@@ -71,7 +86,8 @@ async def list_inventory(
             "inventory_cost": float(item["stock_unit_cost"]),
             "inventory_value": float(item["stock_total_value"]),
             "last_purchase_date": last_purchase.strftime("%Y-%m-%d") if last_purchase else None,
-            "last_sale_date": last_sale.strftime("%Y-%m-%d") if last_sale else None
+            "last_sale_date": last_sale.strftime("%Y-%m-%d") if last_sale else None,
+            "cost_pending": item["id"] in pending_ids
         })
 
     return {
@@ -85,12 +101,17 @@ async def get_inventory_detail(
     product: str,
     product_spec: int,
     page_num: int,
-    page_size: int
+    page_size: int,
+    cursor: Optional[str] = None,
+    with_total: bool = True
 ) -> Dict[str, Any]:
     """
     5.1.2 单个商品库存详情
     - 查询商品当前库存信息
     - 查询库存变动记录（采购入库/销售出库）
+    - 变动记录支持游标分页：传入上一页返回的 next_cursor 取下一页（不使用 OFFSET，深翻页不变慢）；
+      不传游标时按 page_num 分页（第一页同样走键集查询）
+    - with_total 为 False 时不统计总数（total、pages 返回 None）；总数按商品缓存，流水未变时翻页不重复计数
     """
     db = next(get_db())
     goods_repo = GoodsRepository(db)
@@ -101,19 +122,54 @@ async def get_inventory_detail(
     if not goods or goods.get("is_deleted"):
         raise NotFoundException(message="商品不存在")
 
-    # 统计变动记录总数
-    total = inventory_flow_repo.count_by_goods_and_date(
-        goods_id=goods["id"]
-    )
-
-    pages = (total + page_size - 1) // page_size if total > 0 else 0
+    # 统计变动记录总数（可选）
+    total = None
+    pages = None
+    if with_total:
+        versions = _flow_total_cache.versions()
+        total = _flow_total_cache.get(goods["id"], versions)
+        if total is None:
+            total = inventory_flow_repo.count_by_goods_and_date(
+                goods_id=goods["id"]
+            )
+            _flow_total_cache.put(goods["id"], versions, total)
+        pages = (total + page_size - 1) // page_size if total > 0 else 0
 
     # 查询变动记录
-    flow_list = inventory_flow_repo.list_by_goods_and_date(
-        goods_id=goods["id"],
-        offset=(page_num - 1) * page_size,
-        limit=page_size
-    )
+    if cursor or page_num <= 1:
+        before = None
+        if cursor:
+            position = decode_cursor(cursor)
+            if position.get("goods_id") != goods["id"]:
+                raise ParamErrorException(message="分页游标与商品不匹配")
+            try:
+                before = (datetime.fromisoformat(position["oper_time"]), int(position["id"]))
+            except (KeyError, TypeError, ValueError):
+                raise ParamErrorException(message="分页游标无效")
+        flow_list, has_more = inventory_flow_repo.list_by_goods_keyset(
+            goods_id=goods["id"],
+            before=before,
+            limit=page_size
+        )
+    else:
+        # 兼容按页码跳页
+        flow_list = inventory_flow_repo.list_by_goods_and_date(
+            goods_id=goods["id"],
+            offset=(page_num - 1) * page_size,
+            limit=page_size
+        )
+        has_more = page_num * page_size < total if total is not None else len(flow_list) == page_size
+
+    next_cursor = None
+    if has_more and flow_list:
+        last = flow_list[-1]
+        next_cursor = encode_cursor({
+            "goods_id": goods["id"],
+            "oper_time": last["oper_time"].isoformat(),
+            "id": last["id"]
+        })
+
+    stats = GoodsStatsRepository(db).get_by_goods_ids([goods["id"]])[goods["id"]]
 
     # 格式化变动记录
     formatted_flow = []
@@ -138,17 +194,171 @@ async def get_inventory_detail(
             "inventory_num": int(goods["current_stock_num"]),
             "inventory_cost": float(goods["stock_unit_cost"]),
             "inventory_value": float(goods["stock_total_value"]),
-            "total_purchase_num": goods_repo.get_total_purchase_num(goods["id"]),
-            "total_sale_num": goods_repo.get_total_sale_num(goods["id"])
+            "total_purchase_num": stats["total_purchase_num"],
+            "total_sale_num": stats["total_sale_num"],
+            "total_loss_num": stats["total_loss_num"],
+            "cost_pending": goods["id"] in get_pending_goods_ids(db, [goods["id"]])
         },
         "change_record": {
             "total": total,
             "pages": pages,
-            "list": formatted_flow
+            "list": formatted_flow,
+            "next_cursor": next_cursor
         }
     }
 
 
+def _parse_as_of_date(as_of_date: str):
+    try:
+        return datetime.strptime(as_of_date, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        raise ParamErrorException(message="查询日期格式错误，要求%Y-%m-%d")
+
+
+async def get_inventory_as_of(product: str, product_spec: int, as_of_date: str) -> Dict[str, Any]:
+    """
+    5.1.3 单个商品指定日期的库存与估值
+    - 返回该日日终的库存数量、加权平均单位成本和库存价值
+    - 从最近的成本检查点开始只回放少量记录，不回放全部历史
+    - 同时返回库存流水截至该日的结存，便于核对
+    """
+    as_of = _parse_as_of_date(as_of_date)
+
+    db = next(get_db())
+    goods_repo = GoodsRepository(db)
+
+    goods = goods_repo.get_by_name_and_spec(product, product_spec)
+    if not goods or goods.get("is_deleted"):
+        raise NotFoundException(message="商品不存在")
+
+    state, checkpoint_date, replayed_count = get_state_as_of(
+        db, goods["id"], float(goods["product_spec"]), as_of
+    )
+    flow_stock, last_change_time = InventoryFlowRepository(db).get_balance_before(
+        goods["id"], datetime.combine(as_of + timedelta(days=1), datetime.min.time())
+    )
+
+    return {
+        "product_name": goods["goods_name"],
+        "product_spec": goods["product_spec"],
+        "as_of_date": as_of.strftime("%Y-%m-%d"),
+        "inventory_num": state.stock,
+        "inventory_cost": round(state.cost, 2),
+        "inventory_value": round(state.total_value, 2),
+        "flow_inventory_num": flow_stock,
+        "last_change_date": last_change_time.strftime("%Y-%m-%d %H:%M:%S") if last_change_time else None,
+        "checkpoint_date": checkpoint_date.strftime("%Y-%m-%d") if checkpoint_date else None,
+        "replayed_count": replayed_count
+    }
+
+
+def _valuation_rows(db, goods_list, as_of, goods_ids=None) -> list:
+    """按商品列表顺序组装估值行；goods_ids 为 None 时一次计算全部商品"""
+    states = get_states_as_of(db, as_of, goods_ids)
+    flow_stocks = InventoryFlowRepository(db).sum_by_goods_before(
+        datetime.combine(as_of + timedelta(days=1), datetime.min.time()), goods_ids
+    )
+    rows = []
+    for item in goods_list:
+        state = states.get(item["id"])
+        if state is None:
+            continue
+        rows.append({
+            "product_name": item["goods_name"],
+            "product_spec": item["product_spec"],
+            "inventory_num": state.stock,
+            "inventory_cost": round(state.cost, 2),
+            "inventory_value": round(state.total_value, 2),
+            "flow_inventory_num": flow_stocks.get(item["id"], 0)
+        })
+    return rows
+
+
+async def get_inventory_valuation(
+    product: Optional[str],
+    as_of_date: str,
+    page_num: int,
+    page_size: int
+) -> Dict[str, Any]:
+    """
+    5.1.4 全部商品指定日期的库存估值（分页）
+    - 每个商品的日终库存数量、加权平均单位成本和库存价值
+    - 一页商品的检查点、记录回放和流水结存各只查询一次，不逐个商品查询
+    """
+    as_of = _parse_as_of_date(as_of_date)
+
+    db = next(get_db())
+    goods_repo = GoodsRepository(db)
+
+    total = goods_repo.count_by_inventory_conditions(name=product, min_num=None, max_num=None)
+    pages = (total + page_size - 1) // page_size if total > 0 else 0
+
+    goods_list = goods_repo.list_by_inventory_conditions(
+        name=product,
+        min_num=None,
+        max_num=None,
+        sort_field="id",
+        sort_order="asc",
+        offset=(page_num - 1) * page_size,
+        limit=page_size
+    )
+
+    return {
+        "total": total,
+        "pages": pages,
+        "list": _valuation_rows(db, goods_list, as_of, [item["id"] for item in goods_list]) if goods_list else []
+    }
+
+
+async def export_inventory_valuation(product: Optional[str], as_of_date: str) -> Dict[str, Any]:
+    """
+    导出全部商品指定日期的库存估值（xlsx）
+    - 全部商品一次计算，末行为合计
+    """
+    from io import BytesIO
+    from openpyxl import Workbook
+
+    as_of = _parse_as_of_date(as_of_date)
+
+    db = next(get_db())
+    goods_repo = GoodsRepository(db)
+
+    total = goods_repo.count_by_inventory_conditions(name=product, min_num=None, max_num=None)
+    goods_list = goods_repo.list_by_inventory_conditions(
+        name=product,
+        min_num=None,
+        max_num=None,
+        sort_field="id",
+        sort_order="asc",
+        offset=0,
+        limit=total
+    )
+    rows = _valuation_rows(db, goods_list, as_of, None if not product else [item["id"] for item in goods_list])
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("库存估值")
+    sheet.append([f"库存估值表（{as_of.strftime('%Y-%m-%d')} 日终）"])
+    sheet.append(["商品名称", "规格", "库存数量", "单位成本", "库存价值", "流水结存"])
+    for row in rows:
+        sheet.append([
+            row["product_name"], row["product_spec"], row["inventory_num"],
+            row["inventory_cost"], row["inventory_value"], row["flow_inventory_num"]
+        ])
+    sheet.append([
+        "合计", None,
+        sum(row["inventory_num"] for row in rows), None,
+        round(sum(row["inventory_value"] for row in rows), 2),
+        sum(row["flow_inventory_num"] for row in rows)
+    ])
+
+    output = BytesIO()
+    workbook.save(output)
+    return {
+        "xlsx_bytes": output.getvalue(),
+        "filename": f"库存估值_{as_of.strftime('%Y%m%d')}_{datetime.now().strftime('%Y%m%d%H%M%S')}.xlsx"
+    }
+
+
 # ==================== 库存报损 ====================
 async def add_inventory_loss(data) -> Dict[str, Any]:
     """
@@ -227,12 +437,13 @@ async def add_inventory_loss(data) -> Dict[str, Any]:
         "oper_source": f"报损-{loss_reason}"
     })
 
+    # 登记成本重算任务（随本事务提交，由后台任务从报损日期开始回放）
+    from app.services.cost_recalc_service import enqueue_cost_recalc
+    enqueue_cost_recalc(db, goods["id"], loss_date)
+    GoodsStatsRepository(db).add_loss(goods["id"], loss_num)
+
     db.commit()
     
-    # 触发成本重算
-    from app.services.cost_recalc_service import recalculate_cost_for_goods
-    await recalculate_cost_for_goods(goods["id"])
-    
     return {
         "id": loss_id,
         "loss_cost": total_cost
@@ -341,14 +552,16 @@ async def delete_inventory_loss(id: int) -> None:
     new_cost = goods["stock_unit_cost"]
     goods_repo.update_stock_and_cost(goods_id, new_stock, new_cost,new_value)
 
-    # 软删除报损记录
+    # 软删除报损记录，并删除对应的库存流动记录（结存按流水累计，必须同步删除）
     inventory_loss_repo.soft_delete(id)
+    InventoryFlowRepository(db).delete_by_biz(3, id)
+    
+    # 登记成本重算任务
+    from app.services.cost_recalc_service import enqueue_cost_recalc
+    enqueue_cost_recalc(db, goods_id, loss["loss_date"])
+    GoodsStatsRepository(db).remove_loss(goods_id, loss_num)
 
     db.commit()
-    
-    # 触发成本重算
-    from app.services.cost_recalc_service import recalculate_cost_for_goods
-    await recalculate_cost_for_goods(goods_id)
 
 
 # ==================== 库存预警/盘点 ====================
@@ -362,37 +575,68 @@ async def list_inventory_warning(
     - 查询库存数量 <= warning_line 的商品
     - 返回最后采购日期
     - 返回主要供货商（可选，从最后采购记录获取）
+    - 总数、分页数据、最后采购信息和重算状态由一条查询返回
     """
     db = next(get_db())
     goods_repo = GoodsRepository(db)
 
-    # 统计总数
-    total = goods_repo.count_by_warning_line(warning_line)
-    pages = (total + page_size - 1) // page_size if total > 0 else 0
-
-    # 查询列表
-    list_data = goods_repo.list_by_warning_line(
+    # 总数与当前页一条查询返回
+    total, list_data = goods_repo.page_by_warning_line(
         warning_line=warning_line,
         offset=(page_num - 1) * page_size,
         limit=page_size
     )
+    pages = (total + page_size - 1) // page_size if total > 0 else 0
 
     formatted_list = []
     for item in list_data:
-        # 获取最后采购信息
-        last_purchase = goods_repo.get_last_purchase_info(item["id"])
-
         formatted_list.append({
             "product_name": item["goods_name"],
             "product_spec": item["product_spec"],
             "inventory_num": int(item["current_stock_num"]),
             "warning_line": warning_line,
-            "last_purchase_date": last_purchase["purchase_date"] if last_purchase else None,
-            "supplier_name": last_purchase["supplier_name"] if last_purchase else None
+            "last_purchase_date": item["last_purchase_date"].strftime("%Y-%m-%d") if item["last_purchase_date"] else None,
+            "supplier_name": item["supplier_name"],
+            "cost_pending": item["cost_pending"]
         })
 
     return {
         "total": total,
         "pages": pages,
         "list": formatted_list
-    }
\ No newline at end of file
+    }
+
+
+# ==================== 商品统计 ====================
+async def rebuild_goods_stats() -> Dict[str, Any]:
+    """
+    5.4.1 从采购、销售、报损记录重建全部商品的统计
+    - 统计表平时随写入同步维护，数据被外部修改或表损坏时用于修复
+    """
+    db = next(get_db())
+    try:
+        count = GoodsStatsRepository(db).refresh()
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return {"goods_count": count}
+
+
+def init_goods_stats(db) -> None:
+    """启动时为已有数据补建商品统计（统计表为空且已有商品时全量重建）"""
+    stats_repo = GoodsStatsRepository(db)
+    if stats_repo.count() == 0 and GoodsRepository(db).count_by_inventory_conditions(name=None, min_num=None, max_num=None) > 0:
+        stats_repo.refresh()
+        db.commit()
+
+
+def init_inventory_flow_balances(db) -> None:
+    """启动时为流水累计与当前库存不一致的商品补建期初库存流水（结存按流水累计，兼容已有数据）"""
+    if InventoryFlowRepository(db).insert_opening_balances():
+        db.commit()
+
+
+def get_goods_catalog_status() -> Dict[str, Any]:
+    """5.4.2 商品目录缓存状态（条目数、版本号、命中/未命中次数）"""
+    return goods_catalog.stats()
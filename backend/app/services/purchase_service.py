@@ -7,6 +7,9 @@ from app.repositories.purchase_payment_repo import PurchasePaymentRepository
 from app.repositories.goods_repo import GoodsRepository
 from app.repositories.supplier_repo import SupplierRepository
 from app.repositories.inventory_flow_repo import InventoryFlowRepository
+from app.repositories.goods_stats_repo import GoodsStatsRepository
+from app.repositories.daily_metrics_repo import DailyMetricsRepository
+from app.repositories import name_autocomplete
 from app.database import get_db
 # 导入项目统一自定义异常（和其他服务层路径完全一致）
 from app.utils.exceptions import CustomAPIException, NotFoundException, ParamErrorException
@@ -144,12 +147,16 @@ async def add_purchase(data) -> Dict[str, Any]:
             "oper_source": f"采购-{supplier_name}"
         })
 
+        # 登记成本重算任务（随本事务提交，由后台任务从采购日期开始回放）
+        from app.services.cost_recalc_service import enqueue_cost_recalc
+        enqueue_cost_recalc(db, goods_id, purchase_date)
+        GoodsStatsRepository(db).add_purchase(goods_id, purchase_num, purchase_date, supplier_id)
+        DailyMetricsRepository(db).refresh_statements(purchase_statement_ids=[latest_statement["id"]], goods_ids=[goods_id])
+        name_autocomplete.stage_use(db, "goods", product_name, purchase_date)
+        name_autocomplete.stage_use(db, "supplier", supplier_name, purchase_date)
+
         db.commit()
         
-        # 触发成本重算
-        from app.services.cost_recalc_service import recalculate_cost_for_goods
-        await recalculate_cost_for_goods(goods_id)
-        
         return {
             "id": purchase_id,
             "total_price": total_price
@@ -438,16 +445,19 @@ async def update_purchase(data) -> None:
         
         # 更新新对账单
         await _ensure_purchase_statement(db, statement_repo, new_supplier_id, new_num * new_price)
+        
+        # 登记成本重算任务：旧商品从原日期、新商品从新日期开始回放（同一商品自动合并取较早日期）
+        from app.services.cost_recalc_service import enqueue_cost_recalc
+        enqueue_cost_recalc(db, old_goods_id, old_purchase_date)
+        enqueue_cost_recalc(db, new_goods_id, new_date)
+        GoodsStatsRepository(db).update_purchase(
+            old_goods_id, old_num, old_purchase_date,
+            new_goods_id, new_num, new_date, new_supplier_id
+        )
+        DailyMetricsRepository(db).refresh_statements(purchase_statement_ids=[old_record["statement_id"]], goods_ids=[old_goods_id, new_goods_id])
 
         db.commit()
         
-        # 触发成本重算
-        from app.services.cost_recalc_service import recalculate_cost_for_goods
-        # 如果商品变更了，需要重算旧商品和新商品
-        if old_goods_id != new_goods_id:
-            await recalculate_cost_for_goods(old_goods_id)
-        await recalculate_cost_for_goods(new_goods_id)
-        
     except Exception as e:
         db.rollback()
         raise
@@ -538,13 +548,15 @@ async def delete_purchase(id: int) -> None:
         
         # 删除流动记录
         inventory_flow_repo.delete_by_biz(1, id)
+        
+        # 登记成本重算任务
+        from app.services.cost_recalc_service import enqueue_cost_recalc
+        enqueue_cost_recalc(db, goods_id, purchase_date)
+        GoodsStatsRepository(db).remove_purchase(goods_id, num, purchase_date)
+        DailyMetricsRepository(db).refresh_statements(purchase_statement_ids=[record["statement_id"]], goods_ids=[goods_id])
 
         db.commit()
         
-        # 触发成本重算
-        from app.services.cost_recalc_service import recalculate_cost_for_goods
-        await recalculate_cost_for_goods(goods_id)
-        
     except Exception as e:
         db.rollback()
         raise
@@ -555,9 +567,14 @@ async def delete_purchase(id: int) -> None:
 async def select_purchase_products(keyword: Optional[str], limit: int = 5) -> List[str]:
     """
     3.1.5 采购商品下拉联想
-    - 从商品表联想（所有商品，不限库存）
+    - 从商品表联想（所有商品，不限库存），支持拼音全拼/首字母，按最近使用排序
     - 只返回不重复的商品名称
     """
+    names = name_autocomplete.search_goods_names(keyword, limit)
+    if names is not None:
+        return names
+    
+    # 联想索引未加载时查询数据库
     from app.database import SessionLocal
     db = SessionLocal()
     
@@ -8,6 +8,9 @@ from app.repositories.sale_receipt_repo import SaleReceiptRepository
 from app.repositories.goods_repo import GoodsRepository
 from app.repositories.purchaser_repo import PurchaserRepository
 from app.repositories.inventory_flow_repo import InventoryFlowRepository
+from app.repositories.goods_stats_repo import GoodsStatsRepository
+from app.repositories.daily_metrics_repo import DailyMetricsRepository
+from app.repositories import name_autocomplete
 from app.database import get_db
 
 from app.utils.exceptions import CustomAPIException, NotFoundException, ParamErrorException
@@ -151,11 +154,15 @@ async def add_sale(data) -> Dict[str, Any]:
         "oper_source": f"销售-{purchaser_name}"
     })
 
-    db.commit()
+    # 9. 登记成本重算任务（随本事务提交，由后台任务从销售日期开始回放）
+    from app.services.cost_recalc_service import enqueue_cost_recalc
+    enqueue_cost_recalc(db, goods_id, sale_date)
+    GoodsStatsRepository(db).add_sale(goods_id, sale_num, sale_date)
+    DailyMetricsRepository(db).refresh_statements(sale_statement_ids=[latest_statement["id"]], goods_ids=[goods_id])
+    name_autocomplete.stage_use(db, "goods", product_name, sale_date)
+    name_autocomplete.stage_use(db, "purchaser", purchaser_name, sale_date)
 
-    # 9. 触发成本重算
-    from app.services.cost_recalc_service import recalculate_cost_for_goods
-    await recalculate_cost_for_goods(goods_id)
+    db.commit()
 
     return {
         "id": sale_id,
@@ -417,14 +424,14 @@ async def update_sale(data) -> None:
 
     # 9. 更新新对账单
     await _ensure_sale_statement(db, new_purchaser_id, new_total, new_total_profit, new_total_cost)
-    db.commit()
 
-    # 10. 触发成本重算
-    from app.services.cost_recalc_service import recalculate_cost_for_goods
-    # 如果商品变更了，需要重算旧商品和新商品
-    if old_goods_id != new_goods_id:
-        await recalculate_cost_for_goods(old_goods_id)
-    await recalculate_cost_for_goods(new_goods_id)
+    # 10. 登记成本重算任务：旧商品从原日期、新商品从新日期开始回放（同一商品自动合并取较早日期）
+    from app.services.cost_recalc_service import enqueue_cost_recalc
+    enqueue_cost_recalc(db, old_goods_id, old_sale_date)
+    enqueue_cost_recalc(db, new_goods_id, new_date)
+    GoodsStatsRepository(db).update_sale(old_goods_id, old_num, old_sale_date, new_goods_id, new_num, new_date)
+    DailyMetricsRepository(db).refresh_statements(sale_statement_ids=[old["statement_id"]], goods_ids=[old_goods_id, new_goods_id])
+    db.commit()
 
 
 async def delete_sale(id: int) -> None:
@@ -491,11 +498,13 @@ async def delete_sale(id: int) -> None:
 
     # 删除流动记录
     repo.inventory_flow.delete_by_biz(2, id)
-    db.commit()
 
-    # 触发成本重算
-    from app.services.cost_recalc_service import recalculate_cost_for_goods
-    await recalculate_cost_for_goods(goods_id)
+    # 登记成本重算任务
+    from app.services.cost_recalc_service import enqueue_cost_recalc
+    enqueue_cost_recalc(db, goods_id, sale_date)
+    GoodsStatsRepository(db).remove_sale(goods_id, num, sale_date)
+    DailyMetricsRepository(db).refresh_statements(sale_statement_ids=[record["statement_id"]], goods_ids=[goods_id])
+    db.commit()
 
 
 async def select_sale_products(keyword: Optional[str], limit: int = 5) -> List[str]:
@@ -503,10 +512,25 @@ async def select_sale_products(keyword: Optional[str], limit: int = 5) -> List[s
     4.1.5 销售商品下拉联想
     - 只显示有库存的商品（current_stock_num > 0）
     - 只返回不重复的商品名称
+    - 名称匹配走内存联想索引（支持拼音全拼/首字母，按最近使用排序），
+      库存实时变化不缓存，按排序分批查询候选名称的库存，凑满 limit 即停
     """
     db = next(get_db())
     repo = _get_repositories(db)
-    return repo.goods.select_by_keyword_with_stock(keyword, limit=limit)
+    ranked = name_autocomplete.search_goods_names(keyword)
+    if ranked is None:
+        # 联想索引未加载时查询数据库
+        return repo.goods.select_by_keyword_with_stock(keyword, limit=limit)
+
+    result = []
+    batch_size = max(limit * 4, 50)
+    for start in range(0, len(ranked), batch_size):
+        batch = ranked[start:start + batch_size]
+        in_stock = repo.goods.filter_names_with_stock(batch)
+        result.extend(name for name in batch if name in in_stock)
+        if len(result) >= limit:
+            break
+    return result[:limit]
 
 
 async def get_last_sale_record(purchaser_name: str, product_name: str) -> Optional[Dict[str, Any]]:
@@ -0,0 +1,47 @@
+"""
+分页游标工具模块
+
+该模块提供键集（keyset）分页游标的编码与解码。游标对调用方是不透明的字符串，
+内容为 URL 安全的 base64 编码 JSON，只应原样回传。
+"""
+
+import base64
+import binascii
+import json
+from typing import Any, Dict
+
+from app.utils.exceptions import ParamErrorException
+
+
+def encode_cursor(data: Dict[str, Any]) -> str:
+    """
+    将游标内容编码为不透明字符串
+
+    Args:
+        data (Dict[str, Any]): 游标内容（须可 JSON 序列化）
+
+    Returns:
+        str: 游标字符串
+    """
+    raw = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    解码游标字符串，格式不正确时抛出参数错误
+
+    Args:
+        cursor (str): encode_cursor 生成的游标
+
+    Returns:
+        Dict[str, Any]: 游标内容
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw.decode("utf-8"))
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise ParamErrorException(message="分页游标无效")
+    if not isinstance(data, dict):
+        raise ParamErrorException(message="分页游标无效")
+    return data
@@ -0,0 +1,8 @@
+"""
+成本重算基准测试
+
+- generator：确定性的合成台账生成器
+- scenarios：单条记录重算、全量重建、追溯录入等基准场景
+
+用法见 benchmarks/__main__.py（python -m benchmarks --help）。
+"""
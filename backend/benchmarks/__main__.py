@@ -0,0 +1,150 @@
+"""
+成本重算基准测试入口
+
+在 backend 目录下运行：
+
+    python -m benchmarks --goods 1000 --events 10000 --output bench.json
+
+每次运行都在临时目录中新建数据库（通过 DB_NAME 环境变量和工作目录指定，
+必须在导入 app 之前设置），不会触碰开发数据库。结果以 JSON 输出，便于对比不同版本。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="成本重算基准测试")
+    parser.add_argument("--goods", type=int, default=1000, help="商品数")
+    parser.add_argument("--events", type=int, default=10000, help="采购、销售、报损记录总数")
+    parser.add_argument("--suppliers", type=int, default=10, help="供货商数")
+    parser.add_argument("--purchasers", type=int, default=20, help="采购商数")
+    parser.add_argument("--days", type=int, default=730, help="业务跨越的天数")
+    parser.add_argument("--statement-days", type=int, default=30, help="对账周期天数")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--scenarios", default="all",
+                        help="逗号分隔的场景名，可选：full_rebuild, full_rebuild_parallel, "
+                             "single_event_recalc, backdated_recalc, backdated_insert")
+    parser.add_argument("--samples", type=int, default=20, help="增量场景的采样次数")
+    parser.add_argument("--rebuild-repeat", type=int, default=1, help="全量重建场景的重复次数")
+    parser.add_argument("--workers", type=int, default=None, help="并行重建的进程数")
+    parser.add_argument("--depth", type=float, default=0.1, help="追溯重算的起始位置（占业务跨度的比例）")
+    parser.add_argument("--output", default=None, help="结果文件路径，默认输出到标准输出")
+    parser.add_argument("--keep-db", action="store_true", help="保留生成的数据库并输出其路径")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    output = Path(args.output).resolve() if args.output else None
+    
+    # 必须在导入 app 之前切换工作目录并设置数据库名
+    work_dir = tempfile.mkdtemp(prefix="easy_stock_bench_")
+    backend_dir = str(Path(__file__).resolve().parent.parent)
+    if backend_dir not in sys.path:
+        sys.path.insert(0, backend_dir)
+    os.chdir(work_dir)
+    os.environ["DB_NAME"] = "bench"
+    
+    import app.models  # noqa: F401  注册全部模型
+    from app.database import Base, engine, SessionLocal
+    from benchmarks.generator import generate_ledger
+    from benchmarks.scenarios import SCENARIOS, run_scenarios
+    
+    names = list(SCENARIOS) if args.scenarios == "all" else [name.strip() for name in args.scenarios.split(",")]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"未知场景: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        start = time.perf_counter()
+        ledger = generate_ledger(
+            db,
+            goods=args.goods,
+            events=args.events,
+            suppliers=args.suppliers,
+            purchasers=args.purchasers,
+            days=args.days,
+            statement_days=args.statement_days,
+            seed=args.seed
+        )
+        db.commit()
+        ledger["generate_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    finally:
+        db.close()
+    
+    results = asyncio.run(run_scenarios(
+        names,
+        samples=args.samples,
+        rebuild_repeat=args.rebuild_repeat,
+        workers=args.workers,
+        depth=args.depth
+    ))
+    
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    
+    report = {
+        "benchmark": "cost_recalc",
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "numpy": numpy_version,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "config": {
+            "goods": args.goods,
+            "events": args.events,
+            "suppliers": args.suppliers,
+            "purchasers": args.purchasers,
+            "days": args.days,
+            "statement_days": args.statement_days,
+            "seed": args.seed,
+            "samples": args.samples,
+            "rebuild_repeat": args.rebuild_repeat,
+            "workers": args.workers,
+            "depth": args.depth
+        },
+        "ledger": ledger,
+        "results": results
+    }
+    if args.keep_db:
+        report["database"] = str(Path(work_dir) / "bench.db")
+    else:
+        engine.dispose()
+        for suffix in ("", "-wal", "-shm"):
+            path = Path(work_dir) / f"bench.db{suffix}"
+            if path.exists():
+                path.unlink()
+        os.rmdir(work_dir)
+    
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if output:
+        output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    # 并行重建场景使用多进程
+    from multiprocessing import freeze_support
+    freeze_support()
+    sys.exit(main())
@@ -0,0 +1,294 @@
+"""
+合成台账生成器
+
+按给定规模确定性地生成供货商、采购商、商品，以及按日期交错的采购、销售、报损记录、
+库存流动记录和采购/销售对账单。同一组参数（含随机种子）总是生成完全相同的数据。
+
+成本快照、商品库存和对账单金额按与成本重算引擎相同的规则（CostState）逐条计算，
+生成后的数据即为"已重算"状态，全量重建不会产生差异写入。
+"""
+
+import itertools
+import random
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import insert
+
+from app.models.supplier import Supplier
+from app.models.purchaser import Purchaser
+from app.models.goods import Goods
+from app.models.purchase_info import PurchaseInfo
+from app.models.sale_info import SaleInfo
+from app.models.inventory_loss import InventoryLoss
+from app.models.inventory_flow import InventoryFlow
+from app.models.purchase_statement import PurchaseStatement
+from app.models.sale_statement import SaleStatement
+from app.services.cost_recalc_service import CostState, EVENT_TYPE_PRIORITY
+
+
+# 批量插入时每批的行数
+INSERT_CHUNK_SIZE = 5000
+
+# 可选的商品规格
+PRODUCT_SPECS = (1, 6, 12, 24)
+
+
+def _money(value: float) -> Decimal:
+    return Decimal(str(round(value, 2)))
+
+
+def _bulk_insert(db, model, rows: List[Dict[str, Any]]) -> None:
+    for i in range(0, len(rows), INSERT_CHUNK_SIZE):
+        db.execute(insert(model), rows[i:i + INSERT_CHUNK_SIZE])
+
+
+def _statement_periods(start_date: date, days: int, statement_days: int) -> List[Dict[str, Optional[date]]]:
+    """
+    按固定天数切分对账周期：第一期没有起始日期，最后一期未确认（没有结束日期）
+    """
+    periods = []
+    period_start = start_date
+    end = start_date + timedelta(days=days - 1)
+    while True:
+        period_end = period_start + timedelta(days=statement_days - 1)
+        if period_end >= end:
+            periods.append({"start_date": period_start if periods else None, "end_date": None, "from": period_start})
+            break
+        periods.append({"start_date": period_start if periods else None, "end_date": period_end, "from": period_start})
+        period_start = period_end + timedelta(days=1)
+    return periods
+
+
+def generate_ledger(db,
+                    goods: int = 1000,
+                    events: int = 10000,
+                    suppliers: int = 10,
+                    purchasers: int = 20,
+                    days: int = 730,
+                    statement_days: int = 30,
+                    loss_ratio: float = 0.03,
+                    start_date: date = date(2023, 1, 1),
+                    seed: int = 42) -> Dict[str, Any]:
+    """
+    生成合成台账并写入数据库（调用方负责建表和提交）
+    
+    记录按日期均匀分布；商品按长尾分布被选中（少数商品占大部分流水），
+    库存不足时优先采购，销售与报损不会使库存变为负数。
+    
+    Args:
+        db: 数据库会话
+        goods (int): 商品数
+        events (int): 采购、销售、报损记录总数
+        suppliers (int): 供货商数
+        purchasers (int): 采购商数
+        days (int): 业务跨越的天数
+        statement_days (int): 每个对账周期的天数
+        loss_ratio (float): 报损记录占比
+        start_date (date): 第一天
+        seed (int): 随机种子
+    
+    Returns:
+        Dict[str, Any]: 各类记录数及日期范围
+    """
+    rnd = random.Random(seed)
+    end_date = start_date + timedelta(days=days - 1)
+    
+    # 1. 基础资料
+    _bulk_insert(db, Supplier, [{"supplier_name": f"供货商{i:03d}"} for i in range(1, suppliers + 1)])
+    _bulk_insert(db, Purchaser, [{"purchaser_name": f"采购商{i:03d}"} for i in range(1, purchasers + 1)])
+    
+    goods_specs = [rnd.choice(PRODUCT_SPECS) for _ in range(goods)]
+    base_costs = [round(rnd.uniform(2, 200), 2) for _ in range(goods)]
+    # 长尾分布：排名靠前的商品被选中的概率更高
+    population = range(goods)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) ** 0.8 for rank in range(goods)))
+    
+    # 2. 对账周期（每个供货商/采购商各一套）
+    periods = _statement_periods(start_date, days, statement_days)
+    purchase_statement_ids = {}
+    sale_statement_ids = {}
+    statement_id = 0
+    for supplier_id in range(1, suppliers + 1):
+        for index in range(len(periods)):
+            statement_id += 1
+            purchase_statement_ids[(supplier_id, index)] = statement_id
+    statement_id = 0
+    for purchaser_id in range(1, purchasers + 1):
+        for index in range(len(periods)):
+            statement_id += 1
+            sale_statement_ids[(purchaser_id, index)] = statement_id
+    
+    # 3. 按日期生成记录，同一天内按采购、销售、报损的回放顺序计算成本快照
+    day_counts = [0] * days
+    for _ in range(events):
+        day_counts[rnd.randrange(days)] += 1
+    
+    states = [CostState() for _ in range(goods)]
+    purchases, sales, losses, flows = [], [], [], []
+    purchase_totals = {}
+    sale_totals = {}
+    for offset, count in enumerate(day_counts):
+        if not count:
+            continue
+        day = start_date + timedelta(days=offset)
+        oper_time = datetime(day.year, day.month, day.day)
+        # 对账周期等长（最后一期包含剩余天数），按天数直接定位
+        period = min(offset // statement_days, len(periods) - 1)
+        
+        # 当天的记录：库存不足的商品先采购
+        planned = []
+        planned_stock = {}
+        for _ in range(count):
+            index = rnd.choices(population, cum_weights=cum_weights)[0]
+            stock = planned_stock.get(index, states[index].stock)
+            roll = rnd.random()
+            if stock > 0 and roll < loss_ratio:
+                num = rnd.randint(1, min(stock, 5))
+                planned.append(("loss", index, num))
+                planned_stock[index] = stock - num
+            elif stock >= 10 and roll < 0.55 + loss_ratio:
+                num = rnd.randint(1, min(stock, 30))
+                planned.append(("sale", index, num))
+                planned_stock[index] = stock - num
+            else:
+                num = rnd.randint(10, 100)
+                planned.append(("purchase", index, num))
+                planned_stock[index] = stock + num
+        planned.sort(key=lambda item: EVENT_TYPE_PRIORITY[item[0]])
+        
+        for event_type, index, num in planned:
+            goods_id = index + 1
+            spec = goods_specs[index]
+            state = states[index]
+            stock_before = state.stock
+            
+            if event_type == "purchase":
+                supplier_id = rnd.randint(1, suppliers)
+                unit_price = _money(base_costs[index] * rnd.uniform(0.9, 1.1))
+                total_price = _money(float(unit_price) * spec * num)
+                state.apply_purchase(num, float(unit_price), float(total_price), spec)
+                statement = purchase_statement_ids[(supplier_id, period)]
+                purchase_totals[statement] = purchase_totals.get(statement, Decimal("0")) + total_price
+                purchases.append({
+                    "supplier_id": supplier_id,
+                    "goods_id": goods_id,
+                    "product_spec": str(spec),
+                    "purchase_num": num,
+                    "purchase_unit_price": unit_price,
+                    "purchase_total_price": total_price,
+                    "purchase_date": day,
+                    "statement_id": statement
+                })
+                biz_id, oper_type, change_num, source = len(purchases), 1, num, f"采购-供货商{supplier_id:03d}"
+            
+            elif event_type == "sale":
+                purchaser_id = rnd.randint(1, purchasers)
+                unit_price = _money(base_costs[index] * rnd.uniform(1.1, 1.4))
+                snapshot = state.apply_sale(num, float(unit_price), spec)
+                trade_unit_cost = _money(snapshot["unit_cost"])
+                total_profit = _money(snapshot["total_profit"])
+                total_price = _money(float(unit_price) * spec * num)
+                statement = sale_statement_ids[(purchaser_id, period)]
+                totals = sale_totals.setdefault(statement, [0.0, 0.0, 0.0])
+                totals[0] += float(total_price)
+                totals[1] += float(trade_unit_cost) * num * spec
+                totals[2] += float(total_profit)
+                sales.append({
+                    "purchaser_id": purchaser_id,
+                    "goods_id": goods_id,
+                    "product_spec": str(spec),
+                    "sale_num": num,
+                    "sale_unit_price": unit_price,
+                    "sale_total_price": total_price,
+                    "trade_unit_cost": trade_unit_cost,
+                    "unit_profit": _money(snapshot["unit_profit"]),
+                    "total_profit": total_profit,
+                    "sale_date": day,
+                    "statement_id": statement
+                })
+                biz_id, oper_type, change_num, source = len(sales), 2, -num, f"销售-采购商{purchaser_id:03d}"
+            
+            else:
+                snapshot = state.apply_loss(num, spec)
+                losses.append({
+                    "goods_id": goods_id,
+                    "loss_num": num,
+                    "loss_unit_cost": _money(snapshot["unit_cost"]),
+                    "loss_total_cost": _money(snapshot["total_cost"]),
+                    "loss_date": day,
+                    "loss_reason": "过期"
+                })
+                biz_id, oper_type, change_num, source = len(losses), 3, -num, "报损-过期"
+            
+            flows.append({
+                "goods_id": goods_id,
+                "oper_type": oper_type,
+                "biz_id": biz_id,
+                "change_num": change_num,
+                "stock_before": stock_before,
+                "stock_after": state.stock,
+                "oper_time": oper_time,
+                "oper_source": source
+            })
+    
+    # 4. 商品（含回放后的库存与成本）
+    _bulk_insert(db, Goods, [{
+        "goods_name": f"商品{index + 1:05d}",
+        "product_spec": goods_specs[index],
+        "current_stock_num": states[index].stock,
+        "stock_unit_cost": _money(states[index].cost),
+        "stock_total_value": _money(states[index].total_value)
+    } for index in range(goods)])
+    
+    # 5. 对账单（金额按所含记录汇总，未收/未付金额等于对账金额）
+    purchase_statements = []
+    for (supplier_id, index), statement_id in sorted(purchase_statement_ids.items(), key=lambda item: item[1]):
+        amount = purchase_totals.get(statement_id, Decimal("0.00"))
+        purchase_statements.append({
+            "supplier_id": supplier_id,
+            "start_date": periods[index]["start_date"],
+            "end_date": periods[index]["end_date"],
+            "statement_amount": amount,
+            "received_amount": Decimal("0.00"),
+            "unreceived_amount": amount,
+            "pay_status": amount <= 0
+        })
+    sale_statements = []
+    for (purchaser_id, index), statement_id in sorted(sale_statement_ids.items(), key=lambda item: item[1]):
+        amount, cost, profit = sale_totals.get(statement_id, (0.0, 0.0, 0.0))
+        sale_statements.append({
+            "purchaser_id": purchaser_id,
+            "start_date": periods[index]["start_date"],
+            "end_date": periods[index]["end_date"],
+            "statement_amount": _money(amount),
+            "total_cost": _money(cost),
+            "total_profit": _money(profit),
+            "received_amount": Decimal("0.00"),
+            "unreceived_amount": _money(amount),
+            "receive_status": amount <= 0
+        })
+    _bulk_insert(db, PurchaseStatement, purchase_statements)
+    _bulk_insert(db, SaleStatement, sale_statements)
+    
+    # 6. 业务记录
+    _bulk_insert(db, PurchaseInfo, purchases)
+    _bulk_insert(db, SaleInfo, sales)
+    _bulk_insert(db, InventoryLoss, losses)
+    _bulk_insert(db, InventoryFlow, flows)
+    db.flush()
+    
+    return {
+        "suppliers": suppliers,
+        "purchasers": purchasers,
+        "goods": goods,
+        "purchases": len(purchases),
+        "sales": len(sales),
+        "losses": len(losses),
+        "purchase_statements": len(purchase_statements),
+        "sale_statements": len(sale_statements),
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d"),
+        "open_statement_start": periods[-1]["from"].strftime("%Y-%m-%d")
+    }
@@ -0,0 +1,206 @@
+"""
+成本重算基准场景
+
+每个场景返回若干次计时（毫秒），由 summarize 汇总为统计值。
+场景会修改数据库（重算回写、插入记录），应在生成器创建的临时数据库上运行。
+"""
+
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import func
+
+from app.database import SessionLocal
+from app.models.goods import Goods
+from app.models.supplier import Supplier
+from app.models.purchase_info import PurchaseInfo
+from app.models.sale_info import SaleInfo
+from app.models.inventory_loss import InventoryLoss
+from app.models.cost_checkpoint import CostCheckpoint
+from app.repositories.cost_checkpoint_repo import CostCheckpointRepository
+from app.services import cost_recalc_service, cost_recalc_numpy
+
+
+# 全部场景（按默认运行顺序）
+SCENARIOS = ("full_rebuild", "full_rebuild_parallel", "single_event_recalc", "backdated_recalc", "backdated_insert")
+
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    """汇总计时样本（毫秒）"""
+    ordered = sorted(samples)
+    p95_index = max(0, int(round(len(ordered) * 0.95)) - 1)
+    return {
+        "runs": len(ordered),
+        "min_ms": round(ordered[0], 3),
+        "median_ms": round(statistics.median(ordered), 3),
+        "p95_ms": round(ordered[p95_index], 3),
+        "max_ms": round(ordered[-1], 3),
+        "mean_ms": round(statistics.fmean(ordered), 3)
+    }
+
+
+async def _timed(coro) -> float:
+    start = time.perf_counter()
+    await coro
+    return (time.perf_counter() - start) * 1000
+
+
+def _sample_goods(count: int, seed: int) -> List[Dict[str, Any]]:
+    """按流水量加权抽取商品（与真实修改的分布接近），返回商品ID、名称、规格及最后记录日期"""
+    db = SessionLocal()
+    try:
+        goods = db.query(Goods.id, Goods.goods_name, Goods.product_spec).filter(
+            Goods.is_deleted == False
+        ).order_by(Goods.id).all()
+        last_dates = {}
+        for model, date_column in ((PurchaseInfo, PurchaseInfo.purchase_date),
+                                   (SaleInfo, SaleInfo.sale_date),
+                                   (InventoryLoss, InventoryLoss.loss_date)):
+            for goods_id, last_date in db.query(model.goods_id, func.max(date_column)).group_by(model.goods_id):
+                if last_date and (goods_id not in last_dates or last_date > last_dates[goods_id]):
+                    last_dates[goods_id] = last_date
+    finally:
+        db.close()
+    
+    candidates = [row for row in goods if row[0] in last_dates]
+    rnd = random.Random(seed)
+    picked = rnd.choices(candidates, weights=[1 / (rank + 1) ** 0.8 for rank in range(len(candidates))], k=count)
+    return [{
+        "goods_id": goods_id,
+        "goods_name": goods_name,
+        "product_spec": product_spec,
+        "last_date": last_dates[goods_id]
+    } for goods_id, goods_name, product_spec in picked]
+
+
+def has_checkpoints() -> bool:
+    db = SessionLocal()
+    try:
+        return db.query(CostCheckpoint.id).first() is not None
+    finally:
+        db.close()
+
+
+async def _rebuild_sequential() -> None:
+    """单进程全量重建：清空检查点后逐个商品用向量化引擎回放并回写（各自提交）"""
+    db = SessionLocal()
+    try:
+        CostCheckpointRepository(db).delete_all()
+        db.commit()
+        goods_ids = [row[0] for row in db.query(Goods.id).filter(Goods.is_deleted == False).order_by(Goods.id)]
+    finally:
+        db.close()
+    for goods_id in goods_ids:
+        await cost_recalc_numpy.recalculate_cost_for_goods(goods_id)
+
+
+async def full_rebuild(repeat: int = 1) -> List[float]:
+    """全量重建（单进程，逐个商品、向量化引擎），作为并行重建的对照"""
+    return [await _timed(_rebuild_sequential()) for _ in range(repeat)]
+
+
+async def full_rebuild_parallel(repeat: int = 1, workers: Optional[int] = None) -> List[float]:
+    """全量并行重建（多进程计算、单连接回写）"""
+    return [await _timed(cost_recalc_service.rebuild_all_costs_parallel(workers)) for _ in range(repeat)]
+
+
+async def single_event_recalc(samples: int = 20, seed: int = 1) -> List[float]:
+    """修改最近一条记录后的增量重算：从该商品最后一条记录的日期开始回放"""
+    timings = []
+    for goods in _sample_goods(samples, seed):
+        timings.append(await _timed(
+            cost_recalc_service.recalculate_cost_for_goods(goods["goods_id"], since=goods["last_date"])
+        ))
+    return timings
+
+
+async def backdated_recalc(samples: int = 20, depth: float = 0.1, seed: int = 2) -> List[float]:
+    """
+    追溯修改后的增量重算：从业务开始后 depth 比例处的日期开始回放
+    
+    depth 越小，需要回放和回写的历史越长。
+    """
+    db = SessionLocal()
+    try:
+        first_date, last_date = db.query(func.min(PurchaseInfo.purchase_date), func.max(PurchaseInfo.purchase_date)).one()
+    finally:
+        db.close()
+    since = first_date + timedelta(days=int((last_date - first_date).days * depth))
+    
+    timings = []
+    for goods in _sample_goods(samples, seed):
+        timings.append(await _timed(cost_recalc_service.recalculate_cost_for_goods(goods["goods_id"], since=since)))
+    return timings
+
+
+async def backdated_insert(samples: int = 20, seed: int = 3) -> Dict[str, List[float]]:
+    """
+    通过采购录入接口插入当前对账周期内最早允许日期的采购，再处理后台重算任务
+    
+    分别计时写入请求本身（write）和随后的后台重算（recalc）。
+    """
+    from app.routers.purchase import PurchaseAdd
+    from app.services import purchase_service
+    from app.models.purchase_statement import PurchaseStatement
+    
+    db = SessionLocal()
+    try:
+        supplier_name, statement_start = db.query(Supplier.supplier_name, PurchaseStatement.start_date).join(
+            PurchaseStatement, PurchaseStatement.supplier_id == Supplier.id
+        ).filter(
+            PurchaseStatement.end_date.is_(None),
+            PurchaseStatement.is_deleted == False
+        ).order_by(Supplier.id).first()
+    finally:
+        db.close()
+    purchase_date = (statement_start + timedelta(days=1)).strftime("%Y-%m-%d")
+    
+    write, recalc = [], []
+    for goods in _sample_goods(samples, seed):
+        data = PurchaseAdd(
+            supplier_name=supplier_name,
+            product_name=goods["goods_name"],
+            product_spec=str(goods["product_spec"]),
+            purchase_num=10,
+            purchase_price=1.0,
+            purchase_date=purchase_date
+        )
+        write.append(await _timed(purchase_service.add_purchase(data)))
+        recalc.append(await _timed(cost_recalc_service.process_pending_recalc_jobs()))
+    return {"write": write, "recalc": recalc}
+
+
+async def run_scenarios(names: List[str], samples: int = 20, rebuild_repeat: int = 1,
+                        workers: Optional[int] = None, depth: float = 0.1) -> Dict[str, Any]:
+    """
+    按顺序运行指定场景并汇总结果
+    
+    增量场景依赖成本检查点；若还没有检查点（未运行全量重建），先做一次不计时的全量重建。
+    """
+    results = {}
+    for name in names:
+        if name in ("single_event_recalc", "backdated_recalc", "backdated_insert") and not has_checkpoints():
+            await cost_recalc_service.recalculate_all_costs()
+        
+        started = datetime.now()
+        if name == "full_rebuild":
+            timings = {"": await full_rebuild(rebuild_repeat)}
+        elif name == "full_rebuild_parallel":
+            timings = {"": await full_rebuild_parallel(rebuild_repeat, workers)}
+        elif name == "single_event_recalc":
+            timings = {"": await single_event_recalc(samples)}
+        elif name == "backdated_recalc":
+            timings = {"": await backdated_recalc(samples, depth)}
+        elif name == "backdated_insert":
+            timings = await backdated_insert(samples)
+        else:
+            raise ValueError(f"未知场景: {name}")
+        
+        for suffix, samples_ms in timings.items():
+            key = f"{name}.{suffix}" if suffix else name
+            results[key] = dict(summarize(samples_ms), started_at=started.strftime("%Y-%m-%d %H:%M:%S"))
+    return results
+
@@ -8,6 +8,7 @@
 import uvicorn
 import socket
 import sys
+import multiprocessing
 from pathlib import Path
 from fastapi.staticfiles import StaticFiles
 
@@ -117,6 +118,9 @@ def run_server_with_port_fallback(host: str, start_port: int, max_retries: int =
 
 
 if __name__ == "__main__":
+    # 成本全量重建使用多进程，PyInstaller 打包后需要此调用才能正常启动子进程
+    multiprocessing.freeze_support()
+    
     # 推荐将 host 改为 127.0.0.1（仅本地访问），避免局域网内其他设备占用
     # 如果需要局域网访问，保留 0.0.0.0 即可
     HOST = "127.0.0.1"  # 或 "0.0.0.0"
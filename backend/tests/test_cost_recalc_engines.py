@@ -0,0 +1,140 @@
+"""
+成本重算引擎一致性测试
+
+NumPy 向量化引擎须与逐条回放引擎结果逐位相同（全量回放与各个增量起点）。
+测试账目覆盖：负库存、同日采购/销售/报损的排序、采购使库存回到零及以上、金额恰好落在半分舍入临界值。
+"""
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from app.models.goods import Goods
+from app.models.supplier import Supplier
+from app.models.purchaser import Purchaser
+from app.models.purchase_statement import PurchaseStatement
+from app.models.sale_statement import SaleStatement
+from app.models.purchase_info import PurchaseInfo
+from app.models.sale_info import SaleInfo
+from app.models.inventory_loss import InventoryLoss
+from app.services.cost_recalc_service import replay_goods, apply_replay_result
+from app.services.cost_recalc_numpy import replay_goods_numpy
+
+
+# 商品规格：规格为 1 便于构造半分临界值，规格为 3 检验按规格折算
+SPECS = {"测试商品A": 1, "测试商品B": 3}
+
+# 账目（按写入顺序，ID 递增；同日记录故意打乱类型顺序以检验排序）
+# (商品, 类型, 日期, 数量, 单价, 总价)
+LEDGER = [
+    # 期初无采购先销售、报损：库存为负，成本为 0
+    ("测试商品A", "sale", date(2024, 1, 3), 3, "12.00", "36.00"),
+    ("测试商品A", "loss", date(2024, 1, 3), 1, None, None),
+    # 采购恰好补回到零：成本取采购单价
+    ("测试商品A", "purchase", date(2024, 1, 10), 4, "10.00", "40.00"),
+    # 加权成本 20.01 / 2 = 10.005，落在半分临界值
+    ("测试商品A", "purchase", date(2024, 1, 20), 2, "10.01", "20.01"),
+    # 按半分成本销售、报损：单位成本、单位利润、报损总成本均为临界值，随后库存回到零
+    ("测试商品A", "loss", date(2024, 1, 25), 1, None, None),
+    ("测试商品A", "sale", date(2024, 1, 25), 1, "12.00", "12.00"),
+    # 同日销售、报损、采购（写入顺序与回放顺序不同）
+    ("测试商品A", "loss", date(2024, 2, 5), 1, None, None),
+    ("测试商品A", "sale", date(2024, 2, 5), 1, "12.00", "12.00"),
+    ("测试商品A", "purchase", date(2024, 2, 5), 1, "9.99", "9.99"),
+    ("测试商品A", "sale", date(2024, 2, 5), 1, "11.50", "11.50"),
+    # 再次卖成负库存，随后采购补到零以上
+    ("测试商品A", "sale", date(2024, 2, 18), 4, "11.00", "44.00"),
+    ("测试商品A", "purchase", date(2024, 3, 1), 8, "10.05", "80.40"),
+    ("测试商品A", "sale", date(2024, 3, 1), 2, "10.02", "20.04"),
+    ("测试商品A", "loss", date(2024, 3, 15), 1, None, None),
+    ("测试商品A", "sale", date(2024, 4, 2), 1, "12.34", "12.34"),
+    # 另一商品：按规格折算
+    ("测试商品B", "purchase", date(2024, 1, 5), 1, "2.50", "7.50"),
+    ("测试商品B", "sale", date(2024, 1, 5), 2, "2.51", "15.06"),
+    ("测试商品B", "purchase", date(2024, 2, 5), 1, "2.49", "7.47"),
+    ("测试商品B", "loss", date(2024, 2, 5), 1, None, None),
+    # 负库存时采购：(22.56 - 1 × 2.49 × 3) / (2 × 3) = 2.515，单位利润 0.485
+    ("测试商品B", "purchase", date(2024, 3, 9), 3, "2.51", "22.56"),
+    ("测试商品B", "sale", date(2024, 3, 9), 1, "3.00", "9.00"),
+]
+
+SINCE_VALUES = [
+    None,
+    date(2024, 1, 3),
+    date(2024, 1, 10),
+    date(2024, 1, 20),
+    date(2024, 2, 5),
+    date(2024, 2, 6),
+    date(2024, 3, 1),
+    date(2024, 4, 2),
+    date(2024, 5, 1),
+]
+
+
+@pytest.fixture
+def ledger(db):
+    """写入测试账目，返回 {商品ID: 规格}"""
+    supplier = Supplier(supplier_name="测试供货商")
+    purchaser = Purchaser(purchaser_name="测试采购商")
+    db.add_all([supplier, purchaser])
+    db.flush()
+    
+    purchase_statement = PurchaseStatement(supplier_id=supplier.id)
+    sale_statement = SaleStatement(purchaser_id=purchaser.id)
+    goods = {name: Goods(goods_name=name, product_spec=spec) for name, spec in SPECS.items()}
+    db.add_all([purchase_statement, sale_statement, *goods.values()])
+    db.flush()
+    
+    for name, event_type, event_date, num, unit_price, total_price in LEDGER:
+        item = goods[name]
+        if event_type == "purchase":
+            db.add(PurchaseInfo(
+                supplier_id=supplier.id, goods_id=item.id, product_spec=str(item.product_spec),
+                purchase_num=num, purchase_unit_price=Decimal(unit_price),
+                purchase_total_price=Decimal(total_price), purchase_date=event_date,
+                statement_id=purchase_statement.id
+            ))
+        elif event_type == "sale":
+            db.add(SaleInfo(
+                purchaser_id=purchaser.id, goods_id=item.id, product_spec=str(item.product_spec),
+                sale_num=num, sale_unit_price=Decimal(unit_price), sale_total_price=Decimal(total_price),
+                trade_unit_cost=Decimal("0.00"), unit_profit=Decimal("0.00"), total_profit=Decimal("0.00"),
+                sale_date=event_date, statement_id=sale_statement.id
+            ))
+        else:
+            db.add(InventoryLoss(
+                goods_id=item.id, loss_num=num, loss_unit_cost=Decimal("0.00"),
+                loss_total_cost=Decimal("0.00"), loss_date=event_date
+            ))
+        # 逐条 flush，保证 ID 按写入顺序递增
+        db.flush()
+    db.commit()
+    return {item.id: float(item.product_spec) for item in goods.values()}
+
+
+@pytest.mark.parametrize("since", SINCE_VALUES)
+def test_engines_match_without_checkpoints(db, ledger, since):
+    for goods_id, product_spec in ledger.items():
+        expected = replay_goods(db, goods_id, product_spec, since)
+        actual = replay_goods_numpy(db, goods_id, product_spec, since)
+        assert actual == expected
+
+
+@pytest.mark.parametrize("since", SINCE_VALUES)
+def test_engines_match_from_checkpoints(db, ledger, since):
+    # 先全量回放并回写（写入检查点和快照），增量回放再从检查点续算
+    for goods_id, product_spec in ledger.items():
+        apply_replay_result(db, replay_goods(db, goods_id, product_spec))
+    db.commit()
+    
+    for goods_id, product_spec in ledger.items():
+        expected = replay_goods(db, goods_id, product_spec, since)
+        actual = replay_goods_numpy(db, goods_id, product_spec, since)
+        assert actual == expected
+        # 快照已回写，重放不应再产生变化
+        assert expected["sale_updates"] == []
+        assert expected["loss_updates"] == []
+